@@ -0,0 +1,30 @@
+"""Add keyset indexes
+
+Revision ID: 1d9f3b6a8e27
+Revises: c5a7e19d4b62
+Create Date: 2026-10-18 11:36:20.274518
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "1d9f3b6a8e27"
+down_revision: Union[str, None] = "c5a7e19d4b62"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_index("ix_course_date_id", "course", ["date", "id"], unique=False)
+    op.create_index(
+        "ix_student_name", "student", ["last_name", "first_name", "id"], unique=False
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("ix_student_name", table_name="student")
+    op.drop_index("ix_course_date_id", table_name="course")
@@ -0,0 +1,131 @@
+"""Key search tables on identifiers
+
+Revision ID: 2a6f4c8d1e73
+Revises: 7c3d9e2a5f18
+Create Date: 2026-10-18 23:02:31.480215
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = "2a6f4c8d1e73"
+down_revision: Union[str, None] = "7c3d9e2a5f18"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Text indexed for a student and for a course, from a row <row>
+# (as in the revision creating the search tables)
+STUDENT_CONTENT = (
+    "{row}.first_name || ' ' || {row}.last_name, "
+    "{row}.email_address, {row}.phone_number"
+)
+COURSE_CONTENT = (
+    "(SELECT first_name || ' ' || last_name FROM student WHERE id = {row}.student_id), "
+    "strftime('%d/%m/%Y', {row}.date) || ' ' || {row}.date"
+)
+
+TRIGGER_NAMES = (
+    "search_student_insert",
+    "search_student_update",
+    "search_student_delete",
+    "search_course_insert",
+    "search_course_update",
+    "search_course_delete",
+)
+
+# Words are indexed without accents, and prefixes of 2 and 3
+# characters are indexed to answer the first keystrokes quickly
+OPTIONS = "tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3'"
+
+
+def _create_search_tables(key: str) -> None:
+    """Creates the search tables, fills them and creates their triggers, the
+    indexed rows being identified by the given column of the student and
+    course tables (id, or formerly rowid)."""
+
+    # The identifiers are stored in a column which is not indexed for the
+    # search, the rowids are shared with the indexed tables
+    key_column = "id UNINDEXED, " if key == "id" else ""
+
+    op.execute(
+        "CREATE VIRTUAL TABLE search_student USING fts5"
+        f"({key_column}name, email_address, phone_number, {OPTIONS})"
+    )
+    op.execute(
+        "CREATE VIRTUAL TABLE search_course USING fts5"
+        f"({key_column}student_name, date, {OPTIONS})"
+    )
+
+    insert_student = (
+        f"INSERT INTO search_student ({key}, name, email_address, phone_number) "
+    )
+    insert_course = f"INSERT INTO search_course ({key}, student_name, date) "
+
+    op.execute(
+        f"{insert_student}SELECT student.{key}, "
+        f"{STUDENT_CONTENT.format(row='student')} FROM student"
+    )
+    op.execute(
+        f"{insert_course}SELECT course.{key}, "
+        f"{COURSE_CONTENT.format(row='course')} FROM course"
+    )
+
+    triggers = {
+        "search_student_insert": "AFTER INSERT ON student BEGIN "
+        f"{insert_student}VALUES (new.{key}, {STUDENT_CONTENT.format(row='new')}); "
+        "END",
+        "search_student_update": "AFTER UPDATE OF first_name, last_name, "
+        "email_address, phone_number ON student BEGIN "
+        f"DELETE FROM search_student WHERE {key} = old.{key}; "
+        f"{insert_student}VALUES (new.{key}, {STUDENT_CONTENT.format(row='new')}); "
+        # The name of the student is also indexed with each of his courses
+        f"DELETE FROM search_course WHERE {key} IN "
+        f"(SELECT {key} FROM course WHERE student_id = new.id); "
+        f"{insert_course}SELECT course.{key}, {COURSE_CONTENT.format(row='course')} "
+        "FROM course WHERE course.student_id = new.id; END",
+        "search_student_delete": "AFTER DELETE ON student BEGIN "
+        f"DELETE FROM search_student WHERE {key} = old.{key}; END",
+        "search_course_insert": "AFTER INSERT ON course BEGIN "
+        f"{insert_course}VALUES (new.{key}, {COURSE_CONTENT.format(row='new')}); END",
+        "search_course_update": "AFTER UPDATE OF date, student_id ON course BEGIN "
+        f"DELETE FROM search_course WHERE {key} = old.{key}; "
+        f"{insert_course}VALUES (new.{key}, {COURSE_CONTENT.format(row='new')}); END",
+        "search_course_delete": "AFTER DELETE ON course BEGIN "
+        f"DELETE FROM search_course WHERE {key} = old.{key}; END",
+    }
+
+    for name, definition in triggers.items():
+        op.execute(f"CREATE TRIGGER {name} {definition}")
+
+
+def _drop_search_tables() -> None:
+    """Drops the triggers and the search tables."""
+
+    for name in TRIGGER_NAMES:
+        op.execute(f"DROP TRIGGER {name}")
+
+    op.execute("DROP TABLE search_course")
+    op.execute("DROP TABLE search_student")
+
+
+def upgrade() -> None:
+    # FTS5 is only available with SQLite
+    if op.get_bind().dialect.name != "sqlite":
+        return
+
+    # The rowids of tables without an INTEGER PRIMARY KEY may be changed
+    # by VACUUM, the search tables are rebuilt on the identifiers
+    _drop_search_tables()
+    _create_search_tables("id")
+
+
+def downgrade() -> None:
+    if op.get_bind().dialect.name != "sqlite":
+        return
+
+    _drop_search_tables()
+    _create_search_tables("rowid")
@@ -0,0 +1,44 @@
+"""Add rollup tables
+
+Revision ID: 4d7a2c9e1b58
+Revises: 6e2b8c0f4a95
+Create Date: 2026-10-18 16:12:08.412395
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = "4d7a2c9e1b58"
+down_revision: Union[str, None] = "6e2b8c0f4a95"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # The tables are filled by the refresh of the rollup (see rollup.py)
+    op.create_table(
+        "course_monthly_summary",
+        sa.Column("month", sa.Date(), nullable=False),
+        sa.Column("student_id", sa.Uuid(), nullable=False),
+        sa.Column("hourly_rate_id", sa.Uuid(), nullable=False),
+        sa.Column("courses", sa.Integer(), nullable=False),
+        sa.Column("hours", sa.DECIMAL(precision=10, scale=2), nullable=False),
+        sa.Column("billed", sa.DECIMAL(precision=12, scale=4), nullable=False),
+        sa.Column("paid", sa.DECIMAL(precision=12, scale=4), nullable=False),
+        sa.PrimaryKeyConstraint("month", "student_id", "hourly_rate_id"),
+    )
+    op.create_table(
+        "rollup_period",
+        sa.Column("month", sa.Date(), nullable=False),
+        sa.Column("frozen_at", sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint("month"),
+    )
+
+
+def downgrade() -> None:
+    op.drop_table("rollup_period")
+    op.drop_table("course_monthly_summary")
@@ -0,0 +1,51 @@
+"""Add hourly rate price history
+
+Revision ID: 5b2f8d61c7a4
+Revises: e8c41f6a0b93
+Create Date: 2026-10-18 21:06:48.214379
+
+"""
+
+import datetime
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = "5b2f8d61c7a4"
+down_revision: Union[str, None] = "e8c41f6a0b93"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    hourly_rate_price = op.create_table(
+        "hourly_rate_price",
+        sa.Column("hourly_rate_id", sa.Uuid(), nullable=False),
+        sa.Column("valid_from", sa.Date(), nullable=False),
+        sa.Column("valid_to", sa.Date(), nullable=True),
+        sa.Column("price", sa.DECIMAL(precision=5, scale=2), nullable=False),
+        sa.ForeignKeyConstraint(["hourly_rate_id"], ["hourly_rate.id"]),
+        sa.PrimaryKeyConstraint("hourly_rate_id", "valid_from"),
+    )
+
+    # The current price of every rate applies to all of its courses, as before
+    hourly_rate = sa.table(
+        "hourly_rate", sa.column("id", sa.Uuid()), sa.column("price")
+    )
+    op.execute(
+        hourly_rate_price.insert().from_select(
+            ["hourly_rate_id", "valid_from", "valid_to", "price"],
+            sa.select(
+                hourly_rate.c.id,
+                sa.literal(datetime.date.min, sa.Date()),
+                sa.null(),
+                hourly_rate.c.price,
+            ),
+        )
+    )
+
+
+def downgrade() -> None:
+    op.drop_table("hourly_rate_price")
@@ -0,0 +1,97 @@
+"""Add search tables
+
+Revision ID: 6e2b8c0f4a95
+Revises: 1d9f3b6a8e27
+Create Date: 2026-10-18 13:05:48.551760
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "6e2b8c0f4a95"
+down_revision: Union[str, None] = "1d9f3b6a8e27"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Text indexed for a student and for a course (the name of his student and
+# its date, in both the displayed and the stored format), from a row <row>
+STUDENT_CONTENT = (
+    "{row}.first_name || ' ' || {row}.last_name, {row}.email_address, {row}.phone_number"
+)
+COURSE_CONTENT = (
+    "(SELECT first_name || ' ' || last_name FROM student WHERE id = {row}.student_id), "
+    "strftime('%d/%m/%Y', {row}.date) || ' ' || {row}.date"
+)
+
+TRIGGERS = {
+    "search_student_insert": "AFTER INSERT ON student BEGIN "
+    "INSERT INTO search_student (rowid, name, email_address, phone_number) "
+    f"VALUES (new.rowid, {STUDENT_CONTENT.format(row='new')}); END",
+    "search_student_update": "AFTER UPDATE OF first_name, last_name, email_address, "
+    "phone_number ON student BEGIN "
+    "DELETE FROM search_student WHERE rowid = old.rowid; "
+    "INSERT INTO search_student (rowid, name, email_address, phone_number) "
+    f"VALUES (new.rowid, {STUDENT_CONTENT.format(row='new')}); "
+    # The name of the student is also indexed with each of his courses
+    "DELETE FROM search_course WHERE rowid IN "
+    "(SELECT rowid FROM course WHERE student_id = new.id); "
+    "INSERT INTO search_course (rowid, student_name, date) "
+    f"SELECT course.rowid, {COURSE_CONTENT.format(row='course')} "
+    "FROM course WHERE course.student_id = new.id; END",
+    "search_student_delete": "AFTER DELETE ON student BEGIN "
+    "DELETE FROM search_student WHERE rowid = old.rowid; END",
+    "search_course_insert": "AFTER INSERT ON course BEGIN "
+    "INSERT INTO search_course (rowid, student_name, date) "
+    f"VALUES (new.rowid, {COURSE_CONTENT.format(row='new')}); END",
+    "search_course_update": "AFTER UPDATE OF date, student_id ON course BEGIN "
+    "DELETE FROM search_course WHERE rowid = old.rowid; "
+    "INSERT INTO search_course (rowid, student_name, date) "
+    f"VALUES (new.rowid, {COURSE_CONTENT.format(row='new')}); END",
+    "search_course_delete": "AFTER DELETE ON course BEGIN "
+    "DELETE FROM search_course WHERE rowid = old.rowid; END",
+}
+
+
+def upgrade() -> None:
+    # FTS5 is only available with SQLite
+    if op.get_bind().dialect.name != "sqlite":
+        return
+
+    # Words are indexed without accents, and prefixes of 2 and 3
+    # characters are indexed to answer the first keystrokes quickly
+    options = "tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3'"
+
+    op.execute(
+        "CREATE VIRTUAL TABLE search_student USING fts5"
+        f"(name, email_address, phone_number, {options})"
+    )
+    op.execute(
+        f"CREATE VIRTUAL TABLE search_course USING fts5(student_name, date, {options})"
+    )
+
+    op.execute(
+        "INSERT INTO search_student (rowid, name, email_address, phone_number) "
+        f"SELECT student.rowid, {STUDENT_CONTENT.format(row='student')} FROM student"
+    )
+    op.execute(
+        "INSERT INTO search_course (rowid, student_name, date) "
+        f"SELECT course.rowid, {COURSE_CONTENT.format(row='course')} FROM course"
+    )
+
+    for name, definition in TRIGGERS.items():
+        op.execute(f"CREATE TRIGGER {name} {definition}")
+
+
+def downgrade() -> None:
+    if op.get_bind().dialect.name != "sqlite":
+        return
+
+    for name in TRIGGERS:
+        op.execute(f"DROP TRIGGER {name}")
+
+    op.execute("DROP TABLE search_course")
+    op.execute("DROP TABLE search_student")
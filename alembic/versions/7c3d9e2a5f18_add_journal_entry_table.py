@@ -0,0 +1,50 @@
+"""Add journal entry table
+
+Revision ID: 7c3d9e2a5f18
+Revises: 5b2f8d61c7a4
+Create Date: 2026-10-18 22:14:05.927610
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = "7c3d9e2a5f18"
+down_revision: Union[str, None] = "5b2f8d61c7a4"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "journal_entry",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("changed_at", sa.DateTime(), nullable=False),
+        sa.Column("entity_type", sa.String(length=20), nullable=False),
+        sa.Column("entity_id", sa.Uuid(), nullable=False),
+        sa.Column("operation", sa.String(length=6), nullable=False),
+        sa.Column("before_image", sa.JSON(), nullable=True),
+        sa.Column("after_image", sa.JSON(), nullable=True),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    op.create_index(
+        op.f("ix_journal_entry_changed_at"),
+        "journal_entry",
+        ["changed_at"],
+        unique=False,
+    )
+    op.create_index(
+        "ix_journal_entry_entity",
+        "journal_entry",
+        ["entity_id", "changed_at"],
+        unique=False,
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("ix_journal_entry_entity", table_name="journal_entry")
+    op.drop_index(op.f("ix_journal_entry_changed_at"), table_name="journal_entry")
+    op.drop_table("journal_entry")
@@ -0,0 +1,34 @@
+"""Add course indexes
+
+Revision ID: 8b4e6d2f0a31
+Revises: 3f1c2a9b7d10
+Create Date: 2026-10-18 09:27:05.640192
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "8b4e6d2f0a31"
+down_revision: Union[str, None] = "3f1c2a9b7d10"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_index("ix_course_paid_date", "course", ["paid", "date"], unique=False)
+    op.create_index(
+        op.f("ix_course_student_id"), "course", ["student_id"], unique=False
+    )
+    op.create_index(
+        op.f("ix_course_hourly_rate_id"), "course", ["hourly_rate_id"], unique=False
+    )
+
+
+def downgrade() -> None:
+    op.drop_index(op.f("ix_course_hourly_rate_id"), table_name="course")
+    op.drop_index(op.f("ix_course_student_id"), table_name="course")
+    op.drop_index("ix_course_paid_date", table_name="course")
@@ -0,0 +1,54 @@
+"""Add payment table
+
+Revision ID: 9a3e5c7b2d14
+Revises: 4d7a2c9e1b58
+Create Date: 2026-10-18 18:05:41.209318
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = "9a3e5c7b2d14"
+down_revision: Union[str, None] = "4d7a2c9e1b58"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "payment",
+        sa.Column("id", sa.Uuid(), nullable=False),
+        sa.Column("date", sa.Date(), nullable=False),
+        sa.Column("amount", sa.DECIMAL(precision=12, scale=4), nullable=False),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    # SQLite cannot add a foreign key to an existing table without copying it
+    # (which would lose the triggers of the search index), but it accepts it
+    # along with a new column
+    if op.get_bind().dialect.name == "sqlite":
+        op.execute(
+            "ALTER TABLE course ADD COLUMN payment_id CHAR(32) REFERENCES payment (id)"
+        )
+
+    else:
+        op.add_column("course", sa.Column("payment_id", sa.Uuid(), nullable=True))
+        op.create_foreign_key(
+            "fk_course_payment_id", "course", "payment", ["payment_id"], ["id"]
+        )
+
+    op.create_index(
+        op.f("ix_course_payment_id"), "course", ["payment_id"], unique=False
+    )
+
+
+def downgrade() -> None:
+    if op.get_bind().dialect.name != "sqlite":
+        op.drop_constraint("fk_course_payment_id", "course", type_="foreignkey")
+
+    op.drop_index(op.f("ix_course_payment_id"), table_name="course")
+    op.drop_column("course", "payment_id")
+    op.drop_table("payment")
@@ -0,0 +1,204 @@
+"""Map search rows to identifiers
+
+Revision ID: b7e3a1d95c40
+Revises: 2a6f4c8d1e73
+Create Date: 2026-10-19 09:14:52.306417
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = "b7e3a1d95c40"
+down_revision: Union[str, None] = "2a6f4c8d1e73"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Text indexed for a student and for a course, from a row <row>
+# (as in the revision creating the search tables)
+STUDENT_CONTENT = (
+    "{row}.first_name || ' ' || {row}.last_name, "
+    "{row}.email_address, {row}.phone_number"
+)
+COURSE_CONTENT = (
+    "(SELECT first_name || ' ' || last_name FROM student WHERE id = {row}.student_id), "
+    "strftime('%d/%m/%Y', {row}.date) || ' ' || {row}.date"
+)
+
+TRIGGER_NAMES = (
+    "search_student_insert",
+    "search_student_update",
+    "search_student_delete",
+    "search_course_insert",
+    "search_course_update",
+    "search_course_delete",
+)
+
+# Words are indexed without accents, and prefixes of 2 and 3
+# characters are indexed to answer the first keystrokes quickly
+OPTIONS = "tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3'"
+
+# Rowid of the search row of a student or of a course, from its identifier
+STUDENT_ROWID = "(SELECT search_id FROM search_student_row WHERE entity_id = {id})"
+COURSE_ROWID = "(SELECT search_id FROM search_course_row WHERE entity_id = {id})"
+
+
+def _drop_triggers() -> None:
+    """Drops the triggers keeping the search tables in sync."""
+
+    for name in TRIGGER_NAMES:
+        op.execute(f"DROP TRIGGER {name}")
+
+
+def _create_triggers(triggers: dict) -> None:
+    """Creates the triggers, given by name."""
+
+    for name, definition in triggers.items():
+        op.execute(f"CREATE TRIGGER {name} {definition}")
+
+
+def upgrade() -> None:
+    # FTS5 is only available with SQLite
+    if op.get_bind().dialect.name != "sqlite":
+        return
+
+    # The search tables can only be looked up quickly by rowid : each student
+    # and course gets a stable integer rowid, used by its search row
+    _drop_triggers()
+    op.execute("DROP TABLE search_course")
+    op.execute("DROP TABLE search_student")
+
+    for table in ("student", "course"):
+        op.execute(
+            f"CREATE TABLE search_{table}_row (search_id INTEGER PRIMARY KEY, "
+            "entity_id CHAR(32) NOT NULL UNIQUE)"
+        )
+        op.execute(f"INSERT INTO search_{table}_row (entity_id) SELECT id FROM {table}")
+
+    op.execute(
+        "CREATE VIRTUAL TABLE search_student USING fts5"
+        f"(name, email_address, phone_number, {OPTIONS})"
+    )
+    op.execute(
+        f"CREATE VIRTUAL TABLE search_course USING fts5(student_name, date, {OPTIONS})"
+    )
+
+    insert_student = (
+        "INSERT INTO search_student (rowid, name, email_address, phone_number) "
+    )
+    insert_course = "INSERT INTO search_course (rowid, student_name, date) "
+
+    op.execute(
+        f"{insert_student}SELECT search_id, {STUDENT_CONTENT.format(row='student')} "
+        "FROM student JOIN search_student_row ON entity_id = student.id"
+    )
+    op.execute(
+        f"{insert_course}SELECT search_id, {COURSE_CONTENT.format(row='course')} "
+        "FROM course JOIN search_course_row ON entity_id = course.id"
+    )
+
+    # The courses of a student, with the rowids of their search rows
+    student_courses = (
+        "FROM course JOIN search_course_row ON entity_id = course.id "
+        "WHERE course.student_id = new.id"
+    )
+
+    _create_triggers(
+        {
+            "search_student_insert": "AFTER INSERT ON student BEGIN "
+            "INSERT INTO search_student_row (entity_id) VALUES (new.id); "
+            f"{insert_student}VALUES ({STUDENT_ROWID.format(id='new.id')}, "
+            f"{STUDENT_CONTENT.format(row='new')}); END",
+            "search_student_update": "AFTER UPDATE OF first_name, last_name, "
+            "email_address, phone_number ON student BEGIN "
+            "DELETE FROM search_student "
+            f"WHERE rowid = {STUDENT_ROWID.format(id='old.id')}; "
+            f"{insert_student}VALUES ({STUDENT_ROWID.format(id='new.id')}, "
+            f"{STUDENT_CONTENT.format(row='new')}); "
+            # The name of the student is also indexed with each of his courses
+            "DELETE FROM search_course WHERE rowid IN "
+            f"(SELECT search_id {student_courses}); "
+            f"{insert_course}SELECT search_id, "
+            f"{COURSE_CONTENT.format(row='course')} {student_courses}; END",
+            "search_student_delete": "AFTER DELETE ON student BEGIN "
+            "DELETE FROM search_student "
+            f"WHERE rowid = {STUDENT_ROWID.format(id='old.id')}; "
+            "DELETE FROM search_student_row WHERE entity_id = old.id; END",
+            "search_course_insert": "AFTER INSERT ON course BEGIN "
+            "INSERT INTO search_course_row (entity_id) VALUES (new.id); "
+            f"{insert_course}VALUES ({COURSE_ROWID.format(id='new.id')}, "
+            f"{COURSE_CONTENT.format(row='new')}); END",
+            "search_course_update": "AFTER UPDATE OF date, student_id ON course BEGIN "
+            "DELETE FROM search_course "
+            f"WHERE rowid = {COURSE_ROWID.format(id='old.id')}; "
+            f"{insert_course}VALUES ({COURSE_ROWID.format(id='new.id')}, "
+            f"{COURSE_CONTENT.format(row='new')}); END",
+            "search_course_delete": "AFTER DELETE ON course BEGIN "
+            "DELETE FROM search_course "
+            f"WHERE rowid = {COURSE_ROWID.format(id='old.id')}; "
+            "DELETE FROM search_course_row WHERE entity_id = old.id; END",
+        }
+    )
+
+
+def downgrade() -> None:
+    if op.get_bind().dialect.name != "sqlite":
+        return
+
+    _drop_triggers()
+    op.execute("DROP TABLE search_course")
+    op.execute("DROP TABLE search_student")
+    op.execute("DROP TABLE search_course_row")
+    op.execute("DROP TABLE search_student_row")
+
+    # The search tables store the identifiers again, as in the previous revision
+    op.execute(
+        "CREATE VIRTUAL TABLE search_student USING fts5"
+        f"(id UNINDEXED, name, email_address, phone_number, {OPTIONS})"
+    )
+    op.execute(
+        "CREATE VIRTUAL TABLE search_course USING fts5"
+        f"(id UNINDEXED, student_name, date, {OPTIONS})"
+    )
+
+    insert_student = (
+        "INSERT INTO search_student (id, name, email_address, phone_number) "
+    )
+    insert_course = "INSERT INTO search_course (id, student_name, date) "
+
+    op.execute(
+        f"{insert_student}SELECT student.id, "
+        f"{STUDENT_CONTENT.format(row='student')} FROM student"
+    )
+    op.execute(
+        f"{insert_course}SELECT course.id, "
+        f"{COURSE_CONTENT.format(row='course')} FROM course"
+    )
+
+    _create_triggers(
+        {
+            "search_student_insert": "AFTER INSERT ON student BEGIN "
+            f"{insert_student}VALUES (new.id, {STUDENT_CONTENT.format(row='new')}); "
+            "END",
+            "search_student_update": "AFTER UPDATE OF first_name, last_name, "
+            "email_address, phone_number ON student BEGIN "
+            "DELETE FROM search_student WHERE id = old.id; "
+            f"{insert_student}VALUES (new.id, {STUDENT_CONTENT.format(row='new')}); "
+            "DELETE FROM search_course WHERE id IN "
+            "(SELECT id FROM course WHERE student_id = new.id); "
+            f"{insert_course}SELECT course.id, {COURSE_CONTENT.format(row='course')} "
+            "FROM course WHERE course.student_id = new.id; END",
+            "search_student_delete": "AFTER DELETE ON student BEGIN "
+            "DELETE FROM search_student WHERE id = old.id; END",
+            "search_course_insert": "AFTER INSERT ON course BEGIN "
+            f"{insert_course}VALUES (new.id, {COURSE_CONTENT.format(row='new')}); END",
+            "search_course_update": "AFTER UPDATE OF date, student_id ON course BEGIN "
+            "DELETE FROM search_course WHERE id = old.id; "
+            f"{insert_course}VALUES (new.id, {COURSE_CONTENT.format(row='new')}); END",
+            "search_course_delete": "AFTER DELETE ON course BEGIN "
+            "DELETE FROM search_course WHERE id = old.id; END",
+        }
+    )
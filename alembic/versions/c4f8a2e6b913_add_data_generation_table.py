@@ -0,0 +1,34 @@
+"""Add data generation table
+
+Revision ID: c4f8a2e6b913
+Revises: b7e3a1d95c40
+Create Date: 2026-10-19 11:02:47.518264
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = "c4f8a2e6b913"
+down_revision: Union[str, None] = "b7e3a1d95c40"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    data_generation = op.create_table(
+        "data_generation",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("generation", sa.Integer(), nullable=False),
+        sa.PrimaryKeyConstraint("id"),
+    )
+
+    # The single row increased by the transactions changing the data
+    op.bulk_insert(data_generation, [{"id": 1, "generation": 0}])
+
+
+def downgrade() -> None:
+    op.drop_table("data_generation")
@@ -0,0 +1,62 @@
+"""Add balance tables
+
+Revision ID: c5a7e19d4b62
+Revises: 8b4e6d2f0a31
+Create Date: 2026-10-18 10:41:53.907126
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "c5a7e19d4b62"
+down_revision: Union[str, None] = "8b4e6d2f0a31"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "student_balance",
+        sa.Column("student_id", sa.Uuid(), nullable=False),
+        sa.Column("debt", sa.DECIMAL(precision=12, scale=4), nullable=False),
+        sa.Column("gains", sa.DECIMAL(precision=12, scale=4), nullable=False),
+        sa.PrimaryKeyConstraint("student_id"),
+    )
+    op.create_table(
+        "monthly_balance",
+        sa.Column("month", sa.Date(), nullable=False),
+        sa.Column("debt", sa.DECIMAL(precision=12, scale=4), nullable=False),
+        sa.Column("gains", sa.DECIMAL(precision=12, scale=4), nullable=False),
+        sa.PrimaryKeyConstraint("month"),
+    )
+
+    # The balances of the existing courses are computed once here,
+    # the ledger then keeps them up to date
+    if op.get_bind().dialect.name == "sqlite":
+        month = "date(course.date, 'start of month')"
+    else:
+        month = "CAST(date_trunc('month', course.date) AS DATE)"
+
+    amounts = (
+        "SUM(CASE WHEN course.paid THEN 0 ELSE hourly_rate.price * course.duration END), "
+        "SUM(CASE WHEN course.paid THEN hourly_rate.price * course.duration ELSE 0 END) "
+        "FROM course JOIN hourly_rate ON hourly_rate.id = course.hourly_rate_id "
+    )
+
+    op.execute(
+        "INSERT INTO student_balance (student_id, debt, gains) "
+        f"SELECT course.student_id, {amounts} GROUP BY course.student_id"
+    )
+    op.execute(
+        "INSERT INTO monthly_balance (month, debt, gains) "
+        f"SELECT {month}, {amounts} GROUP BY {month}"
+    )
+
+
+def downgrade() -> None:
+    op.drop_table("monthly_balance")
+    op.drop_table("student_balance")
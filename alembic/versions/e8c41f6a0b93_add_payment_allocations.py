@@ -0,0 +1,120 @@
+"""Add payment allocations
+
+Revision ID: e8c41f6a0b93
+Revises: 9a3e5c7b2d14
+Create Date: 2026-10-18 19:42:17.583062
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = "e8c41f6a0b93"
+down_revision: Union[str, None] = "9a3e5c7b2d14"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    sqlite = op.get_bind().dialect.name == "sqlite"
+
+    op.create_table(
+        "payment_allocation",
+        sa.Column("payment_id", sa.Uuid(), nullable=False),
+        sa.Column("course_id", sa.Uuid(), nullable=False),
+        sa.Column("amount", sa.DECIMAL(precision=12, scale=4), nullable=False),
+        sa.ForeignKeyConstraint(["course_id"], ["course.id"]),
+        sa.ForeignKeyConstraint(["payment_id"], ["payment.id"]),
+        sa.PrimaryKeyConstraint("payment_id", "course_id"),
+    )
+    op.create_index(
+        op.f("ix_payment_allocation_course_id"),
+        "payment_allocation",
+        ["course_id"],
+        unique=False,
+    )
+
+    # As for course.payment_id, SQLite only accepts the foreign key along
+    # with the new column
+    if sqlite:
+        op.execute(
+            "ALTER TABLE payment ADD COLUMN student_id CHAR(32) REFERENCES student (id)"
+        )
+
+    else:
+        op.add_column("payment", sa.Column("student_id", sa.Uuid(), nullable=True))
+        op.create_foreign_key(
+            "fk_payment_student_id", "payment", "student", ["student_id"], ["id"]
+        )
+
+    op.create_index(
+        op.f("ix_payment_student_id"), "payment", ["student_id"], unique=False
+    )
+    op.create_index(
+        "ix_course_student_paid_date",
+        "course",
+        ["student_id", "paid", "date"],
+        unique=False,
+    )
+
+    # The courses marked as paid in bulk receive their whole amount from
+    # their payment, which belongs to their student if they all had the same
+    op.execute(
+        "INSERT INTO payment_allocation (payment_id, course_id, amount) "
+        "SELECT course.payment_id, course.id, hourly_rate.price * course.duration "
+        "FROM course JOIN hourly_rate ON hourly_rate.id = course.hourly_rate_id "
+        "WHERE course.payment_id IS NOT NULL"
+    )
+    op.execute(
+        "UPDATE payment SET student_id = "
+        "(SELECT MIN(course.student_id) FROM course WHERE course.payment_id = payment.id) "
+        "WHERE (SELECT COUNT(DISTINCT course.student_id) FROM course "
+        "WHERE course.payment_id = payment.id) = 1"
+    )
+
+    if not sqlite:
+        op.drop_constraint("fk_course_payment_id", "course", type_="foreignkey")
+
+    op.drop_index(op.f("ix_course_payment_id"), table_name="course")
+    op.drop_column("course", "payment_id")
+
+
+def downgrade() -> None:
+    sqlite = op.get_bind().dialect.name == "sqlite"
+
+    if sqlite:
+        op.execute(
+            "ALTER TABLE course ADD COLUMN payment_id CHAR(32) REFERENCES payment (id)"
+        )
+
+    else:
+        op.add_column("course", sa.Column("payment_id", sa.Uuid(), nullable=True))
+        op.create_foreign_key(
+            "fk_course_payment_id", "course", "payment", ["payment_id"], ["id"]
+        )
+
+    op.create_index(
+        op.f("ix_course_payment_id"), "course", ["payment_id"], unique=False
+    )
+
+    # A course only keeps one of its payments
+    op.execute(
+        "UPDATE course SET payment_id = (SELECT MAX(payment_allocation.payment_id) "
+        "FROM payment_allocation WHERE payment_allocation.course_id = course.id) "
+        "WHERE course.id IN (SELECT course_id FROM payment_allocation)"
+    )
+
+    op.drop_index("ix_course_student_paid_date", table_name="course")
+    op.drop_index(op.f("ix_payment_student_id"), table_name="payment")
+
+    if not sqlite:
+        op.drop_constraint("fk_payment_student_id", "payment", type_="foreignkey")
+
+    op.drop_column("payment", "student_id")
+    op.drop_index(
+        op.f("ix_payment_allocation_course_id"), table_name="payment_allocation"
+    )
+    op.drop_table("payment_allocation")
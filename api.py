@@ -0,0 +1,574 @@
+"""This file implements a small HTTP server exposing the data of the app as JSON,
+so that it can be read from a phone or a dashboard. It is started with
+`python3 main.py serve` and offers the following endpoints :
+
+    GET    /students, /rates, /courses     pages of entities (?limit=&after=)
+    POST   /students, /rates, /courses     creation of an entity
+    GET    /<resource>/<id>                one entity
+    PATCH  /<resource>/<id>                edition of the given fields
+    DELETE /<resource>/<id>                deletion of an entity
+    GET    /stats/debts                    debt of every student
+    GET    /stats/gains?since=&until=      gains between two dates (ISO format)
+
+The lists are paginated with the keyset of the queries file : each page gives
+the cursor of the next one. Every GET response carries an ETag, so that
+clients polling the same URL get an empty 304 response while nothing changed.
+
+The connections are kept alive (HTTP/1.1) and served by a fixed pool of
+worker threads, each request running in its own transaction."""
+
+import base64
+import datetime
+import hashlib
+import json
+import sys
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from typing import Callable, NamedTuple, Type
+from urllib.parse import parse_qs, urlsplit
+
+from sqlalchemy.orm import Session
+
+import database
+import instrumentation
+import payments
+import validators
+import sanitizers
+import stats_cache
+from models import Base, Student, HourlyRate, Course
+from queries import (
+    KEYSET_ORDERS,
+    entity_keyset,
+    entity_page_query,
+)
+
+DEFAULT_PAGE_SIZE = 20
+MAX_PAGE_SIZE = 100
+
+# Maximum size of a request body, in bytes
+MAX_BODY_SIZE = 1 << 20
+
+# Seconds after which an idle kept-alive connection is closed,
+# so that it does not hold a worker of the pool
+KEEP_ALIVE_TIMEOUT = 5
+
+
+class ApiError(Exception):
+    """Raised when a request cannot be served ; the message is sent to the client."""
+
+    def __init__(self, status: HTTPStatus, message: str):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+
+def _name(_: Session, value) -> str:
+    """Validates a name, following the rules of the prompts."""
+
+    if not isinstance(value, str) or not 50 >= len(value.strip()) >= 3:
+        raise ApiError(
+            HTTPStatus.BAD_REQUEST, "le nom doit comporter 3 à 50 caractères"
+        )
+
+    return value.strip()
+
+
+def _phone_number(_: Session, value) -> str:
+    """Validates a phone number and puts it into E.164 format."""
+
+    phone_check = validators.check_phone_number(str(value))
+
+    if not phone_check.valid:
+        raise ApiError(
+            HTTPStatus.BAD_REQUEST, f"numéro de téléphone invalide : {value}"
+        )
+
+    return phone_check.normalized
+
+
+def _email_address(_: Session, value) -> str:
+    """Validates and normalizes an email address."""
+
+    if not validators.validate_email_address(str(value)):
+        raise ApiError(HTTPStatus.BAD_REQUEST, f"adresse email invalide : {value}")
+
+    return sanitizers.sanitize_email_address(str(value))
+
+
+def _address(_: Session, value) -> str:
+    """Validates a postal address."""
+
+    if not isinstance(value, str) or len(value) > 100:
+        raise ApiError(
+            HTTPStatus.BAD_REQUEST, "l'adresse doit faire 100 caractères au plus"
+        )
+
+    return value
+
+
+def _decimal_field(max_value: Decimal) -> Callable[[Session, object], Decimal]:
+    """Returns the converter of a decimal field bounded by max_value."""
+
+    def convert(_: Session, value) -> Decimal:
+        if not validators.validate_decimal(str(value), max_value=max_value):
+            raise ApiError(
+                HTTPStatus.BAD_REQUEST,
+                f"{value} doit être compris entre 0 et {max_value}",
+            )
+
+        return Decimal(sanitizers.sanitize_decimal(str(value)))
+
+    return convert
+
+
+def _iso_date(value) -> datetime.date:
+    """Converts a date given in ISO format (AAAA-MM-JJ)."""
+
+    try:
+        return datetime.date.fromisoformat(str(value))
+
+    except ValueError:
+        raise ApiError(HTTPStatus.BAD_REQUEST, f"date invalide : {value} (AAAA-MM-JJ)")
+
+
+def _paid(_: Session, value) -> bool:
+    """Validates the payment status of a course."""
+
+    if not isinstance(value, bool):
+        raise ApiError(HTTPStatus.BAD_REQUEST, "paid doit valoir true ou false")
+
+    return value
+
+
+def _reference(model: Type[Base]) -> Callable[[Session, object], uuid.UUID]:
+    """Returns the converter of the identifier of an existing entity of the model."""
+
+    def convert(current_session: Session, value) -> uuid.UUID:
+        identifier = _identifier(value)
+
+        if current_session.get(model, identifier) is None:
+            raise ApiError(HTTPStatus.BAD_REQUEST, f"entité introuvable : {value}")
+
+        return identifier
+
+    return convert
+
+
+def _identifier(value) -> uuid.UUID:
+    """Converts the identifier of an entity."""
+
+    try:
+        return uuid.UUID(str(value))
+
+    except ValueError:
+        raise ApiError(HTTPStatus.NOT_FOUND, f"identifiant invalide : {value}")
+
+
+class Resource(NamedTuple):
+    """Description of the entities exposed under a path : their model, the
+    converter of each writable field, the fields that can be omitted on
+    creation and the function turning an entity into JSON."""
+
+    model: Type[Base]
+    fields: dict[str, Callable[[Session, object], object]]
+    optional: frozenset[str]
+    to_json: Callable[[Base], dict]
+
+
+RESOURCES = {
+    "students": Resource(
+        Student,
+        {
+            "first_name": _name,
+            "last_name": _name,
+            "phone_number": _phone_number,
+            "email_address": _email_address,
+            "address": _address,
+        },
+        frozenset({"address"}),
+        lambda student: {
+            "id": str(student.id),
+            "first_name": student.first_name,
+            "last_name": student.last_name,
+            "phone_number": student.phone_number,
+            "email_address": student.email_address,
+            "address": student.address,
+        },
+    ),
+    "rates": Resource(
+        HourlyRate,
+        {"name": _name, "price": _decimal_field(Decimal("999.99"))},
+        frozenset(),
+        lambda hourly_rate: {
+            "id": str(hourly_rate.id),
+            "name": hourly_rate.name,
+            "price": str(hourly_rate.price),
+        },
+    ),
+    "courses": Resource(
+        Course,
+        {
+            "date": lambda _, value: _iso_date(value),
+            "duration": _decimal_field(Decimal("9.9")),
+            "paid": _paid,
+            "student_id": _reference(Student),
+            "hourly_rate_id": _reference(HourlyRate),
+        },
+        frozenset({"paid"}),
+        lambda course: {
+            "id": str(course.id),
+            "date": course.date.isoformat(),
+            "duration": str(course.duration),
+            "paid": course.paid,
+            "student_id": str(course.student_id),
+            "hourly_rate_id": str(course.hourly_rate_id),
+        },
+    ),
+}
+
+
+def encode_cursor(entity: Base) -> str:
+    """Returns the cursor of the page following the given entity."""
+
+    values = [str(value) for value in entity_keyset(entity)]
+    return base64.urlsafe_b64encode(json.dumps(values).encode()).decode()
+
+
+def decode_cursor(model: Type[Base], cursor: str) -> tuple:
+    """Returns the keyset encoded in the cursor."""
+
+    columns, _ = KEYSET_ORDERS[model]
+
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+
+        return tuple(
+            (
+                datetime.date.fromisoformat(value)
+                if column.type.python_type is datetime.date
+                else column.type.python_type(value)
+            )
+            for column, value in zip(columns, values, strict=True)
+        )
+
+    except (ValueError, TypeError):
+        raise ApiError(HTTPStatus.BAD_REQUEST, f"curseur invalide : {cursor}")
+
+
+def _query_parameter(query: dict, name: str, default=None):
+    """Returns the value of a parameter of the query string."""
+
+    values = query.get(name)
+    return values[0] if values else default
+
+
+def list_entities(current_session: Session, resource: Resource, query: dict) -> dict:
+    """Returns a page of entities and the cursor of the following one."""
+
+    try:
+        limit = int(_query_parameter(query, "limit", DEFAULT_PAGE_SIZE))
+
+    except ValueError:
+        limit = 0
+
+    if not MAX_PAGE_SIZE >= limit >= 1:
+        raise ApiError(
+            HTTPStatus.BAD_REQUEST, f"limit doit être entre 1 et {MAX_PAGE_SIZE}"
+        )
+
+    cursor = _query_parameter(query, "after")
+    after = decode_cursor(resource.model, cursor) if cursor is not None else None
+
+    # One more entity is fetched to know whether a following page exists
+    entities = current_session.scalars(
+        entity_page_query(resource.model, after, limit + 1)
+    ).all()
+
+    return {
+        "items": [resource.to_json(entity) for entity in entities[:limit]],
+        "next": encode_cursor(entities[limit - 1]) if len(entities) > limit else None,
+    }
+
+
+def _find(current_session: Session, resource: Resource, raw_id: str) -> Base:
+    """Returns the entity with the given identifier."""
+
+    entity = current_session.get(resource.model, _identifier(raw_id))
+
+    if entity is None:
+        raise ApiError(HTTPStatus.NOT_FOUND, f"entité introuvable : {raw_id}")
+
+    return entity
+
+
+def _apply_fields(
+    current_session: Session, resource: Resource, entity: Base, data, creation: bool
+) -> None:
+    """Validates the fields given in the body of the request and sets them
+    on the entity ; on creation, every mandatory field must be given."""
+
+    if not isinstance(data, dict):
+        raise ApiError(HTTPStatus.BAD_REQUEST, "le corps doit être un objet JSON")
+
+    unknown = set(data) - set(resource.fields)
+
+    if unknown:
+        raise ApiError(HTTPStatus.BAD_REQUEST, f"champs inconnus : {sorted(unknown)}")
+
+    missing = set(resource.fields) - resource.optional - set(data)
+
+    if creation and missing:
+        raise ApiError(HTTPStatus.BAD_REQUEST, f"champs manquants : {sorted(missing)}")
+
+    for name, value in data.items():
+        setattr(entity, name, resource.fields[name](current_session, value))
+
+
+def edit_entity(current_session: Session, resource: Resource, entity: Base, data):
+    """Sets the fields given in the body of the request on the entity. The
+    payment status of a course is changed by the payments module, so that the
+    allocations and the payments of the course are updated along with it."""
+
+    paid = None
+
+    if resource.model is Course and isinstance(data, dict) and "paid" in data:
+        data = dict(data)
+        paid = _paid(current_session, data.pop("paid"))
+
+    _apply_fields(current_session, resource, entity, data, creation=False)
+
+    # The amount allocated or cancelled depends on the other fields
+    current_session.flush()
+
+    if paid is not None:
+        payments.mark_courses(
+            current_session, payments.selection_criterion(course_ids=[entity.id]), paid
+        )
+        current_session.refresh(entity)
+
+
+def gains_statistics(current_session: Session, query: dict) -> dict:
+    """Returns the gains made between the dates of the query string."""
+
+    since = _query_parameter(query, "since")
+
+    if since is None:
+        raise ApiError(HTTPStatus.BAD_REQUEST, "paramètre since manquant")
+
+    since = _iso_date(since)
+    until = _query_parameter(query, "until")
+    until = _iso_date(until) if until is not None else None
+
+    return {
+        "since": since.isoformat(),
+        "until": until.isoformat() if until is not None else None,
+        "gains": str(stats_cache.gains(current_session, since, until)),
+    }
+
+
+def debt_statistics(current_session: Session) -> list[dict]:
+    """Returns the debt of every student."""
+
+    return [
+        {
+            "student_id": str(student.id),
+            "full_name": student.full_name,
+            "debt": str(debt),
+        }
+        for student, debt in stats_cache.debt_per_student(current_session)
+    ]
+
+
+class ApiRequestHandler(BaseHTTPRequestHandler):
+    """Handles the requests of a connection, kept alive between requests."""
+
+    protocol_version = "HTTP/1.1"
+    server_version = "GestionnaireCours"
+    timeout = KEEP_ALIVE_TIMEOUT
+
+    # The headers and the body are sent separately : with Nagle's algorithm,
+    # the body would wait for the acknowledgement of the headers (~40 ms)
+    disable_nagle_algorithm = True
+
+    def do_GET(self):
+        self._dispatch("GET")
+
+    def do_POST(self):
+        self._dispatch("POST")
+
+    def do_PATCH(self):
+        self._dispatch("PATCH")
+
+    def do_DELETE(self):
+        self._dispatch("DELETE")
+
+    def log_request(self, code="-", size="-"):
+        # Only the errors are logged, one line per request being too costly
+        pass
+
+    def _read_json(self):
+        """Returns the JSON body of the request."""
+
+        length = int(self.headers.get("Content-Length") or 0)
+
+        if length > MAX_BODY_SIZE:
+            # The unread body would be taken for the next request
+            self.close_connection = True
+            raise ApiError(HTTPStatus.REQUEST_ENTITY_TOO_LARGE, "corps trop volumineux")
+
+        try:
+            return json.loads(self.rfile.read(length) or b"null")
+
+        except ValueError:
+            raise ApiError(HTTPStatus.BAD_REQUEST, "corps JSON illisible")
+
+    def _route(self, method: str, parts: list[str], query: dict, data):
+        """Runs the request within a transaction and returns the status
+        of the response and the data to send."""
+
+        if parts[:1] == ["stats"] and len(parts) == 2 and method == "GET":
+            with database.get_session_maker().begin() as db_session:
+                if parts[1] == "debts":
+                    return HTTPStatus.OK, debt_statistics(db_session)
+
+                if parts[1] == "gains":
+                    return HTTPStatus.OK, gains_statistics(db_session, query)
+
+        if not parts or parts[0] not in RESOURCES or len(parts) > 2:
+            raise ApiError(HTTPStatus.NOT_FOUND, f"ressource introuvable : {self.path}")
+
+        resource = RESOURCES[parts[0]]
+        allowed = ("GET", "POST") if len(parts) == 1 else ("GET", "PATCH", "DELETE")
+
+        if method not in allowed:
+            raise ApiError(HTTPStatus.METHOD_NOT_ALLOWED, f"méthode {method} interdite")
+
+        with database.get_session_maker().begin() as db_session:
+            if len(parts) == 1 and method == "GET":
+                return HTTPStatus.OK, list_entities(db_session, resource, query)
+
+            if method == "POST":
+                entity = resource.model()
+                _apply_fields(db_session, resource, entity, data, creation=True)
+                db_session.add(entity)
+                db_session.flush()
+
+                return HTTPStatus.CREATED, resource.to_json(entity)
+
+            entity = _find(db_session, resource, parts[1])
+
+            if method == "DELETE":
+                db_session.delete(entity)
+                return HTTPStatus.NO_CONTENT, None
+
+            if method == "PATCH":
+                edit_entity(db_session, resource, entity, data)
+
+            return HTTPStatus.OK, resource.to_json(entity)
+
+    def _dispatch(self, method: str) -> None:
+        """Serves the request and sends the JSON response."""
+
+        url = urlsplit(self.path)
+        parts = [part for part in url.path.split("/") if part]
+
+        try:
+            # The body is read before opening the transaction
+            data = self._read_json() if method in ("POST", "PATCH") else None
+
+            with instrumentation.tracking(f"API {method} /{parts[0] if parts else ''}"):
+                status, payload = self._route(method, parts, parse_qs(url.query), data)
+
+        except ApiError as error:
+            status, payload = error.status, {"error": error.message}
+
+        except Exception as error:
+            self.log_error("%s %s : %r", method, self.path, error)
+            status, payload = HTTPStatus.INTERNAL_SERVER_ERROR, {
+                "error": "erreur interne"
+            }
+            self.close_connection = True
+
+        self._send_json(status, payload, conditional=method == "GET")
+
+    def _send_json(self, status: HTTPStatus, payload, conditional: bool) -> None:
+        """Sends the payload as JSON ; when conditional, the response carries
+        an ETag, and is empty if the client already has this version."""
+
+        body = b""
+        headers = {}
+
+        if payload is not None:
+            body = json.dumps(payload, ensure_ascii=False).encode()
+            headers["Content-Type"] = "application/json; charset=utf-8"
+
+        if conditional and status == HTTPStatus.OK:
+            etag = f'"{hashlib.blake2b(body, digest_size=16).hexdigest()}"'
+            headers["ETag"] = etag
+            headers["Cache-Control"] = "no-cache"
+
+            known = self.headers.get("If-None-Match", "")
+
+            if etag in (tag.strip() for tag in known.split(",")) or known == "*":
+                status, body = HTTPStatus.NOT_MODIFIED, b""
+                del headers["Content-Type"]
+
+        if status not in (HTTPStatus.NO_CONTENT, HTTPStatus.NOT_MODIFIED):
+            headers["Content-Length"] = str(len(body))
+
+        self.send_response(status)
+
+        for name, value in headers.items():
+            self.send_header(name, value)
+
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class PooledHTTPServer(HTTPServer):
+    """HTTP server handing each connection to a fixed pool of worker threads,
+    instead of starting a thread per connection."""
+
+    request_queue_size = 128
+
+    def __init__(self, address: tuple[str, int], workers: int):
+        super().__init__(address, ApiRequestHandler)
+        self.executor = ThreadPoolExecutor(workers, thread_name_prefix="api")
+
+    def process_request(self, request, client_address):
+        self.executor.submit(self._process_request_thread, request, client_address)
+
+    def _process_request_thread(self, request, client_address):
+        """Serves the connection in a worker, like socketserver.ThreadingMixIn."""
+
+        try:
+            self.finish_request(request, client_address)
+
+        except Exception:
+            self.handle_error(request, client_address)
+
+        finally:
+            self.shutdown_request(request)
+
+    def server_close(self):
+        super().server_close()
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+
+def serve(host: str = "127.0.0.1", port: int = 8000, workers: int = 8) -> None:
+    """Serves the API until interrupted with Ctrl+C."""
+
+    server = PooledHTTPServer((host, port), workers)
+    print(f"API disponible sur http://{host}:{server.server_port} ({workers} workers)")
+
+    try:
+        server.serve_forever()
+
+    except KeyboardInterrupt:
+        print("Arrêt du serveur.", file=sys.stderr)
+
+    finally:
+        server.server_close()
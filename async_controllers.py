@@ -0,0 +1,110 @@
+"""This file defines the async counterparts of the controllers, for front ends
+serving several users from one asyncio process (e.g. a web API). Instead of
+prompting and printing, their methods return the entities and statistics,
+read through an AsyncSession (see database.async_session_maker). The queries
+are built by the same functions as for the sync controllers (see queries.py)."""
+
+import datetime
+from decimal import Decimal
+from typing import Type, Sequence
+
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import joinedload
+from sqlalchemy.sql.base import ExecutableOption
+
+import database
+from instrumentation import instrumented
+from models import Base, Student, HourlyRate, Course
+from queries import (
+    StudentDebt,
+    balance_debt_per_student_query,
+    balance_gains_queries,
+    entity_list_query,
+)
+
+
+class AsyncBaseController:
+    """Base class for the async controllers, containing the async
+    session factory, and implementing basic reads of entities."""
+
+    # Loader options applied by _get_entity_list, indexed by operation : the
+    # relationships cannot be lazily loaded by an async session, so every
+    # relationship used by an operation has to be declared here
+    LOADER_OPTIONS: dict[str, Sequence[ExecutableOption]] = {}
+
+    def __init__(self, model: Type[Base]):
+        self.session_maker = database.async_session_maker()
+        self.model = model
+
+    @instrumented
+    async def get_entity_list(self, limit: int | None = 15) -> list[Base]:
+        """Returns the entities of the model, within the given limit."""
+
+        async with self.session_maker() as db_session:
+            return await self._get_entity_list(
+                db_session, self.model, limit, operation="get_entity_list"
+            )
+
+    @classmethod
+    async def _get_entity_list(
+        cls,
+        current_session: AsyncSession,
+        model: Base,
+        limit: int | None,
+        operation: str | None = None,
+    ) -> list[Base]:
+        """Returns a list of the entites from the given model available
+        in the database, loading the relationships needed by the operation."""
+
+        stmt = entity_list_query(model, limit, cls.LOADER_OPTIONS.get(operation, ()))
+
+        return list(await current_session.scalars(stmt))
+
+
+class AsyncStudentController(AsyncBaseController):
+    """Async reads of the students and of their debts."""
+
+    def __init__(self):
+        super().__init__(Student)
+
+    @instrumented
+    async def get_debt_per_student(self) -> list[StudentDebt]:
+        """Returns the debt of every student, read from the ledger balances."""
+
+        async with self.session_maker() as db_session:
+            result = await db_session.execute(balance_debt_per_student_query())
+
+            return [StudentDebt(student, Decimal(debt)) for student, debt in result]
+
+
+class AsyncHourlyRateController(AsyncBaseController):
+    """Async reads of the hourly rates."""
+
+    def __init__(self):
+        super().__init__(HourlyRate)
+
+
+class AsyncCourseController(AsyncBaseController):
+    """Async reads of the courses and of the gains."""
+
+    # The description of a course contains the name of its student
+    LOADER_OPTIONS = {
+        "get_entity_list": (joinedload(Course.student),),
+    }
+
+    def __init__(self):
+        super().__init__(Course)
+
+    @instrumented
+    async def get_gains(
+        self, start_date: datetime.date, end_date: datetime.date | None = None
+    ) -> Decimal:
+        """Returns the gains made between the two given dates (both included)."""
+
+        async with self.session_maker() as db_session:
+            total = Decimal(0)
+
+            for stmt in balance_gains_queries(start_date, end_date):
+                total += Decimal(await db_session.scalar(stmt))
+
+            return total
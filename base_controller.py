@@ -1,20 +1,17 @@
 """This file defines the BaseController class, which contains
-an instance of the connection to the database. This class should
-then be inherited from by controller classes."""
+the session factory of the database (see database.py). This class
+should then be inherited from by controller classes."""
 
-from typing import Type, Callable
+from typing import Type, Callable, Sequence
 
-from sqlalchemy import create_engine, select
-from sqlalchemy.orm import sessionmaker, Session
+from sqlalchemy.orm import Session
+from sqlalchemy.sql.base import ExecutableOption
 
+import database
+from instrumentation import instrumented
 from models import Base
 from prompts import prompt_entity_choice
-
-# Points to a sqlite file located in the root folder
-DATABASE_URL = "sqlite+pysqlite:///data.db"
-
-# The <echo> parameter toggles logging from SQL
-engine = create_engine(DATABASE_URL, echo=False)
+from queries import entity_list_query
 
 
 class BaseController:
@@ -22,14 +19,22 @@ class BaseController:
     instance of sessionmaker, and implementing basic operations
     on entities."""
 
+    # Loader options (joinedload, selectinload...) applied by _get_entity_list
+    # and _load_relationships, indexed by operation : subclasses declare the
+    # relationships each operation walks, so that they are not lazily loaded
+    # row by row
+    LOADER_OPTIONS: dict[str, Sequence[ExecutableOption]] = {}
+
     def __init__(self, model: Type[Base], prompt: Callable[[Session, Base], Base]):
-        self.session_maker = sessionmaker(bind=engine)
+        # All the controllers share the same session factory
+        self.session_maker = database.get_session_maker()
         self.model = model
 
         # This attribute contains a function that displays a form
         # requesting the information to the user to create the entity.
         self.prompt_entity = prompt
 
+    @instrumented
     def create_entity(self) -> None:
         """Request the information related to a new entity and then
         stores the information in the database."""
@@ -42,6 +47,7 @@ class BaseController:
             self.prompt_entity(db_session, entity)
             db_session.add(entity)
 
+    @instrumented
     def edit_entity(
         self, prompt_message: str = "Quelle entité voulez-vous modifier ?"
     ) -> None:
@@ -55,6 +61,7 @@ class BaseController:
             # The prompt function changes the entity according to the user choices
             self.prompt_entity(db_session, chosen_entity)
 
+    @instrumented
     def delete_entity(
         self, prompt_message: str = "Quelle entité voulez-vous supprimer ?"
     ) -> None:
@@ -65,9 +72,13 @@ class BaseController:
             # We ask the user to choose an entity to delete
             chosen_entity = prompt_entity_choice(db_session, self.model, prompt_message)
 
+            # The deletion cascades to the related entities, loaded beforehand
+            self._load_relationships(db_session, chosen_entity, "delete_entity")
+
             # We delete the corresponding entity in the database
             db_session.delete(chosen_entity)
 
+    @instrumented
     def display_entity_list(
         self,
         limit: int = 15,
@@ -78,7 +89,9 @@ class BaseController:
 
         # We open a new session and retrieve the list of entities
         with self.session_maker.begin() as db_session:
-            entity_list = BaseController._get_entity_list(db_session, self.model, limit)
+            entity_list = self._get_entity_list(
+                db_session, self.model, limit, operation="display_entity_list"
+            )
 
             print(message)
 
@@ -86,10 +99,32 @@ class BaseController:
                 print(f"→ {entity}")
 
     @classmethod
-    def _get_entity_list(cls, current_session: Session, model: Base, limit: int | None):
+    def _load_relationships(
+        cls, current_session: Session, entity: Base, operation: str
+    ) -> None:
+        """Loads the relationships of the entity walked by the operation,
+        with the loader options it declares (a query per relationship)."""
+
+        options = cls.LOADER_OPTIONS.get(operation)
+
+        if options:
+            model = type(entity)
+            current_session.scalars(
+                entity_list_query(model, None, options).where(model.id == entity.id)
+            ).all()
+
+    @classmethod
+    def _get_entity_list(
+        cls,
+        current_session: Session,
+        model: Base,
+        limit: int | None,
+        operation: str | None = None,
+    ):
         """Returns a list of the entites from the given model available
-        in the database."""
+        in the database, loading the relationships needed by the operation."""
 
         # We create the query and return the result
-        stmt = select(model).limit(limit) if limit is not None else select(model)
+        stmt = entity_list_query(model, limit, cls.LOADER_OPTIONS.get(operation, ()))
+
         return current_session.scalars(stmt)
@@ -0,0 +1,100 @@
+"""Load test of the JSON API (see api.py) : several clients send GET requests
+to a running instance over kept-alive connections, and the throughput and
+latency percentiles are printed. With --etag, every client sends back the
+ETag it received, as a dashboard polling the same URL would.
+
+Start the server, then run from the root folder of the project :
+    python3 main.py serve --workers 8
+    python3 -m benchmarks.api_load --url http://127.0.0.1:8000/courses --clients 8"""
+
+import argparse
+import http.client
+import threading
+import time
+from urllib.parse import urlsplit
+
+
+def run_client(
+    url: str, requests: int, etag: bool, latencies: list[float], statuses: dict
+) -> None:
+    """Sends the requests one after the other on a single connection,
+    recording the latency and the status of each response."""
+
+    parts = urlsplit(url)
+    path = parts.path + (f"?{parts.query}" if parts.query else "")
+    connection = http.client.HTTPConnection(parts.hostname, parts.port or 80)
+    headers = {}
+
+    try:
+        for _ in range(requests):
+            start = time.perf_counter()
+            connection.request("GET", path, headers=headers)
+            response = connection.getresponse()
+            response.read()
+            latencies.append(time.perf_counter() - start)
+
+            statuses[response.status] = statuses.get(response.status, 0) + 1
+
+            if etag and response.getheader("ETag"):
+                headers["If-None-Match"] = response.getheader("ETag")
+
+    finally:
+        connection.close()
+
+
+def percentile(sorted_values: list[float], ratio: float) -> float:
+    """Returns the value below which the given ratio of the values fall."""
+
+    index = min(len(sorted_values) - 1, int(ratio * len(sorted_values)))
+    return sorted_values[index]
+
+
+def main() -> None:
+    """Runs the clients and prints the figures."""
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--url", default="http://127.0.0.1:8000/courses")
+    parser.add_argument("--clients", type=int, default=8)
+    parser.add_argument("--requests", type=int, default=500, help="par client")
+    parser.add_argument("--etag", action="store_true")
+    args = parser.parse_args()
+
+    latencies = [[] for _ in range(args.clients)]
+    statuses = [{} for _ in range(args.clients)]
+
+    threads = [
+        threading.Thread(
+            target=run_client,
+            args=(args.url, args.requests, args.etag, latencies[i], statuses[i]),
+        )
+        for i in range(args.clients)
+    ]
+
+    start = time.perf_counter()
+
+    for thread in threads:
+        thread.start()
+
+    for thread in threads:
+        thread.join()
+
+    elapsed = time.perf_counter() - start
+
+    all_latencies = sorted(latency for client in latencies for latency in client)
+    all_statuses = {}
+
+    for client in statuses:
+        for status, count in client.items():
+            all_statuses[status] = all_statuses.get(status, 0) + count
+
+    print(f"{len(all_latencies)} requêtes en {elapsed:.2f} s ({args.clients} clients)")
+    print(f"Débit        {len(all_latencies) / elapsed:>10.1f} requêtes/s")
+
+    for name, ratio in (("p50", 0.5), ("p90", 0.9), ("p99", 0.99)):
+        print(f"Latence {name}  {percentile(all_latencies, ratio) * 1000:>10.2f} ms")
+
+    print(f"Statuts      {dict(sorted(all_statuses.items()))}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+"""Benchmark comparing the computation of the debt per student done with
+the SQL aggregation of the queries file against the former Python loop,
+which lazily loaded the courses and the hourly rate of every student.
+
+Run from the root folder of the project :
+    python3 -m benchmarks.debt_per_student --students 500 --courses 50000"""
+
+import argparse
+import time
+from decimal import Decimal
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import Session
+
+from benchmarks.generator import generate
+from models import Base, Student
+from queries import debt_per_student
+
+
+def legacy_debt_per_student(session: Session) -> list[tuple[Student, Decimal]]:
+    """Former implementation : every relationship is lazily loaded."""
+
+    result = []
+
+    for student in session.query(Student):
+        debt = Decimal(0)
+
+        for course in student.courses:
+            if not course.paid:
+                debt += course.hourly_rate.price * course.duration
+
+        result.append((student, debt))
+
+    return result
+
+
+def measure(engine, function) -> tuple[float, int, dict]:
+    """Runs the function in a fresh session and returns the elapsed time,
+    the number of statements emitted and the debts indexed by student id."""
+
+    statements = 0
+
+    def count_statement(*_):
+        nonlocal statements
+        statements += 1
+
+    event.listen(engine, "before_cursor_execute", count_statement)
+
+    try:
+        with Session(engine) as session:
+            start = time.perf_counter()
+            debts = {student.id: debt for student, debt in function(session)}
+            elapsed = time.perf_counter() - start
+    finally:
+        event.remove(engine, "before_cursor_execute", count_statement)
+
+    return elapsed, statements, debts
+
+
+def main() -> None:
+    """Builds the synthetic database and prints the comparison."""
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--students", type=int, default=200)
+    parser.add_argument("--rates", type=int, default=5)
+    parser.add_argument("--courses", type=int, default=20000)
+    args = parser.parse_args()
+
+    engine = create_engine("sqlite+pysqlite:///:memory:")
+    Base.metadata.create_all(engine)
+
+    with Session(engine) as session:
+        generate(session, args.courses, args.students, args.rates)
+
+    legacy = measure(engine, legacy_debt_per_student)
+    aggregated = measure(engine, debt_per_student)
+
+    # Both implementations must agree before comparing them
+    for student_id, debt in legacy[2].items():
+        assert abs(aggregated[2][student_id] - debt) < Decimal("0.01"), student_id
+
+    print(f"{args.students} élèves, {args.courses} cours")
+
+    for name, (elapsed, statements, _) in (
+        ("Boucle Python", legacy),
+        ("Agrégation SQL", aggregated),
+    ):
+        print(f"{name:<15} {elapsed * 1000:>10.1f} ms {statements:>8} requêtes")
+
+
+if __name__ == "__main__":
+    main()
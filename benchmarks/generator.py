@@ -0,0 +1,223 @@
+"""Generator of synthetic data, filling a scratch database with students, hourly
+rates and courses spread over a date range, for the benchmarks. The data
+follows the shape of a real activity : a few students take most of the courses
+(Pareto distribution) and mostly at the same rate, there are fewer courses on
+Sundays and during the summer holidays, most courses last one hour or one and
+a half, and the recent courses are more often unpaid than the old ones.
+
+The rows are inserted by batches, so that millions of courses can be generated
+in constant memory, and the balances of the ledger are computed at the end.
+
+Run from the root folder of the project :
+    python3 -m benchmarks.generator scratch.db --courses 100000"""
+
+import argparse
+import datetime
+import random
+import uuid
+from decimal import Decimal
+from itertools import accumulate, islice
+from typing import Iterator, NamedTuple
+
+from sqlalchemy import insert
+from sqlalchemy.orm import Session
+
+import ledger
+from database import create_app_engine
+from models import Base, Student, HourlyRate, HourlyRatePrice, Course
+from rates import initial_price_rows
+
+FIRST_NAMES = (
+    "Léa", "Hugo", "Chloé", "Louis", "Emma", "Gabriel", "Inès", "Jules", "Manon",
+    "Arthur", "Camille", "Adam", "Sarah", "Nathan", "Jade", "Raphaël", "Lucie",
+)  # fmt: skip
+
+LAST_NAMES = (
+    "Martin", "Bernard", "Dubois", "Thomas", "Robert", "Richard", "Petit",
+    "Durand", "Leroy", "Moreau", "Simon", "Laurent", "Lefebvre", "Michel",
+    "Garcia", "David", "Bertrand", "Roux", "Vincent", "Fournier", "Morel",
+)  # fmt: skip
+
+RATE_NAMES = ("Collège", "Lycée", "Prépa", "Licence", "Stage", "Groupe", "Oral")
+
+# Durations of the courses, in hours, and their weights
+DURATIONS = (Decimal("1"), Decimal("1.5"), Decimal("2"), Decimal("2.5"))
+DURATION_WEIGHTS = (0.45, 0.35, 0.15, 0.05)
+
+# Share of the courses taken at the usual rate of the student
+USUAL_RATE_SHARE = 0.9
+
+# Probability that a course is paid, depending on its age
+RECENT_DAYS = 60
+PAID_RECENT = 0.6
+PAID_OLD = 0.97
+
+
+class GenerationSummary(NamedTuple):
+    """Number of entities generated."""
+
+    students: int
+    rates: int
+    courses: int
+
+
+def default_students(courses: int) -> int:
+    """Returns the number of students generated by default for the courses."""
+
+    return max(10, courses // 50)
+
+
+def _day_weight(day: datetime.date) -> float:
+    """Returns the relative probability that a course is given on the day."""
+
+    weight = 0.2 if day.weekday() == 6 else 1.0
+
+    # Summer holidays
+    if day.month in (7, 8):
+        weight *= 0.3
+
+    return weight
+
+
+def _batches(rows: Iterator[dict], batch_size: int) -> Iterator[list[dict]]:
+    """Groups the rows in lists of batch_size rows."""
+
+    while batch := list(islice(rows, batch_size)):
+        yield batch
+
+
+def generate(
+    current_session: Session,
+    courses: int,
+    students: int | None = None,
+    rates: int = 5,
+    start_date: datetime.date | None = None,
+    end_date: datetime.date | None = None,
+    seed: int = 0,
+    batch_size: int = 10000,
+) -> GenerationSummary:
+    """Inserts the given numbers of random students, hourly rates and courses
+    (given between start_date and end_date, by default the last three years),
+    then recomputes the balances. The same seed gives the same data."""
+
+    generator = random.Random(seed)
+    students = students if students is not None else default_students(courses)
+    end_date = end_date or datetime.date.today()
+    start_date = start_date or end_date - datetime.timedelta(days=3 * 365)
+
+    rate_ids = [uuid.uuid4() for _ in range(rates)]
+
+    rate_rows = [
+        {
+            "id": rate_id,
+            "name": f"{RATE_NAMES[i % len(RATE_NAMES)]} {i // len(RATE_NAMES) + 1}",
+            "price": Decimal(min(90, max(15, round(generator.gauss(35, 10))))),
+        }
+        for i, rate_id in enumerate(rate_ids)
+    ]
+    current_session.execute(insert(HourlyRate), rate_rows)
+    current_session.execute(insert(HourlyRatePrice), initial_price_rows(rate_rows))
+
+    # Each student has a usual rate and a level of activity
+    student_ids = [uuid.uuid4() for _ in range(students)]
+    usual_rates = [generator.choice(rate_ids) for _ in range(students)]
+    activity = list(accumulate(generator.paretovariate(1.2) for _ in range(students)))
+
+    for batch in _batches(
+        (
+            {
+                "id": student_id,
+                "first_name": generator.choice(FIRST_NAMES),
+                "last_name": generator.choice(LAST_NAMES),
+                "phone_number": f"+336{generator.randrange(10**8):08d}",
+                "email_address": f"eleve{i}@example.com",
+                "address": f"{generator.randrange(1, 200)} rue de la Paix",
+            }
+            for i, student_id in enumerate(student_ids)
+        ),
+        batch_size,
+    ):
+        current_session.execute(insert(Student), batch)
+
+    days = [
+        start_date + datetime.timedelta(days=offset)
+        for offset in range((end_date - start_date).days + 1)
+    ]
+    day_weights = list(accumulate(_day_weight(day) for day in days))
+    recent = end_date - datetime.timedelta(days=RECENT_DAYS)
+
+    def course_rows() -> Iterator[dict]:
+        for _ in range(courses):
+            index = generator.choices(range(students), cum_weights=activity)[0]
+            date = generator.choices(days, cum_weights=day_weights)[0]
+
+            yield {
+                "id": uuid.uuid4(),
+                "date": date,
+                "duration": generator.choices(DURATIONS, DURATION_WEIGHTS)[0],
+                "paid": generator.random()
+                < (PAID_RECENT if date > recent else PAID_OLD),
+                "student_id": student_ids[index],
+                "hourly_rate_id": (
+                    usual_rates[index]
+                    if generator.random() < USUAL_RATE_SHARE
+                    else generator.choice(rate_ids)
+                ),
+            }
+
+    # The balances are computed once at the end rather than batch by batch
+    for batch in _batches(course_rows(), batch_size):
+        current_session.execute(insert(Course), batch)
+
+    ledger.rebuild(current_session)
+    current_session.commit()
+
+    return GenerationSummary(students, rates, courses)
+
+
+def create_scratch_database(url: str, **kwargs) -> GenerationSummary:
+    """Creates the tables in the database at the given URL and fills it ;
+    kwargs are passed to generate."""
+
+    engine = create_app_engine(url)
+    Base.metadata.create_all(engine)
+
+    try:
+        with Session(engine) as db_session:
+            return generate(db_session, **kwargs)
+
+    finally:
+        engine.dispose()
+
+
+def main() -> None:
+    """Fills the scratch database given on the command line."""
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("database", help="fichier SQLite à créer")
+    parser.add_argument("--courses", type=int, default=10000)
+    parser.add_argument("--students", type=int)
+    parser.add_argument("--rates", type=int, default=5)
+    parser.add_argument("--since", type=datetime.date.fromisoformat)
+    parser.add_argument("--until", type=datetime.date.fromisoformat)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    summary = create_scratch_database(
+        f"sqlite+pysqlite:///{args.database}",
+        courses=args.courses,
+        students=args.students,
+        rates=args.rates,
+        start_date=args.since,
+        end_date=args.until,
+        seed=args.seed,
+    )
+
+    print(
+        f"{summary.students} élèves, {summary.rates} taux horaires et "
+        f"{summary.courses} cours générés dans {args.database}."
+    )
+
+
+if __name__ == "__main__":
+    main()
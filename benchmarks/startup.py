@@ -0,0 +1,122 @@
+"""Startup time check of the entry points of the tool : the imports done before
+the main menu appears, and before a command of the CLI runs. Each entry point
+is imported in a fresh interpreter with -X importtime, several times ; the best
+total import time is compared to its budget, and the modules which must only be
+imported on first use (SQLAlchemy for the menus, InquirerPy for the commands,
+phonenumbers and email_validator for both) are checked to be absent. The
+slowest imports are printed, and any failure is reported (exit code 1).
+
+Run from the root folder of the project :
+    python3 -m benchmarks.startup
+    python3 -m benchmarks.startup --repeat 10 --scale 1.5"""
+
+import argparse
+import os
+import re
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Code run by each entry point before it waits for the user
+ENTRY_POINTS = {
+    "menu": "import main, menus",
+    "cli": "import main, cli; cli.build_parser()",
+}
+
+# Budget of each entry point, in milliseconds of import time (measured at about
+# half of it when it was set, to leave room for slower machines)
+BUDGETS_MS = {"menu": 400, "cli": 900}
+
+# Modules which must not be imported by each entry point
+FORBIDDEN_MODULES = {
+    "menu": ("sqlalchemy", "phonenumbers", "email_validator", "database"),
+    "cli": ("InquirerPy", "phonenumbers", "email_validator", "http.server", "menus"),
+}
+
+# Line of the output of -X importtime : self and cumulative times (in
+# microseconds), then the module, indented by two spaces per level
+IMPORT_TIME_LINE = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \| ( *)(\S+)")
+
+
+def measure(code: str) -> tuple[float, list[tuple[float, str]], set[str]]:
+    """Runs the code in a fresh interpreter and returns its total import time in
+    milliseconds, the imports it triggered directly with their cumulative time,
+    and the names of all the modules imported."""
+
+    completed = subprocess.run(
+        [
+            sys.executable,
+            "-X",
+            "importtime",
+            "-c",
+            f"{code}\nimport sys\nprint('\\n'.join(sys.modules))",
+        ],
+        cwd=ROOT,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+
+    total = 0
+    direct_imports = []
+
+    for match in IMPORT_TIME_LINE.finditer(completed.stderr):
+        self_time, cumulative, indent, module = match.groups()
+        total += int(self_time)
+
+        # The modules imported by main, menus and cli are one level deeper
+        if len(indent) == 2:
+            direct_imports.append((int(cumulative) / 1000, module))
+
+    return total / 1000, direct_imports, set(completed.stdout.split())
+
+
+def check(name: str, repeat: int, scale: float) -> list[str]:
+    """Measures an entry point, prints its figures and returns its failures."""
+
+    runs = [measure(ENTRY_POINTS[name]) for _ in range(repeat)]
+
+    # The best run is the least disturbed by the rest of the machine
+    total, direct_imports, modules = min(runs, key=lambda run: run[0])
+    budget = BUDGETS_MS[name] * scale
+
+    print(f"\n{name} : {total:.1f} ms (budget : {budget:.0f} ms)")
+
+    for cumulative, module in sorted(direct_imports, reverse=True)[:5]:
+        print(f"  {module:<40} {cumulative:>8.1f} ms")
+
+    failures = []
+
+    if total > budget:
+        failures.append(f"{name} : {total:.1f} ms au lieu de {budget:.0f} ms")
+
+    for module in FORBIDDEN_MODULES[name]:
+        if module in modules:
+            failures.append(f"{name} : {module} importé au démarrage")
+
+    return failures
+
+
+def main() -> None:
+    """Checks every entry point."""
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument(
+        "--scale", type=float, default=1.0, help="multiplie les budgets"
+    )
+    args = parser.parse_args()
+
+    failures = []
+
+    for name in ENTRY_POINTS:
+        failures += check(name, args.repeat, args.scale)
+
+    if failures:
+        print("\nRégressions :", *failures, sep="\n  ")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
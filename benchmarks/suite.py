@@ -0,0 +1,221 @@
+"""Benchmark suite of the queries run by the controllers, on scratch databases
+of increasing sizes filled by the generator. For each operation, the median
+time, the number of SQL statements and the peak of memory allocated are
+compared to a baseline file, and the regressions are reported (exit code 1).
+
+The operations are the queries behind the menus, without the prompts and
+the display : the debt per student, the gains since a date, the list of the
+courses and the first pages of the course picker.
+
+Run from the root folder of the project :
+    python3 -m benchmarks.suite --sizes 1000 10000 100000 1000000
+    python3 -m benchmarks.suite --save-baseline"""
+
+import argparse
+import datetime
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from typing import Callable
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from benchmarks.generator import create_scratch_database
+from course_controller import CourseController
+from database import create_app_engine
+from models import Course
+from prompts import PAGE_SIZE
+from queries import (
+    balance_debt_per_student,
+    balance_gains,
+    entity_keyset,
+    entity_page_query,
+)
+
+DEFAULT_SIZES = (1000, 10000, 100000)
+
+BASELINE_FILE = os.path.join(os.path.dirname(__file__), "baseline.json")
+
+# Relative increase of the time or of the memory reported as a regression
+DEFAULT_TOLERANCE = 0.5
+
+# Increase of the time, in milliseconds, below which the noise is ignored
+MIN_TIME_INCREASE_MS = 2.0
+
+
+def _course_picker_pages(current_session: Session) -> None:
+    """Fetches the first two pages of the course picker."""
+
+    page = current_session.scalars(entity_page_query(Course, None, PAGE_SIZE + 1)).all()
+    current_session.scalars(
+        entity_page_query(Course, entity_keyset(page[PAGE_SIZE - 1]), PAGE_SIZE + 1)
+    ).all()
+
+
+def operations(end_date: datetime.date) -> dict[str, Callable[[Session], object]]:
+    """Returns the benchmarked operations, named after the controller
+    method (or prompt) running them."""
+
+    return {
+        "StudentController.display_debt_per_student": balance_debt_per_student,
+        "CourseController.display_gains_since_date": lambda current_session: (
+            balance_gains(
+                current_session, end_date.replace(day=15) - datetime.timedelta(days=365)
+            )
+        ),
+        "CourseController.display_entity_list": lambda current_session: list(
+            CourseController._get_entity_list(
+                current_session, Course, 15, operation="display_entity_list"
+            )
+        ),
+        "prompt_entity_choice (cours)": _course_picker_pages,
+    }
+
+
+def measure(engine, operation: Callable[[Session], object], repeat: int) -> dict:
+    """Runs the operation in fresh sessions and returns its median time,
+    the number of statements it executes and its peak of allocated memory."""
+
+    statements = 0
+
+    def count_statement(*_):
+        nonlocal statements
+        statements += 1
+
+    times = []
+
+    for _ in range(repeat):
+        with Session(engine) as db_session:
+            start = time.perf_counter()
+            operation(db_session)
+            times.append(time.perf_counter() - start)
+
+    # The statements and the memory are measured apart, as tracing slows down
+    event.listen(engine, "before_cursor_execute", count_statement)
+    tracemalloc.start()
+
+    try:
+        with Session(engine) as db_session:
+            operation(db_session)
+
+        _, peak = tracemalloc.get_traced_memory()
+
+    finally:
+        tracemalloc.stop()
+        event.remove(engine, "before_cursor_execute", count_statement)
+
+    return {
+        "time_ms": round(statistics.median(times) * 1000, 3),
+        "statements": statements,
+        "peak_kib": round(peak / 1024, 1),
+    }
+
+
+def run(sizes: list[int], repeat: int, directory: str) -> dict:
+    """Generates a database per size and measures every operation on it."""
+
+    results = {}
+    end_date = datetime.date(2024, 6, 30)
+
+    for size in sizes:
+        path = os.path.join(directory, f"courses_{size}.db")
+        url = f"sqlite+pysqlite:///{path}"
+
+        start = time.perf_counter()
+        create_scratch_database(url, courses=size, end_date=end_date)
+        print(
+            f"{size} cours générés en {time.perf_counter() - start:.1f} s",
+            file=sys.stderr,
+        )
+
+        engine = create_app_engine(url)
+
+        try:
+            results[str(size)] = {
+                name: measure(engine, operation, repeat)
+                for name, operation in operations(end_date).items()
+            }
+
+        finally:
+            engine.dispose()
+
+    return results
+
+
+def compare(results: dict, baseline: dict, tolerance: float) -> list[str]:
+    """Prints the results next to the baseline and returns the regressions."""
+
+    regressions = []
+
+    for size, measures in results.items():
+        print(f"\n{size} cours")
+
+        for name, figures in measures.items():
+            reference = baseline.get(size, {}).get(name)
+            line = (
+                f"  {name:<45} {figures['time_ms']:>10.2f} ms"
+                f" {figures['statements']:>4} requêtes {figures['peak_kib']:>10.1f} Kio"
+            )
+
+            if reference is not None:
+                line += f"  (référence : {reference['time_ms']:.2f} ms)"
+
+                if figures["time_ms"] > max(
+                    reference["time_ms"] * (1 + tolerance),
+                    reference["time_ms"] + MIN_TIME_INCREASE_MS,
+                ):
+                    regressions.append(f"{size} cours, {name} : temps")
+
+                if figures["statements"] > reference["statements"]:
+                    regressions.append(f"{size} cours, {name} : requêtes")
+
+                if figures["peak_kib"] > reference["peak_kib"] * (1 + tolerance):
+                    regressions.append(f"{size} cours, {name} : mémoire")
+
+            print(line)
+
+    return regressions
+
+
+def main() -> None:
+    """Runs the suite and compares it to the baseline."""
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--baseline", default=BASELINE_FILE)
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE)
+    parser.add_argument(
+        "--save-baseline", action="store_true", help="enregistre les mesures"
+    )
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        results = run(args.sizes, args.repeat, directory)
+
+    baseline = {}
+
+    if os.path.exists(args.baseline):
+        with open(args.baseline, encoding="utf-8") as file:
+            baseline = json.load(file)
+
+    regressions = compare(results, baseline, args.tolerance)
+
+    if args.save_baseline:
+        with open(args.baseline, "w", encoding="utf-8") as file:
+            json.dump({**baseline, **results}, file, indent=2, ensure_ascii=False)
+
+        print(f"\nMesures enregistrées dans {args.baseline}.")
+
+    elif regressions:
+        print("\nRégressions :", *regressions, sep="\n  ")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
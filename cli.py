@@ -0,0 +1,613 @@
+"""This file implements the non-interactive interface of the tool : subcommands
+of main.py that create entities, mark courses as paid and display statistics
+without any prompt, so that the tool can be driven by scripts. Each invocation
+validates all its records first, then writes them in a single transaction.
+The menus and their prompts are not imported, and neither is the API server
+unless it is started, so that the commands start quickly.
+
+Examples :
+    python3 main.py courses add --course 03/06/2024 1.5 eleve@example.com Lycée
+    python3 main.py courses mark-paid --student eleve@example.com --until 30/06/2024
+    python3 main.py payments add eleve@example.com 120 --date 01/07/2024
+    python3 main.py stats gains --since 01/06/2024
+    python3 main.py stats report --period week --by student --since 01/06/2024
+    python3 main.py stats rollup
+    python3 main.py import courses cours.csv --errors rejets.txt
+    python3 main.py export cours.jsonl.gz --format jsonl --since 01/01/2024 --unpaid
+    python3 main.py statements releves --format html --until 30/06/2024
+    python3 main.py journal show --type course --since 01/10/2024
+    python3 main.py journal archive 31/12/2023 journal_2023.jsonl.gz
+    python3 main.py serve --port 8000"""
+
+import argparse
+import datetime
+import sys
+import uuid
+from contextlib import nullcontext
+from decimal import Decimal
+from typing import Type
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+import database
+import exporter
+import importer
+import journal
+import payments
+import reports
+import rollup
+import validators
+import sanitizers
+import statements
+import stats_cache
+from models import Base, Student, HourlyRate, Course
+
+
+class CommandError(Exception):
+    """Raised when a command cannot be executed ;
+    the message is displayed to the user."""
+
+
+def _parse_date(raw_date: str) -> datetime.date:
+    """Validates and converts a date given on the command line."""
+
+    if not validators.validate_date(raw_date):
+        raise CommandError(f"Date invalide : {raw_date} (format jj/mm/AAAA).")
+
+    return sanitizers.sanitize_date(raw_date)
+
+
+def _parse_decimal(
+    raw_decimal: str, min_value=Decimal("0.0"), max_value=Decimal("999.99")
+) -> Decimal:
+    """Validates and rounds a decimal number given on the command line."""
+
+    if not validators.validate_decimal(raw_decimal, min_value, max_value):
+        raise CommandError(
+            f"Valeur invalide : {raw_decimal} (entre {min_value} et {max_value})."
+        )
+
+    return Decimal(sanitizers.sanitize_decimal(raw_decimal))
+
+
+def _parse_name(raw_name: str) -> str:
+    """Validates a name given on the command line."""
+
+    if not 50 >= len(raw_name) >= 3:
+        raise CommandError(f"Nom invalide : {raw_name} (entre 3 et 50 caractères).")
+
+    return raw_name
+
+
+def _find_entity(
+    current_session: Session, model: Type[Base], column, value: str, label: str
+) -> Base:
+    """Returns the entity of the model whose column has the given value,
+    the label describing the entity in the error message."""
+
+    entity = current_session.scalars(
+        select(model).where(column == value).limit(1)
+    ).first()
+
+    if entity is None:
+        raise CommandError(f"{label} introuvable : {value}.")
+
+    return entity
+
+
+def add_students(args: argparse.Namespace) -> None:
+    """Creates the students given with --student."""
+
+    students = []
+    phone_checks = validators.check_phone_numbers(record[2] for record in args.student)
+
+    for record, phone_check in zip(args.student, phone_checks):
+        first_name, last_name, phone_number, email_address, address = record
+
+        if not phone_check.valid:
+            raise CommandError(f"Numéro de téléphone invalide : {phone_number}.")
+
+        if not validators.validate_email_address(email_address):
+            raise CommandError(f"Adresse email invalide : {email_address}.")
+
+        students.append(
+            Student(
+                _parse_name(first_name),
+                _parse_name(last_name),
+                phone_check.normalized,
+                sanitizers.sanitize_email_address(email_address),
+                address,
+            )
+        )
+
+    with database.get_session_maker().begin() as db_session:
+        db_session.add_all(students)
+
+    print(f"{len(students)} élève(s) créé(s).")
+
+
+def add_hourly_rates(args: argparse.Namespace) -> None:
+    """Creates the hourly rates given with --rate."""
+
+    hourly_rates = [
+        HourlyRate(_parse_name(name), _parse_decimal(price))
+        for name, price in args.rate
+    ]
+
+    with database.get_session_maker().begin() as db_session:
+        db_session.add_all(hourly_rates)
+
+    print(f"{len(hourly_rates)} taux horaire(s) créé(s).")
+
+
+def add_courses(args: argparse.Namespace) -> None:
+    """Creates the courses given with --course ; the students are referred
+    to by their email address and the hourly rates by their name."""
+
+    # Every record is validated before opening the transaction
+    records = [
+        (
+            _parse_date(date),
+            _parse_decimal(duration, max_value=Decimal("9.9")),
+            email_address,
+            rate_name,
+        )
+        for date, duration, email_address, rate_name in args.course
+    ]
+
+    with database.get_session_maker().begin() as db_session:
+        for date, duration, email_address, rate_name in records:
+            student = _find_entity(
+                db_session, Student, Student.email_address, email_address, "Élève"
+            )
+            hourly_rate = _find_entity(
+                db_session, HourlyRate, HourlyRate.name, rate_name, "Taux horaire"
+            )
+
+            course = Course(date, duration, args.paid)
+            course.student = student
+            course.hourly_rate = hourly_rate
+
+            db_session.add(course)
+
+    print(f"{len(records)} cours créé(s).")
+
+
+def _mark_courses(args: argparse.Namespace, paid: bool) -> None:
+    """Marks as paid (or unpaid) the courses selected by the arguments, with
+    a single statement (see payments.py), or only counts them with --dry-run."""
+
+    if not (args.id or args.student or args.rate or args.since or args.until):
+        raise CommandError("Aucun critère de sélection des cours n'a été donné.")
+
+    since = _parse_date(args.since) if args.since is not None else None
+    until = _parse_date(args.until) if args.until is not None else None
+    label = "payé" if paid else "impayé"
+
+    with database.get_session_maker().begin() as db_session:
+        student_id = hourly_rate_id = None
+
+        if args.student is not None:
+            student_id = _find_entity(
+                db_session, Student, Student.email_address, args.student, "Élève"
+            ).id
+
+        if args.rate is not None:
+            hourly_rate_id = _find_entity(
+                db_session, HourlyRate, HourlyRate.name, args.rate, "Taux horaire"
+            ).id
+
+        criterion = payments.selection_criterion(
+            student_id, hourly_rate_id, since, until, args.id
+        )
+
+        if args.dry_run:
+            courses, amount = payments.preview(db_session, criterion, paid)
+            print(f"{courses} cours ({amount:.2f}€) à marquer comme {label}(s).")
+            return
+
+        result = payments.mark_courses(db_session, criterion, paid)
+
+    print(f"{result.courses} cours ({result.amount:.2f}€) marqué(s) comme {label}(s).")
+
+
+def add_payment(args: argparse.Namespace) -> None:
+    """Records a payment of a student and allocates it to his oldest
+    unpaid courses (see payments.py)."""
+
+    amount = _parse_decimal(args.amount, payments.MIN_AMOUNT, payments.MAX_AMOUNT)
+    payment_date = _parse_date(args.date) if args.date is not None else None
+
+    with database.get_session_maker().begin() as db_session:
+        student = _find_entity(
+            db_session, Student, Student.email_address, args.student, "Élève"
+        )
+
+        try:
+            result = payments.allocate_payment(
+                db_session, student.id, amount, payment_date
+            )
+        except payments.ExcessPaymentError as error:
+            raise CommandError(
+                f"Le montant dépasse la dette de l'élève ({error.due:.2f}€)."
+            ) from error
+
+    print(
+        f"Paiement de {amount:.2f}€ réparti sur {result.courses} cours, dont "
+        f"{result.paid_courses} payé(s) en totalité."
+    )
+
+
+def display_debts(_: argparse.Namespace) -> None:
+    """Prints the debt of every student, one per line."""
+
+    with database.get_session_maker().begin() as db_session:
+        for student, debt in stats_cache.debt_per_student(db_session):
+            print(f"{student.full_name}\t{student.email_address}\t{debt:.2f}")
+
+
+def display_gains(args: argparse.Namespace) -> None:
+    """Prints the gains made between the given dates."""
+
+    since = _parse_date(args.since)
+    until = _parse_date(args.until) if args.until is not None else None
+
+    with database.get_session_maker().begin() as db_session:
+        print(f"{stats_cache.gains(db_session, since, until):.2f}")
+
+
+def display_report(args: argparse.Namespace) -> None:
+    """Prints the revenue report, or writes it in a file (see reports.py)."""
+
+    since = _parse_date(args.since) if args.since is not None else None
+    until = _parse_date(args.until) if args.until is not None else None
+
+    with database.get_session_maker().begin() as db_session:
+        rows = reports.revenue_report(db_session, args.period, args.by, since, until)
+
+    if args.output is None:
+        print(reports.format_report(rows, args.by))
+
+    else:
+        count = exporter.write_rows(args.output, args.format, reports.COLUMNS, rows)
+        print(f"{count} ligne(s) exportée(s) dans {args.output}.")
+
+
+def refresh_rollup(args: argparse.Namespace) -> None:
+    """Freezes the completed months in the rollup (see rollup.py)."""
+
+    with database.get_session_maker().begin() as db_session:
+        if args.rebuild:
+            rollup.thaw(db_session.connection())
+
+        count = rollup.refresh(db_session)
+        boundary = rollup.frozen_until(db_session)
+
+    print(f"{count} mois gelé(s).")
+
+    if boundary is not None:
+        print(
+            f"Cours parcourus à partir du {boundary.strftime(validators.DATE_FORMAT)}."
+        )
+
+
+def import_entities(args: argparse.Namespace) -> None:
+    """Imports the entities of a CSV or JSONL file (see importer.py)."""
+
+    model = {"students": Student, "rates": HourlyRate, "courses": Course}[args.kind]
+
+    file_format = args.format or (
+        "jsonl" if args.file.endswith((".jsonl", ".json")) else "csv"
+    )
+
+    with open(args.file, newline="", encoding="utf-8") as file, (
+        open(args.errors, "w", encoding="utf-8")
+        if args.errors is not None
+        else nullcontext(sys.stderr)
+    ) as errors:
+        summary = importer.import_file(
+            database.get_session_maker(),
+            model,
+            file,
+            file_format,
+            errors,
+            batch_size=args.batch_size,
+            commit_size=args.commit_size,
+        )
+
+    print(
+        f"{summary.imported} enregistrement(s) importé(s), "
+        f"{summary.rejected} rejeté(s)."
+    )
+
+
+def export_courses(args: argparse.Namespace) -> None:
+    """Exports the courses matching the filters (see exporter.py)."""
+
+    since = _parse_date(args.since) if args.since is not None else None
+    until = _parse_date(args.until) if args.until is not None else None
+
+    with database.get_session_maker().begin() as db_session:
+        count = exporter.export_courses(
+            db_session, args.file, args.format, since, until, args.paid
+        )
+
+    print(f"{count} cours exporté(s) dans {args.file}.")
+
+
+def generate_statements(args: argparse.Namespace) -> None:
+    """Writes the statements of the unpaid courses (see statements.py)."""
+
+    until = _parse_date(args.until) if args.until is not None else None
+
+    with database.get_session_maker().begin() as db_session:
+        student_ids = None
+
+        if args.student:
+            student_ids = [
+                _find_entity(
+                    db_session, Student, Student.email_address, email, "Élève"
+                ).id
+                for email in args.student
+            ]
+
+        summary = statements.generate_statements(
+            db_session,
+            args.directory,
+            args.format,
+            until,
+            student_ids,
+            workers=args.workers,
+        )
+
+    print(
+        f"{summary.statements} relevé(s) écrit(s) dans {args.directory} "
+        f"({summary.courses} cours impayés, {summary.total:.2f}€)."
+    )
+
+
+def _journal_range(
+    since: str | None, until: str | None
+) -> tuple[datetime.datetime | None, datetime.datetime | None]:
+    """Returns the bounds of the period of the journal between the given dates
+    (both included, no bound if None)."""
+
+    start = end = None
+
+    if since is not None:
+        start = datetime.datetime.combine(_parse_date(since), datetime.time())
+
+    if until is not None:
+        end = datetime.datetime.combine(
+            _parse_date(until) + datetime.timedelta(days=1), datetime.time()
+        )
+
+    return start, end
+
+
+def display_journal(args: argparse.Namespace) -> None:
+    """Prints the changes journaled between the given dates (see journal.py)."""
+
+    start, end = _journal_range(args.since, args.until)
+    operations = {
+        "insert": "création",
+        "update": "modification",
+        "delete": "suppression",
+    }
+
+    with database.get_session_maker().begin() as db_session:
+        stmt = journal.journal_query(args.id, args.type, start, end)
+
+        if args.limit is not None:
+            stmt = stmt.limit(args.limit)
+
+        for entry in db_session.scalars(stmt):
+            print(
+                f"{entry.changed_at.strftime(validators.DATE_FORMAT + ' %H:%M:%S')}  "
+                f"{operations[entry.operation]}  {entry.entity_type}  {entry.entity_id}"
+            )
+
+            if entry.operation == "update":
+                for key, (before, after) in journal.changed_columns(entry).items():
+                    print(f"    {key} : {before} → {after}")
+
+            # The whole entity is printed when it is created or deleted
+            else:
+                for key, value in (entry.after_image or entry.before_image).items():
+                    print(f"    {key} : {value}")
+
+
+def archive_journal(args: argparse.Namespace) -> None:
+    """Moves the oldest entries of the journal to a file (see journal.py)."""
+
+    _, end = _journal_range(None, args.until)
+
+    with database.get_session_maker().begin() as db_session:
+        count = journal.archive(db_session, end, args.file)
+
+    print(f"{count} modification(s) archivée(s) dans {args.file}.")
+
+
+def serve_api(args: argparse.Namespace) -> None:
+    """Serves the JSON API until interrupted (see api.py)."""
+
+    # The HTTP server is only loaded by this command
+    import api
+
+    api.serve(args.host, args.port, args.workers)
+
+
+def _course_selection_arguments(parser: argparse.ArgumentParser) -> None:
+    """Adds the arguments selecting the courses to mark."""
+
+    parser.add_argument(
+        "--id", type=uuid.UUID, action="append", help="identifiant d'un cours"
+    )
+    parser.add_argument("--student", help="adresse email de l'élève")
+    parser.add_argument("--rate", help="nom du taux horaire")
+    parser.add_argument("--since", help="date du premier cours (jj/mm/AAAA)")
+    parser.add_argument("--until", help="date du dernier cours (jj/mm/AAAA)")
+    parser.add_argument(
+        "--dry-run", action="store_true", help="affiche les cours sans les marquer"
+    )
+
+
+def build_parser() -> argparse.ArgumentParser:
+    """Builds the parser of the subcommands."""
+
+    parser = argparse.ArgumentParser(
+        prog="main.py", description="Gestionnaire de cours particuliers."
+    )
+    groups = parser.add_subparsers(required=True)
+
+    students = groups.add_parser("students", help="gestion des élèves")
+    commands = students.add_subparsers(required=True)
+    command = commands.add_parser("add", help="créer des élèves")
+    command.add_argument(
+        "--student",
+        nargs=5,
+        action="append",
+        required=True,
+        metavar=("PRÉNOM", "NOM", "TÉLÉPHONE", "EMAIL", "ADRESSE"),
+    )
+    command.set_defaults(handler=add_students)
+
+    rates = groups.add_parser("rates", help="gestion des taux horaires")
+    commands = rates.add_subparsers(required=True)
+    command = commands.add_parser("add", help="créer des taux horaires")
+    command.add_argument(
+        "--rate", nargs=2, action="append", required=True, metavar=("NOM", "TARIF")
+    )
+    command.set_defaults(handler=add_hourly_rates)
+
+    courses = groups.add_parser("courses", help="gestion des cours")
+    commands = courses.add_subparsers(required=True)
+    command = commands.add_parser("add", help="créer des cours")
+    command.add_argument(
+        "--course",
+        nargs=4,
+        action="append",
+        required=True,
+        metavar=("DATE", "DURÉE", "EMAIL", "TAUX"),
+    )
+    command.add_argument("--paid", action="store_true", help="cours déjà payés")
+    command.set_defaults(handler=add_courses)
+
+    command = commands.add_parser("mark-paid", help="marquer des cours comme payés")
+    _course_selection_arguments(command)
+    command.set_defaults(handler=lambda args: _mark_courses(args, True))
+
+    command = commands.add_parser("mark-unpaid", help="marquer des cours comme impayés")
+    _course_selection_arguments(command)
+    command.set_defaults(handler=lambda args: _mark_courses(args, False))
+
+    payment = groups.add_parser("payments", help="paiements des élèves")
+    commands = payment.add_subparsers(required=True)
+    command = commands.add_parser(
+        "add", help="enregistrer un paiement, réparti sur les cours les plus anciens"
+    )
+    command.add_argument("student", help="adresse email de l'élève")
+    command.add_argument("amount", help="montant payé")
+    command.add_argument("--date", help="date du paiement (jj/mm/AAAA)")
+    command.set_defaults(handler=add_payment)
+
+    stats = groups.add_parser("stats", help="statistiques")
+    commands = stats.add_subparsers(required=True)
+    command = commands.add_parser("debts", help="montants dus par les élèves")
+    command.set_defaults(handler=display_debts)
+
+    command = commands.add_parser("gains", help="gains sur une période")
+    command.add_argument("--since", required=True, help="date de début (jj/mm/AAAA)")
+    command.add_argument("--until", help="date de fin incluse (jj/mm/AAAA)")
+    command.set_defaults(handler=display_gains)
+
+    command = commands.add_parser("report", help="revenus par période")
+    command.add_argument("--period", choices=reports.PERIODS, default="month")
+    command.add_argument("--by", choices=reports.BREAKDOWNS, help="détail des montants")
+    command.add_argument("--since", help="date du premier cours (jj/mm/AAAA)")
+    command.add_argument("--until", help="date du dernier cours (jj/mm/AAAA)")
+    command.add_argument("--output", help="fichier produit au lieu du tableau")
+    command.add_argument("--format", choices=exporter.FORMATS, default="csv")
+    command.set_defaults(handler=display_report)
+
+    command = commands.add_parser("rollup", help="geler les mois terminés")
+    command.add_argument(
+        "--rebuild", action="store_true", help="recalcule aussi les mois déjà gelés"
+    )
+    command.set_defaults(handler=refresh_rollup)
+
+    command = groups.add_parser("import", help="importer un fichier CSV ou JSONL")
+    command.add_argument("kind", choices=("students", "rates", "courses"))
+    command.add_argument("file", help="fichier à importer")
+    command.add_argument("--format", choices=("csv", "jsonl"))
+    command.add_argument(
+        "--batch-size", type=int, default=1000, help="lignes insérées par requête"
+    )
+    command.add_argument(
+        "--commit-size", type=int, default=10000, help="lignes par transaction"
+    )
+    command.add_argument("--errors", help="fichier recevant les lignes rejetées")
+    command.set_defaults(handler=import_entities)
+
+    command = groups.add_parser("export", help="exporter les cours")
+    command.add_argument("file", help="fichier produit (compressé si .gz)")
+    command.add_argument("--format", choices=exporter.FORMATS, default="csv")
+    command.add_argument("--since", help="date du premier cours (jj/mm/AAAA)")
+    command.add_argument("--until", help="date du dernier cours (jj/mm/AAAA)")
+    payment = command.add_mutually_exclusive_group()
+    payment.add_argument("--paid", action="store_true", default=None)
+    payment.add_argument("--unpaid", action="store_false", dest="paid")
+    command.set_defaults(handler=export_courses)
+
+    command = groups.add_parser("statements", help="relevés des cours impayés")
+    command.add_argument("directory", help="dossier dans lequel écrire les relevés")
+    command.add_argument("--format", choices=statements.FORMATS, default="txt")
+    command.add_argument("--until", help="date du dernier cours (jj/mm/AAAA)")
+    command.add_argument(
+        "--student", action="append", help="adresse email d'un élève (tous sinon)"
+    )
+    command.add_argument("--workers", type=int, help="processus (un par CPU sinon)")
+    command.set_defaults(handler=generate_statements)
+
+    history = groups.add_parser("journal", help="journal des modifications")
+    commands = history.add_subparsers(required=True)
+    command = commands.add_parser("show", help="afficher les modifications")
+    command.add_argument("--id", type=uuid.UUID, help="identifiant d'une entité")
+    command.add_argument("--type", choices=journal.ENTITY_TYPES)
+    command.add_argument("--since", help="date de début (jj/mm/AAAA)")
+    command.add_argument("--until", help="date de fin incluse (jj/mm/AAAA)")
+    command.add_argument("--limit", type=int, help="nombre maximal de modifications")
+    command.set_defaults(handler=display_journal)
+
+    command = commands.add_parser(
+        "archive", help="déplacer les modifications anciennes dans un fichier"
+    )
+    command.add_argument("until", help="date de la dernière modification archivée")
+    command.add_argument("file", help="fichier JSONL complété (compressé si .gz)")
+    command.set_defaults(handler=archive_journal)
+
+    command = groups.add_parser("serve", help="servir l'API JSON")
+    command.add_argument("--host", default="127.0.0.1", help="adresse d'écoute")
+    command.add_argument("--port", type=int, default=8000, help="port d'écoute")
+    command.add_argument(
+        "--workers", type=int, default=8, help="requêtes traitées en parallèle"
+    )
+    command.set_defaults(handler=serve_api)
+
+    return parser
+
+
+def main(argv: list[str]) -> int:
+    """Runs the subcommand described by the arguments and returns the exit code."""
+
+    args = build_parser().parse_args(argv)
+
+    try:
+        args.handler(args)
+
+    except CommandError as error:
+        print(error, file=sys.stderr)
+        return 1
+
+    return 0
@@ -1,68 +1,92 @@
 """This file defines the CourseController class, used to
-create, edit and delete student instances in the database."""
+create, edit and delete course instances in the database,
+and to mark them as paid or unpaid in bulk."""
 
 import datetime
-from decimal import Decimal
 
 from InquirerPy.utils import color_print
+from sqlalchemy.orm import joinedload
 
+import ledger
+import rollup
+import stats_cache
+from instrumentation import instrumented
 from models import Course
 from validators import DATE_FORMAT
 from base_controller import BaseController
-from prompts import prompt_course, prompt_date, prompt_entity_choice
+from payments import mark_courses, preview, selection_criterion
+from prompts import (
+    prompt_confirmation,
+    prompt_course,
+    prompt_course_selection,
+    prompt_date,
+    prompt_report_options,
+)
+from reports import format_report, revenue_report
 
 
 class CourseController(BaseController):
     """This class controls all course-related operations :
     creation, edition, deletion."""
 
+    # The description of a course contains the name of its student
+    LOADER_OPTIONS = {
+        "display_entity_list": (joinedload(Course.student),),
+    }
+
     def __init__(self):
         super().__init__(Course, prompt_course)
 
+    @instrumented
     def mark_as_paid(self) -> None:
-        """Asks the user to choose a course and marks the selected course as paid."""
+        """Asks the user to choose some courses and marks them as paid."""
 
-        with self.session_maker.begin() as db_session:
-            # We ask the user to choose a specific course
-            chosen_course = prompt_entity_choice(
-                db_session,
-                self.model,
-                prompt_message="Quel cours voulez-vous marquer comme payé ?",
-            )
-
-            # Then we mark the course as paid
-            chosen_course.paid = True
+        self._mark_courses(True)
 
+    @instrumented
     def mark_as_unpaid(self) -> None:
-        """Asks the user to choose a course and marks the selected course as unpaid."""
+        """Asks the user to choose some courses and marks them as unpaid."""
+
+        self._mark_courses(False)
+
+    def _mark_courses(self, paid: bool) -> None:
+        """Asks the user to choose some courses, displays their number and their
+        amount, and marks them as paid (or unpaid) once confirmed."""
+
+        label = "payé" if paid else "impayé"
 
         with self.session_maker.begin() as db_session:
-            # We ask the user to choose a specific course
-            chosen_course = prompt_entity_choice(
-                db_session,
-                self.model,
-                prompt_message="Quel cours voulez-vous marquer comme impayé ?",
-            )
+            criterion = selection_criterion(**prompt_course_selection(db_session, paid))
+            courses, amount = preview(db_session, criterion, paid)
+
+            if courses == 0:
+                color_print([("yellow", f"Aucun cours à marquer comme {label}.")])
+                return
+
+            if not prompt_confirmation(
+                f"Marquer {courses} cours ({amount:.2f}€) comme {label}(s) ?"
+            ):
+                return
 
-            # Then we mark the course as unpaid
-            chosen_course.paid = False
+            # A single statement marks every course, committed with the payment
+            result = mark_courses(db_session, criterion, paid)
 
+        color_print([("green", f"{result.courses} cours marqué(s) comme {label}(s).")])
+
+    @instrumented
     def display_gains_since_date(self) -> None:
         """Displays the gains made by the user since a given date."""
 
-        with self.session_maker.begin() as db_sesion:
+        with self.session_maker.begin() as db_session:
             # We prompt the user for a given date (by default, the first day of the month)
             chosen_date = prompt_date(
                 datetime.date.today().replace(day=1),
                 prompt_message="Date à partir de laquelle les gains seront compatbilisés :",
             )
 
-            courses_list = self._get_entity_list(db_sesion, self.model, limit=None)
-            gains = Decimal(0)
-
-            for course in courses_list:
-                if course.date >= chosen_date and course.paid:
-                    gains += course.duration * course.hourly_rate.price
+            # The sum is read from the monthly balances maintained by the ledger,
+            # or from the cache if nothing changed since the last time
+            total = stats_cache.gains(db_session, chosen_date)
 
             color_print(
                 [
@@ -70,6 +94,69 @@ class CourseController(BaseController):
                         "white",
                         f"Gains réalisé depuis le {chosen_date.strftime(DATE_FORMAT)} :",
                     ),
-                    ("green", f" {gains:.2f}€"),
+                    ("green", f" {total:.2f}€"),
+                ]
+            )
+
+    @instrumented
+    def display_revenue_report(self) -> None:
+        """Displays the revenue, the hours taught and the amounts due
+        per period, since a given date."""
+
+        period, breakdown = prompt_report_options()
+
+        # By default, the report covers the current year
+        chosen_date = prompt_date(
+            datetime.date.today().replace(month=1, day=1),
+            prompt_message="Date à partir de laquelle les cours sont comptabilisés :",
+        )
+
+        with self.session_maker.begin() as db_session:
+            rows = revenue_report(db_session, period, breakdown, chosen_date)
+
+        print(format_report(rows, breakdown))
+
+    @instrumented
+    def refresh_rollup(self) -> None:
+        """Freezes the completed months in the rollup (see rollup.py)."""
+
+        with self.session_maker.begin() as db_session:
+            count = rollup.refresh(db_session)
+
+        color_print([("green", f"{count} mois gelé(s) dans le résumé mensuel.")])
+
+    @instrumented
+    def rebuild_balances(self) -> None:
+        """Recomputes the balances maintained by the ledger from the courses."""
+
+        with self.session_maker.begin() as db_session:
+            ledger.rebuild(db_session)
+
+            # The balances are rewritten without going through the ORM
+            stats_cache.mark_changed(db_session)
+
+        color_print([("green", "Les soldes ont été recalculés.")])
+
+    @instrumented
+    def verify_balances(self) -> None:
+        """Recomputes the balances from the courses and
+        displays the differences with the stored ones."""
+
+        with self.session_maker.begin() as db_session:
+            drifts = ledger.verify(db_session)
+
+        if not drifts:
+            color_print([("green", "Aucun écart entre les soldes et les cours.")])
+
+        for drift in drifts:
+            color_print(
+                [
+                    ("white", f"→ {drift.table} {drift.key} - "),
+                    (
+                        "red",
+                        f"Dette : {drift.stored_debt:.2f}€ au lieu de "
+                        f"{drift.expected_debt:.2f}€, gains : {drift.stored_gains:.2f}€ "
+                        f"au lieu de {drift.expected_gains:.2f}€",
+                    ),
                 ]
             )
@@ -0,0 +1,262 @@
+"""This file creates the engine and the session factory shared by the whole app,
+on first use (see get_session_maker). The database is chosen by the
+GESTIONNAIRE_DATABASE_URL environment variable, or else by the [database]
+section of the configuration file (config.ini, or the file given by
+GESTIONNAIRE_CONFIG), and defaults to the data.db SQLite file.
+
+Example of configuration file :
+    [database]
+    url = postgresql+psycopg://gestionnaire@localhost/cours
+    pool_size = 5
+    max_overflow = 10
+
+SQLite connections are tuned when they are opened (WAL journal, relaxed
+synchronization, larger page cache, memory mapping) and enforce the foreign
+keys ; server databases get a pool of connections checked before use.
+
+An asyncio session factory on the same database is created on first use by
+async_session_maker, with the async driver of the database (aiosqlite for
+SQLite, asyncpg for PostgreSQL), which then needs to be installed."""
+
+import configparser
+import os
+import threading
+
+from sqlalchemy import Engine, create_engine, event
+from sqlalchemy.engine import make_url
+from sqlalchemy.orm import Session, sessionmaker
+
+import journal
+import ledger
+import rates
+import rollup
+import stats_cache
+from instrumentation import instrument
+
+# Points to a sqlite file located in the root folder
+DEFAULT_DATABASE_URL = "sqlite+pysqlite:///data.db"
+
+URL_VARIABLE = "GESTIONNAIRE_DATABASE_URL"
+CONFIG_VARIABLE = "GESTIONNAIRE_CONFIG"
+DEFAULT_CONFIG_FILE = "config.ini"
+
+# Drivers used by the async engine, per database
+ASYNC_DRIVERS = {"sqlite": "aiosqlite", "postgresql": "asyncpg"}
+
+# Settings of the [database] section, with their default values
+DEFAULT_SETTINGS = {
+    # Logs the SQL statements
+    "echo": "no",
+    # Size of the page cache of SQLite, in KiB
+    "cache_size": "65536",
+    # Size of the file mapped in memory by SQLite, in bytes
+    "mmap_size": "268435456",
+    # Connections kept open (and opened on demand) with a database server
+    "pool_size": "5",
+    "max_overflow": "10",
+    # File sharing the cached statistics between processes (in memory if empty)
+    "stats_cache": "",
+    # Number of statistics results kept in memory
+    "stats_cache_size": "128",
+}
+
+
+def load_settings(path: str | None = None) -> configparser.SectionProxy:
+    """Reads the [database] section of the configuration file, if any."""
+
+    parser = configparser.ConfigParser(defaults=DEFAULT_SETTINGS)
+    parser.read(path or os.environ.get(CONFIG_VARIABLE, DEFAULT_CONFIG_FILE))
+
+    if not parser.has_section("database"):
+        parser.add_section("database")
+
+    return parser["database"]
+
+
+def database_url(settings: configparser.SectionProxy | None = None) -> str:
+    """Returns the URL of the database used by the app."""
+
+    settings = settings if settings is not None else load_settings()
+
+    return os.environ.get(URL_VARIABLE) or settings.get("url", DEFAULT_DATABASE_URL)
+
+
+def _tune_sqlite(engine: Engine, settings: configparser.SectionProxy) -> None:
+    """Sets the pragmas of every SQLite connection opened by the engine."""
+
+    in_memory = engine.url.database in (None, "", ":memory:")
+    cache_size = settings.getint("cache_size")
+    mmap_size = settings.getint("mmap_size")
+
+    @event.listens_for(engine, "connect")
+    def set_pragmas(dbapi_connection, _connection_record):
+        cursor = dbapi_connection.cursor()
+
+        # WAL lets the readers work while a transaction writes, and only
+        # needs the file to be synchronized at checkpoints
+        if not in_memory:
+            cursor.execute("PRAGMA journal_mode=WAL")
+            cursor.execute("PRAGMA synchronous=NORMAL")
+            cursor.execute(f"PRAGMA mmap_size={mmap_size}")
+
+        # A negative size is a number of KiB rather than of pages
+        cursor.execute(f"PRAGMA cache_size=-{cache_size}")
+        cursor.execute("PRAGMA foreign_keys=ON")
+        cursor.close()
+
+
+def create_app_engine(url: str | None = None, **kwargs) -> Engine:
+    """Creates an engine for the given URL (by default the one configured),
+    tuned for its database ; kwargs are passed to create_engine."""
+
+    settings = load_settings()
+    url = make_url(url or database_url(settings))
+
+    kwargs.setdefault("echo", settings.getboolean("echo"))
+
+    if url.get_backend_name() == "sqlite":
+        # SQLAlchemy picks the pool suited to the file or in-memory database
+        engine = create_engine(url, **kwargs)
+        _tune_sqlite(engine, settings)
+
+    else:
+        if "poolclass" not in kwargs:
+            kwargs.setdefault("pool_size", settings.getint("pool_size"))
+            kwargs.setdefault("max_overflow", settings.getint("max_overflow"))
+
+        # The connections of the pool may have been closed by the server
+        kwargs.setdefault("pool_pre_ping", True)
+        engine = create_engine(url, **kwargs)
+
+    return engine
+
+
+def create_app_async_engine(url: str | None = None, **kwargs):
+    """Creates an AsyncEngine for the given URL (by default the one configured),
+    using the async driver of its database and tuned like create_app_engine."""
+
+    # The asyncio extension needs greenlet, only installed with the async drivers
+    from sqlalchemy.ext.asyncio import create_async_engine
+
+    settings = load_settings()
+    url = make_url(url or database_url(settings))
+    url = url.set(
+        drivername=f"{url.get_backend_name()}+{ASYNC_DRIVERS[url.get_backend_name()]}"
+    )
+
+    kwargs.setdefault("echo", settings.getboolean("echo"))
+
+    if url.get_backend_name() == "sqlite":
+        engine = create_async_engine(url, **kwargs)
+
+        # The connection events are those of the underlying sync engine
+        _tune_sqlite(engine.sync_engine, settings)
+
+    else:
+        if "poolclass" not in kwargs:
+            kwargs.setdefault("pool_size", settings.getint("pool_size"))
+            kwargs.setdefault("max_overflow", settings.getint("max_overflow"))
+
+        kwargs.setdefault("pool_pre_ping", True)
+        engine = create_async_engine(url, **kwargs)
+
+    return engine
+
+
+class AsyncBackedSession(Session):
+    """Sync session wrapped by the async sessions, on which the
+    ledger and the instrumentation listen as for the sync ones."""
+
+
+_async_session_maker = None
+
+
+def async_session_maker():
+    """Returns the async session factory shared by the async
+    controllers, creating it and its engine on first use."""
+
+    global _async_session_maker
+
+    if _async_session_maker is None:
+        from sqlalchemy.ext.asyncio import async_sessionmaker
+
+        # The listeners of AsyncBackedSession are registered with the sync ones
+        get_session_maker()
+
+        async_engine = create_app_async_engine()
+        instrument(async_engine.sync_engine)
+
+        # The loaded entities stay readable after the commit, as they
+        # cannot be refreshed lazily outside of an await
+        _async_session_maker = async_sessionmaker(
+            async_engine, expire_on_commit=False, sync_session_class=AsyncBackedSession
+        )
+
+    return _async_session_maker
+
+
+_engine = None
+_session_maker = None
+_lock = threading.Lock()
+
+
+def _configure() -> None:
+    """Creates the engine and the session factory shared by the app, and keeps
+    the balances, the rollup, the cached statistics and the journal of the
+    changes up to date for them."""
+
+    global _engine, _session_maker
+
+    settings = load_settings()
+    engine = create_app_engine()
+
+    # The statements are counted and timed for the diagnostics menu
+    instrument(engine)
+
+    session_maker = sessionmaker(bind=engine)
+
+    # The new prices of the hourly rates are recorded in their history
+    rates.register(session_maker)
+    rates.register(AsyncBackedSession)
+
+    # The balances used by the statistics are updated at each flush
+    ledger.register(session_maker)
+    ledger.register(AsyncBackedSession)
+
+    # The frozen months of the rollup are thawed when their courses change
+    rollup.register(session_maker)
+    rollup.register(AsyncBackedSession)
+
+    # The cached statistics are invalidated by the changes made by the sessions
+    stats_cache.configure(
+        settings.get("stats_cache") or None, settings.getint("stats_cache_size")
+    )
+    stats_cache.register(session_maker)
+    stats_cache.register(AsyncBackedSession)
+
+    # The changes of the students, hourly rates and courses are journaled
+    journal.register(session_maker)
+    journal.register(AsyncBackedSession)
+
+    _engine, _session_maker = engine, session_maker
+
+
+def get_engine() -> Engine:
+    """Returns the engine shared by the app, creating it on first use."""
+
+    get_session_maker()
+
+    return _engine
+
+
+def get_session_maker() -> sessionmaker:
+    """Returns the session factory shared by all the controllers,
+    creating it and its engine on first use."""
+
+    # The engine is not created at import time, so that the commands and
+    # menus which do not touch the database start without it
+    with _lock:
+        if _session_maker is None:
+            _configure()
+
+    return _session_maker
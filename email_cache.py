@@ -0,0 +1,208 @@
+"""This file implements the cache of the deliverability checks of email domains.
+Checking that a domain accepts emails requires DNS lookups, so the result is
+kept per domain for a given time, in memory (limited to the most recently used
+domains) and in a small local SQLite file so that it survives restarts.
+
+The lookups are delegated to a resolver, which can be replaced (for instance
+by a StaticResolver in tests or offline). When the resolver cannot answer,
+an expired result is used rather than rejecting the address."""
+
+import datetime
+import threading
+from collections import OrderedDict
+from typing import Iterable, Protocol
+
+from email_validator import EmailUndeliverableError
+from email_validator.deliverability import validate_email_deliverability
+from sqlalchemy import (
+    Boolean,
+    Column,
+    DateTime,
+    MetaData,
+    String,
+    Table,
+    create_engine,
+    delete,
+    insert,
+    select,
+)
+
+# The cache is stored apart from the main database, so that writing in it
+# never waits for a transaction of the app (e.g. during a bulk import)
+CACHE_URL = "sqlite+pysqlite:///email_domains.db"
+
+# Time during which the result of a lookup is considered valid
+DEFAULT_TTL = datetime.timedelta(days=7)
+
+# Maximum number of domains kept in memory
+DEFAULT_MAX_SIZE = 1024
+
+metadata = MetaData()
+
+email_domain = Table(
+    "email_domain",
+    metadata,
+    Column("domain", String(255), primary_key=True),
+    Column("deliverable", Boolean, nullable=False),
+    Column("checked_at", DateTime, nullable=False),
+)
+
+
+class DomainResolver(Protocol):
+    """Interface of the objects checking whether a domain accepts emails."""
+
+    def is_deliverable(self, domain: str) -> bool | None:
+        """Returns whether the domain accepts emails, None if unknown."""
+
+
+class DnsResolver:
+    """Resolver looking up the MX (or A/AAAA) records of the domain."""
+
+    def is_deliverable(self, domain: str) -> bool | None:
+        """Returns whether the domain accepts emails, None if the
+        lookup did not succeed (timeout, no network...)."""
+
+        try:
+            info = validate_email_deliverability(domain, domain)
+
+        except EmailUndeliverableError:
+            return False
+
+        return None if "unknown-deliverability" in info else True
+
+
+class StaticResolver:
+    """Resolver answering without any network access : the given
+    domains are deliverable, the others get the default answer."""
+
+    def __init__(self, deliverable_domains: Iterable[str] = (), default=True):
+        self.deliverable_domains = {domain.lower() for domain in deliverable_domains}
+        self.default = default
+
+    def is_deliverable(self, domain: str) -> bool | None:
+        """Returns whether the domain is one of the deliverable domains."""
+
+        return domain in self.deliverable_domains or self.default
+
+
+class DeliverabilityCache:
+    """Cache of the deliverability of email domains, with a time to live,
+    kept in memory with a LRU eviction and persisted in a SQLite file
+    (only in memory if url is None)."""
+
+    def __init__(
+        self,
+        resolver: DomainResolver | None = None,
+        ttl: datetime.timedelta = DEFAULT_TTL,
+        max_size: int = DEFAULT_MAX_SIZE,
+        url: str | None = CACHE_URL,
+    ):
+        self.resolver = resolver if resolver is not None else DnsResolver()
+        self.ttl = ttl
+        self.max_size = max_size
+        self.url = url
+
+        # Domain -> (deliverable, time of the check), most recently used last
+        self._entries: OrderedDict[str, tuple[bool, datetime.datetime]] = OrderedDict()
+        self._lock = threading.Lock()
+        self._engine = None
+
+    def _get_engine(self):
+        """Creates the engine of the persisted cache on first use."""
+
+        if self._engine is None:
+            self._engine = create_engine(self.url)
+            metadata.create_all(self._engine)
+
+        return self._engine
+
+    def _remember(self, domain: str, entry: tuple[bool, datetime.datetime]) -> None:
+        """Stores an entry in memory, evicting the least recently used one."""
+
+        with self._lock:
+            self._entries[domain] = entry
+            self._entries.move_to_end(domain)
+
+            if len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def _lookup(self, domain: str) -> tuple[bool, datetime.datetime] | None:
+        """Returns the entry of the domain, from memory or from the file."""
+
+        with self._lock:
+            entry = self._entries.get(domain)
+
+            if entry is not None:
+                self._entries.move_to_end(domain)
+                return entry
+
+        if self.url is None:
+            return None
+
+        with self._get_engine().connect() as connection:
+            row = connection.execute(
+                select(email_domain.c.deliverable, email_domain.c.checked_at).where(
+                    email_domain.c.domain == domain
+                )
+            ).first()
+
+        if row is None:
+            return None
+
+        entry = (row.deliverable, row.checked_at)
+        self._remember(domain, entry)
+
+        return entry
+
+    def _store(self, domain: str, entry: tuple[bool, datetime.datetime]) -> None:
+        """Stores an entry in memory and in the file."""
+
+        self._remember(domain, entry)
+
+        if self.url is not None:
+            with self._get_engine().begin() as connection:
+                connection.execute(
+                    delete(email_domain).where(email_domain.c.domain == domain)
+                )
+                connection.execute(
+                    insert(email_domain).values(
+                        domain=domain, deliverable=entry[0], checked_at=entry[1]
+                    )
+                )
+
+    def is_deliverable(self, domain: str) -> bool:
+        """Returns whether the domain accepts emails, looking it up
+        only if no valid result is cached."""
+
+        domain = domain.lower()
+        now = datetime.datetime.now()
+
+        entry = self._lookup(domain)
+
+        if entry is not None and now - entry[1] < self.ttl:
+            return entry[0]
+
+        deliverable = self.resolver.is_deliverable(domain)
+
+        # The lookup failed : an expired result is better than nothing,
+        # and the address is accepted if the domain was never checked
+        if deliverable is None:
+            return entry[0] if entry is not None else True
+
+        self._store(domain, (deliverable, now))
+
+        return deliverable
+
+    def clear(self) -> None:
+        """Forgets every cached result."""
+
+        with self._lock:
+            self._entries.clear()
+
+        if self.url is not None:
+            with self._get_engine().begin() as connection:
+                connection.execute(delete(email_domain))
+
+
+# Cache used by the validators ; its resolver can be replaced
+default_cache = DeliverabilityCache()
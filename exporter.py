@@ -0,0 +1,138 @@
+"""This file implements the export of the courses, joined with their student and
+hourly rate, to CSV, JSONL or a compact columnar format. The rows are streamed
+from the database (server-side cursor with yield_per) and written as they
+arrive, so that exporting the whole history runs in constant memory. The
+filters on the dates and on the payment are part of the SQL query.
+
+The columnar format is made of JSON lines : the first one describes the
+columns, each following one holds a group of rows stored column by column.
+A path ending with .gz is compressed with gzip, whatever the format."""
+
+import csv
+import datetime
+import gzip
+import json
+from decimal import Decimal
+from itertools import islice
+from typing import Iterable, Iterator, TextIO
+
+from sqlalchemy.orm import Session
+
+from queries import course_export_query
+
+# Number of rows fetched from the database at a time
+FETCH_SIZE = 1000
+
+# Number of rows stored in each group of the columnar format
+ROW_GROUP_SIZE = 10000
+
+FORMATS = ("csv", "jsonl", "columnar")
+
+
+def _plain_value(value):
+    """Converts a value read from the database into a JSON-compatible one."""
+
+    if isinstance(value, (datetime.date, Decimal)):
+        return str(value)
+
+    if isinstance(value, (str, bool, int, float)) or value is None:
+        return value
+
+    # Identifiers
+    return str(value)
+
+
+def write_csv(columns: list[str], rows: Iterable[tuple], stream: TextIO) -> int:
+    """Writes the rows as CSV, with a header line, and returns their number."""
+
+    writer = csv.writer(stream)
+    writer.writerow(columns)
+
+    count = 0
+
+    for count, row in enumerate(rows, start=1):
+        writer.writerow(_plain_value(value) for value in row)
+
+    return count
+
+
+def write_jsonl(columns: list[str], rows: Iterable[tuple], stream: TextIO) -> int:
+    """Writes the rows as JSON objects, one per line, and returns their number."""
+
+    count = 0
+
+    for count, row in enumerate(rows, start=1):
+        record = dict(zip(columns, (_plain_value(value) for value in row)))
+        stream.write(json.dumps(record, ensure_ascii=False) + "\n")
+
+    return count
+
+
+def write_columnar(columns: list[str], rows: Iterable[tuple], stream: TextIO) -> int:
+    """Writes the rows by groups, each group being stored column
+    by column, and returns the number of rows."""
+
+    stream.write(json.dumps({"columns": columns}) + "\n")
+
+    iterator = iter(rows)
+    count = 0
+
+    while group := list(islice(iterator, ROW_GROUP_SIZE)):
+        count += len(group)
+
+        stream.write(
+            json.dumps(
+                {
+                    "rows": len(group),
+                    "data": [
+                        [_plain_value(value) for value in column]
+                        for column in zip(*group)
+                    ],
+                },
+                ensure_ascii=False,
+            )
+            + "\n"
+        )
+
+    return count
+
+
+WRITERS = {"csv": write_csv, "jsonl": write_jsonl, "columnar": write_columnar}
+
+
+def _streamed_rows(current_session: Session, stmt) -> Iterator[tuple]:
+    """Yields the rows of the query, fetched by chunks."""
+
+    result = current_session.execute(stmt.execution_options(yield_per=FETCH_SIZE))
+
+    for row in result:
+        yield tuple(row)
+
+
+def write_rows(
+    path: str, file_format: str, columns: list[str], rows: Iterable[tuple]
+) -> int:
+    """Writes the rows in the file at the given path (compressed if it ends
+    with .gz) in the given format, and returns their number."""
+
+    opener = gzip.open if path.endswith(".gz") else open
+
+    with opener(path, "wt", newline="", encoding="utf-8") as stream:
+        return WRITERS[file_format](columns, rows, stream)
+
+
+def export_courses(
+    current_session: Session,
+    path: str,
+    file_format: str = "csv",
+    start_date: datetime.date | None = None,
+    end_date: datetime.date | None = None,
+    paid: bool | None = None,
+) -> int:
+    """Writes the courses matching the filters in the file at the given
+    path, and returns the number of courses exported."""
+
+    stmt = course_export_query(start_date, end_date, paid)
+    columns = [column["name"] for column in stmt.column_descriptions]
+
+    return write_rows(path, file_format, columns, _streamed_rows(current_session, stmt))
@@ -1,9 +1,11 @@
 """This file defines the HourlyRateController class, used to
 create, edit and delete student instances in the database"""
 
+from sqlalchemy.orm import joinedload, selectinload
+
 from base_controller import BaseController
 
-from models import HourlyRate
+from models import Course, HourlyRate
 from prompts import prompt_hourly_rate
 
 
@@ -11,5 +13,14 @@ class HourlyRateController(BaseController):
     """This class controls all hourly rate-related operations :
     creation, edition, deletion."""
 
+    # The deletion of a hourly rate cascades to its prices and its courses,
+    # and to the allocations of the courses
+    LOADER_OPTIONS = {
+        "delete_entity": (
+            selectinload(HourlyRate.prices),
+            selectinload(HourlyRate.courses).joinedload(Course.allocations),
+        ),
+    }
+
     def __init__(self):
         super().__init__(HourlyRate, prompt_hourly_rate)
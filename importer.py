@@ -0,0 +1,297 @@
+"""This file implements the bulk import of students, hourly rates and courses
+from CSV or JSONL files. The file is read as a stream and goes through a
+pipeline of generators : each record is validated and sanitized with the
+functions used by the prompts, the students and hourly rates referred to by
+the courses are resolved by their natural key (email address and name), and
+the rows are inserted in batches. Only one batch is held in memory at a time,
+and invalid records are reported line by line instead of aborting the import.
+
+The columns expected in the files are :
+    students : first_name, last_name, phone_number, email_address, address
+    rates : name, price
+    courses : date (jj/mm/AAAA), duration, paid (oui/non), student, rate"""
+
+import csv
+import json
+import uuid
+from collections import OrderedDict
+from decimal import Decimal
+from itertools import islice
+from typing import Callable, Iterable, Iterator, NamedTuple, TextIO, Type
+
+from sqlalchemy import insert, select
+from sqlalchemy.orm import Session
+
+import ledger
+import validators
+import sanitizers
+from models import Base, Student, HourlyRate, HourlyRatePrice, Course
+from rates import initial_price_rows
+
+# Values accepted for the paid column of the courses
+PAID_VALUES = {"oui": True, "true": True, "1": True, "non": False, "false": False}
+
+# Maximum number of natural keys kept in the reference caches
+REFERENCE_CACHE_SIZE = 10000
+
+
+class RecordError(Exception):
+    """Raised when a record of the imported file is invalid."""
+
+
+class ErrorReport:
+    """Writes the rejected records in a text stream and counts them."""
+
+    def __init__(self, stream: TextIO):
+        self.stream = stream
+        self.count = 0
+
+    def add(self, line_number: int, error: RecordError) -> None:
+        """Reports the record found at the given line."""
+
+        self.count += 1
+        self.stream.write(f"Ligne {line_number} : {error}\n")
+
+
+class ImportSummary(NamedTuple):
+    """Number of records imported and rejected."""
+
+    imported: int
+    rejected: int
+
+
+def read_records(file: TextIO, file_format: str) -> Iterator[tuple[int, dict]]:
+    """Yields the records of a CSV or JSONL file, with their line numbers."""
+
+    if file_format == "csv":
+        reader = csv.DictReader(file)
+
+        for record in reader:
+            yield reader.line_num, record
+
+    else:
+        for line_number, line in enumerate(file, start=1):
+            if line.strip():
+                try:
+                    yield line_number, json.loads(line)
+
+                except json.JSONDecodeError:
+                    yield line_number, None
+
+
+def _field(record: dict, name: str) -> str:
+    """Returns a field of the record as a stripped string."""
+
+    value = record.get(name)
+
+    if value is None:
+        raise RecordError(f"champ {name} manquant")
+
+    return str(value).strip()
+
+
+def _name(record: dict, name: str) -> str:
+    """Validates a name, following the rules of the prompts."""
+
+    value = _field(record, name)
+
+    if not 50 >= len(value) >= 3:
+        raise RecordError(f"{name} doit comporter entre 3 et 50 caractères")
+
+    return value
+
+
+def _decimal(record: dict, name: str, max_value=Decimal("999.99")) -> Decimal:
+    """Validates and rounds a decimal field."""
+
+    value = _field(record, name)
+
+    if not validators.validate_decimal(value, max_value=max_value):
+        raise RecordError(f"{name} doit être compris entre 0 et {max_value}")
+
+    return Decimal(sanitizers.sanitize_decimal(value))
+
+
+def student_row(record: dict) -> dict:
+    """Converts a record into the row of a new student."""
+
+    phone_number = _field(record, "phone_number")
+    email_address = _field(record, "email_address")
+
+    # The number is validated and normalized with a single parsing
+    phone_check = validators.check_phone_number(phone_number)
+
+    if not phone_check.valid:
+        raise RecordError(f"numéro de téléphone invalide : {phone_number}")
+
+    if not validators.validate_email_address(email_address):
+        raise RecordError(f"adresse email invalide : {email_address}")
+
+    return {
+        "id": uuid.uuid4(),
+        "first_name": _name(record, "first_name"),
+        "last_name": _name(record, "last_name"),
+        "phone_number": phone_check.normalized,
+        "email_address": sanitizers.sanitize_email_address(email_address),
+        "address": str(record.get("address") or "").strip(),
+    }
+
+
+def hourly_rate_row(record: dict) -> dict:
+    """Converts a record into the row of a new hourly rate."""
+
+    return {
+        "id": uuid.uuid4(),
+        "name": _name(record, "name"),
+        "price": _decimal(record, "price"),
+    }
+
+
+def course_row(record: dict) -> dict:
+    """Converts a record into the row of a new course ; the student and
+    the hourly rate are kept as natural keys, resolved afterwards."""
+
+    date = _field(record, "date")
+    paid = str(record.get("paid") or "non").strip().lower()
+
+    if not validators.validate_date(date):
+        raise RecordError(f"date invalide : {date} (format jj/mm/AAAA)")
+
+    if paid not in PAID_VALUES:
+        raise RecordError(f"valeur de paid invalide : {paid} (oui ou non)")
+
+    return {
+        "id": uuid.uuid4(),
+        "date": sanitizers.sanitize_date(date),
+        "duration": _decimal(record, "duration", max_value=Decimal("9.9")),
+        "paid": PAID_VALUES[paid],
+        "student_id": _field(record, "student"),
+        "hourly_rate_id": _field(record, "rate"),
+    }
+
+
+class ReferenceResolver:
+    """Resolves the natural key of an entity (email address of a student,
+    name of a hourly rate) into its identifier. The identifiers found are
+    kept in a cache bounded to the most recently used keys."""
+
+    def __init__(self, current_session: Session, column, label: str):
+        self.current_session = current_session
+        self.column = column
+        self.label = label
+        self.cache = OrderedDict()
+
+    def __call__(self, natural_key: str):
+        if natural_key in self.cache:
+            self.cache.move_to_end(natural_key)
+            return self.cache[natural_key]
+
+        identifier = self.current_session.scalar(
+            select(self.column.class_.id).where(self.column == natural_key).limit(1)
+        )
+
+        if identifier is None:
+            raise RecordError(f"{self.label} introuvable : {natural_key}")
+
+        self.cache[natural_key] = identifier
+
+        if len(self.cache) > REFERENCE_CACHE_SIZE:
+            self.cache.popitem(last=False)
+
+        return identifier
+
+
+def _course_converter(current_session: Session) -> Callable[[dict], dict]:
+    """Returns the function converting a record into the row of a new course,
+    where the natural keys are replaced by the identifiers of the entities."""
+
+    students = ReferenceResolver(current_session, Student.email_address, "élève")
+    hourly_rates = ReferenceResolver(current_session, HourlyRate.name, "taux")
+
+    def convert(record: dict) -> dict:
+        row = course_row(record)
+        row["student_id"] = students(row["student_id"])
+        row["hourly_rate_id"] = hourly_rates(row["hourly_rate_id"])
+        return row
+
+    return convert
+
+
+def _valid_rows(
+    records: Iterable[tuple[int, dict]],
+    convert: Callable[[dict], dict],
+    errors: ErrorReport,
+) -> Iterator[dict]:
+    """Converts the records into rows, reporting the invalid ones."""
+
+    for line_number, record in records:
+        try:
+            if not isinstance(record, dict):
+                raise RecordError("enregistrement illisible")
+
+            yield convert(record)
+
+        except RecordError as error:
+            errors.add(line_number, error)
+
+
+def _batches(rows: Iterable[dict], batch_size: int) -> Iterator[list[dict]]:
+    """Groups the rows in lists of batch_size rows."""
+
+    iterator = iter(rows)
+
+    while batch := list(islice(iterator, batch_size)):
+        yield batch
+
+
+def import_file(
+    session_factory,
+    model: Type[Base],
+    file: TextIO,
+    file_format: str,
+    errors: TextIO,
+    batch_size: int = 1000,
+    commit_size: int = 10000,
+) -> ImportSummary:
+    """Imports the records of the file as entities of the model. The rows are
+    inserted batch_size at a time, and committed every commit_size rows."""
+
+    report = ErrorReport(errors)
+    imported = 0
+    uncommitted = 0
+
+    with session_factory() as db_session:
+        if model is Course:
+            convert = _course_converter(db_session)
+        else:
+            convert = student_row if model is Student else hourly_rate_row
+
+        rows = _valid_rows(read_records(file, file_format), convert, report)
+
+        for batch in _batches(rows, batch_size):
+            if model is Course:
+                # Bulk inserts bypass the flush events maintaining the balances
+                with ledger.tracking(
+                    db_session, Course.id.in_([row["id"] for row in batch])
+                ):
+                    db_session.execute(insert(Course), batch)
+
+            else:
+                db_session.execute(insert(model), batch)
+
+                # The first prices of the rates are recorded in their history
+                if model is HourlyRate:
+                    db_session.execute(
+                        insert(HourlyRatePrice), initial_price_rows(batch)
+                    )
+
+            imported += len(batch)
+            uncommitted += len(batch)
+
+            if uncommitted >= commit_size:
+                db_session.commit()
+                uncommitted = 0
+
+        db_session.commit()
+
+    return ImportSummary(imported, report.count)
@@ -0,0 +1,191 @@
+"""This file records the SQL activity of the app : for every controller method,
+the number of calls, the number of statements executed and the time spent in
+the database, along with the slowest statements. The figures are collected by
+listening to the cursor execution events of the engine, and can be displayed
+from the diagnostics menu or dumped as JSON."""
+
+import contextvars
+import functools
+import heapq
+import inspect
+import json
+import threading
+import time
+from contextlib import contextmanager
+
+from sqlalchemy import Engine, event
+
+# Number of slowest statements kept in the report
+SLOWEST_STATEMENTS = 10
+
+# Name under which the statements executed outside of any method are recorded
+UNTRACKED_OPERATION = "(hors contrôleur)"
+
+# Figures per operation : [calls, statements, SQL time in seconds]
+_operations: dict[str, list] = {}
+
+# Heap of the slowest statements : (SQL time, statement, operation)
+_slowest: list[tuple[float, str, str]] = []
+
+_lock = threading.Lock()
+
+# Stack of the operations being executed by each thread (or asyncio task)
+_operation_stack: contextvars.ContextVar[tuple[str, ...]] = contextvars.ContextVar(
+    "operation_stack", default=()
+)
+
+
+def _current_operation() -> str:
+    """Returns the innermost operation executed by the current thread or task."""
+
+    stack = _operation_stack.get()
+    return stack[-1] if stack else UNTRACKED_OPERATION
+
+
+def _before_cursor_execute(conn, _cursor, _statement, _params, _context, _many):
+    """Stores the time at which the statement starts."""
+
+    conn.info.setdefault("instrumentation_start", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, _cursor, statement, _params, _context, _many):
+    """Records the statement and the time it took."""
+
+    elapsed = time.perf_counter() - conn.info["instrumentation_start"].pop()
+    operation = _current_operation()
+
+    with _lock:
+        figures = _operations.setdefault(operation, [0, 0, 0.0])
+        figures[1] += 1
+        figures[2] += elapsed
+
+        entry = (elapsed, statement, operation)
+
+        if len(_slowest) < SLOWEST_STATEMENTS:
+            heapq.heappush(_slowest, entry)
+        else:
+            heapq.heappushpop(_slowest, entry)
+
+
+def instrument(engine: Engine) -> None:
+    """Starts recording the statements executed through the given engine."""
+
+    for name, listener in (
+        ("before_cursor_execute", _before_cursor_execute),
+        ("after_cursor_execute", _after_cursor_execute),
+    ):
+        if not event.contains(engine, name, listener):
+            event.listen(engine, name, listener)
+
+
+@contextmanager
+def tracking(operation: str):
+    """Attributes the statements executed within the block to the operation."""
+
+    with _lock:
+        _operations.setdefault(operation, [0, 0, 0.0])[0] += 1
+
+    token = _operation_stack.set(_operation_stack.get() + (operation,))
+
+    try:
+        yield
+    finally:
+        _operation_stack.reset(token)
+
+
+def instrumented(method):
+    """Decorator attributing the statements executed by a controller
+    method (sync or async) to <ControllerClass>.<method>."""
+
+    if inspect.iscoroutinefunction(method):
+
+        @functools.wraps(method)
+        async def async_wrapper(self, *args, **kwargs):
+            with tracking(f"{type(self).__name__}.{method.__name__}"):
+                return await method(self, *args, **kwargs)
+
+        return async_wrapper
+
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        with tracking(f"{type(self).__name__}.{method.__name__}"):
+            return method(self, *args, **kwargs)
+
+    return wrapper
+
+
+def report() -> dict:
+    """Returns the figures recorded so far."""
+
+    with _lock:
+        return {
+            "operations": {
+                operation: {
+                    "calls": calls,
+                    "statements": statements,
+                    "sql_time": sql_time,
+                }
+                for operation, (calls, statements, sql_time) in sorted(
+                    _operations.items(), key=lambda item: -item[1][2]
+                )
+            },
+            "slowest_statements": [
+                {"sql_time": sql_time, "operation": operation, "statement": statement}
+                for sql_time, statement, operation in sorted(_slowest, reverse=True)
+            ],
+        }
+
+
+def display_report() -> None:
+    """Prints the figures recorded so far."""
+
+    # InquirerPy is only loaded by the diagnostics menu, not by the CLI
+    from InquirerPy.utils import color_print
+
+    figures = report()
+
+    print("Requêtes SQL par opération :")
+
+    for operation, operation_figures in figures["operations"].items():
+        calls = operation_figures["calls"]
+        statements = operation_figures["statements"]
+
+        color_print(
+            [
+                ("white", f"→ {operation} : "),
+                (
+                    "green",
+                    f"{calls} appel(s), {statements} requête(s)"
+                    f" ({statements / max(calls, 1):.1f} par appel),"
+                    f" {operation_figures['sql_time'] * 1000:.1f} ms",
+                ),
+            ]
+        )
+
+    print("Requêtes les plus lentes :")
+
+    for entry in figures["slowest_statements"]:
+        color_print(
+            [
+                ("red", f"→ {entry['sql_time'] * 1000:.1f} ms "),
+                (
+                    "white",
+                    f"({entry['operation']}) {' '.join(entry['statement'].split())}",
+                ),
+            ]
+        )
+
+
+def dump(path: str) -> None:
+    """Writes the figures recorded so far in a JSON file."""
+
+    with open(path, "w", encoding="utf-8") as file:
+        json.dump(report(), file, indent=2, ensure_ascii=False)
+
+
+def reset() -> None:
+    """Forgets the figures recorded so far."""
+
+    with _lock:
+        _operations.clear()
+        _slowest.clear()
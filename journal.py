@@ -0,0 +1,368 @@
+"""This file keeps the journal of the changes made to the students, the hourly
+rates and the courses. Before each flush, the values of the entities about to
+be changed or deleted are read ; after it, the values of the new and changed
+ones. Each change is appended to the journal_entry table with both images (as
+JSON objects), in the same transaction and with a single INSERT statement per
+flush. The bulk statements on these models, which bypass the flush, are
+journaled the same way : the rows they change are read before they run, and
+again by the next statement, flush or commit of the session.
+
+The entries are never changed : the history of an entity, or of a period, is
+read along the indexes of the table, and the entries older than a given date
+are moved to a compressed JSONL file (see archive), so that the table only
+holds the recent changes."""
+
+import datetime
+import gzip
+import json
+import uuid
+from decimal import Decimal
+from itertools import chain, islice
+from typing import Iterable, Iterator
+
+from sqlalchemy import Connection, Select, delete, event, func, insert, select
+from sqlalchemy.orm import Session, attributes, sessionmaker
+
+from models import Course, HourlyRate, JournalEntry, Student
+
+# Models whose changes are journaled
+JOURNALED_MODELS = (Student, HourlyRate, Course)
+
+ENTITY_TYPES = tuple(model.__tablename__ for model in JOURNALED_MODELS)
+
+# Number of entities read at a time around a bulk statement,
+# and of entries fetched at a time by the archival
+FETCH_SIZE = 1000
+
+# Keys of the session info dictionary holding the state between the two events
+_PENDING_KEY = "journal_pending"
+_BULK_KEY = "journal_bulk"
+
+
+def _plain_value(value):
+    """Converts the value of a column into a JSON-compatible one."""
+
+    if isinstance(value, (datetime.date, Decimal, uuid.UUID)):
+        return str(value)
+
+    return value
+
+
+def _image(entity) -> dict:
+    """Returns the current values of the columns of the entity."""
+
+    return {
+        attribute.key: _plain_value(getattr(entity, attribute.key))
+        for attribute in attributes.instance_state(entity).mapper.column_attrs
+    }
+
+
+def _former_image(entity) -> dict:
+    """Returns the values of the columns of the entity as they were loaded from
+    the database, before the changes about to be flushed."""
+
+    image = {}
+
+    for attribute in attributes.instance_state(entity).mapper.column_attrs:
+        history = attributes.get_history(entity, attribute.key)
+        values = history.deleted or history.unchanged or [None]
+        image[attribute.key] = _plain_value(values[0])
+
+    return image
+
+
+def _row_image(row) -> dict:
+    """Returns the values of a row read from the table of a journaled model."""
+
+    return {key: _plain_value(value) for key, value in row._mapping.items()}
+
+
+def _entry(
+    changed_at: datetime.datetime,
+    model,
+    entity_id,
+    operation: str,
+    before: dict | None,
+    after: dict | None,
+) -> dict:
+    """Returns the row of a journal entry."""
+
+    return {
+        "changed_at": changed_at,
+        "entity_type": model.__tablename__,
+        "entity_id": entity_id,
+        "operation": operation,
+        "before_image": before,
+        "after_image": after,
+    }
+
+
+def _append(connection: Connection, entries: list[dict]) -> None:
+    """Appends the entries to the journal with a single statement."""
+
+    if entries:
+        connection.execute(insert(JournalEntry), entries)
+
+
+def _before_flush(session: Session, _flush_context, _instances) -> None:
+    """Reads the values of the entities about to be changed or deleted."""
+
+    # The rows changed by the former bulk statements may be changed again
+    _append_bulk(session)
+
+    pending = [
+        (entity, "insert", None)
+        for entity in session.new
+        if isinstance(entity, JOURNALED_MODELS)
+    ]
+
+    for entity in session.dirty:
+        if isinstance(entity, JOURNALED_MODELS) and session.is_modified(entity):
+            pending.append((entity, "update", _former_image(entity)))
+
+    for entity in session.deleted:
+        if isinstance(entity, JOURNALED_MODELS):
+            pending.append((entity, "delete", _former_image(entity)))
+
+    # Assigned even if empty, so that the entities read for a flush which
+    # failed are never journaled by the next one
+    session.info[_PENDING_KEY] = pending
+
+
+def _after_flush(session: Session, _flush_context) -> None:
+    """Appends the changes made by the flush to the journal."""
+
+    pending = session.info.pop(_PENDING_KEY, None)
+
+    if not pending:
+        return
+
+    changed_at = datetime.datetime.now()
+    entries = []
+
+    for entity, operation, before in pending:
+        after = _image(entity) if operation != "delete" else None
+
+        # A value may be set again without being changed
+        if before != after:
+            entries.append(
+                _entry(changed_at, type(entity), entity.id, operation, before, after)
+            )
+
+    _append(session.connection(), entries)
+
+
+def _discard_pending(session: Session, *_) -> None:
+    """Forgets the entities read before a flush or a bulk statement whose
+    transaction was rolled back, as they were not changed."""
+
+    session.info.pop(_PENDING_KEY, None)
+    session.info.pop(_BULK_KEY, None)
+
+
+def _images(connection: Connection, model, criterion) -> dict:
+    """Returns the values of the rows of the model matching the criterion
+    (every row if None), indexed by identifier."""
+
+    stmt = select(model.__table__)
+
+    if criterion is not None:
+        stmt = stmt.where(criterion)
+
+    return {row.id: _row_image(row) for row in connection.execute(stmt)}
+
+
+def _do_orm_execute(orm_execute_state) -> None:
+    """Reads the rows about to be inserted, updated or deleted by bulk
+    statements on the journaled models, which bypass the flush. Their new
+    values are read once the statement has run (see _append_bulk)."""
+
+    session = orm_execute_state.session
+
+    # The changes of the former bulk statements are journaled before the
+    # statement reads or changes their rows
+    _append_bulk(session)
+
+    if not (
+        orm_execute_state.is_insert
+        or orm_execute_state.is_update
+        or orm_execute_state.is_delete
+    ):
+        return
+
+    mapper = orm_execute_state.bind_mapper
+
+    if mapper is None or not issubclass(mapper.class_, JOURNALED_MODELS):
+        return
+
+    model = mapper.class_
+
+    if orm_execute_state.is_insert:
+        parameters = orm_execute_state.parameters
+        rows = parameters if isinstance(parameters, list) else [parameters or {}]
+
+        # The rows inserted by INSERT ... SELECT statements are not known
+        if not all("id" in row for row in rows):
+            return
+
+        before = {}
+        identifiers = [row["id"] for row in rows]
+
+    else:
+        before = _images(
+            session.connection(), model, orm_execute_state.statement.whereclause
+        )
+        identifiers = list(before)
+
+    session.info.setdefault(_BULK_KEY, []).append(
+        (datetime.datetime.now(), model, identifiers, before)
+    )
+
+
+def _append_bulk(session: Session) -> None:
+    """Appends to the journal the changes made by the bulk statements executed
+    since the last event of the session, reading the new values of their rows
+    (the criterion of an UPDATE may no longer match them)."""
+
+    pending = session.info.pop(_BULK_KEY, None)
+
+    if not pending:
+        return
+
+    connection = session.connection()
+    entries = []
+
+    for changed_at, model, identifiers, before in pending:
+        identifiers = iter(identifiers)
+        after = {}
+
+        while batch := list(islice(identifiers, FETCH_SIZE)):
+            after.update(_images(connection, model, model.id.in_(batch)))
+
+        # A row is inserted if it was not read before the statement, deleted
+        # if it cannot be read after it
+        for entity_id in chain(before, (key for key in after if key not in before)):
+            former, new = before.get(entity_id), after.get(entity_id)
+
+            if former == new:
+                continue
+
+            if former is None:
+                operation = "insert"
+            elif new is None:
+                operation = "delete"
+            else:
+                operation = "update"
+
+            entries.append(_entry(changed_at, model, entity_id, operation, former, new))
+
+    _append(connection, entries)
+
+
+def register(session_factory: sessionmaker | type[Session]) -> None:
+    """Journals the changes made by every session created by the factory
+    (or of the given Session subclass)."""
+
+    for name, listener in (
+        ("before_flush", _before_flush),
+        ("after_flush", _after_flush),
+        ("before_commit", _append_bulk),
+        ("after_rollback", _discard_pending),
+        ("after_soft_rollback", _discard_pending),
+        ("do_orm_execute", _do_orm_execute),
+    ):
+        if not event.contains(session_factory, name, listener):
+            event.listen(session_factory, name, listener)
+
+
+def journal_query(
+    entity_id: uuid.UUID | None = None,
+    entity_type: str | None = None,
+    start: datetime.datetime | None = None,
+    end: datetime.datetime | None = None,
+) -> Select:
+    """Builds the query of the entries of the entity (of every entity if None,
+    or of the given type) appended between start (included) and end (excluded),
+    no bound if None. The entries are sorted in the order they were appended."""
+
+    stmt = select(JournalEntry).order_by(JournalEntry.changed_at, JournalEntry.id)
+
+    if entity_id is not None:
+        stmt = stmt.where(JournalEntry.entity_id == entity_id)
+
+    if entity_type is not None:
+        stmt = stmt.where(JournalEntry.entity_type == entity_type)
+
+    if start is not None:
+        stmt = stmt.where(JournalEntry.changed_at >= start)
+
+    if end is not None:
+        stmt = stmt.where(JournalEntry.changed_at < end)
+
+    return stmt
+
+
+def changed_columns(entry: JournalEntry) -> dict:
+    """Returns the former and new values of the columns changed by an entry."""
+
+    before = entry.before_image or {}
+    after = entry.after_image or {}
+
+    return {
+        key: (before.get(key), after.get(key))
+        for key in chain(before, (key for key in after if key not in before))
+        if before.get(key) != after.get(key)
+    }
+
+
+def _archived_entries(current_session: Session, last_id: int, end) -> Iterator:
+    """Yields the entries to archive as JSON lines, fetched by chunks."""
+
+    result = current_session.execute(
+        select(JournalEntry.__table__)
+        .where(JournalEntry.id <= last_id, JournalEntry.changed_at < end)
+        .order_by(JournalEntry.id)
+        .execution_options(yield_per=FETCH_SIZE)
+    )
+
+    for row in result:
+        yield json.dumps(_row_image(row), ensure_ascii=False) + "\n"
+
+
+def _write_lines(path: str, lines: Iterable[str]) -> int:
+    """Appends the lines to the file at the given path (compressed if it ends
+    with .gz), and returns their number."""
+
+    opener = gzip.open if path.endswith(".gz") else open
+    count = 0
+
+    with opener(path, "at", encoding="utf-8") as stream:
+        for count, line in enumerate(lines, start=1):
+            stream.write(line)
+
+    return count
+
+
+def archive(current_session: Session, end: datetime.datetime, path: str) -> int:
+    """Moves the entries appended before end to the file at the given path, as
+    JSON lines appended to its content (compressed if the path ends with .gz),
+    and returns their number. The entries are removed with the transaction of
+    the session, once the file is written."""
+
+    # The entries appended meanwhile are left for the next archival
+    last_id = current_session.scalar(
+        select(func.max(JournalEntry.id)).where(JournalEntry.changed_at < end)
+    )
+
+    if last_id is None:
+        return 0
+
+    count = _write_lines(path, _archived_entries(current_session, last_id, end))
+
+    current_session.execute(
+        delete(JournalEntry)
+        .where(JournalEntry.id <= last_id, JournalEntry.changed_at < end)
+        .execution_options(synchronize_session=False)
+    )
+
+    return count
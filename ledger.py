@@ -0,0 +1,330 @@
+"""This file maintains the balance tables (StudentBalance and MonthlyBalance)
+incrementally. Before a flush, the amounts of the courses about to change
+(or whose payment allocations are about to change) are read from the database ;
+after the flush, the same courses are read again and only the difference is
+applied to the stored totals. The statistics can then be read from these
+tables instead of being recomputed from every course."""
+
+from collections import defaultdict
+from contextlib import contextmanager
+from decimal import Decimal
+from itertools import chain
+from typing import NamedTuple, Type
+
+from sqlalchemy import (
+    and_,
+    bindparam,
+    Connection,
+    delete,
+    event,
+    func,
+    insert,
+    or_,
+    select,
+    update,
+)
+from sqlalchemy.orm import Session, sessionmaker
+
+from models import (
+    Base,
+    Course,
+    HourlyRatePrice,
+    MonthlyBalance,
+    PaymentAllocation,
+    StudentBalance,
+)
+import rates
+from queries import course_due_amount, course_price_condition, course_settled_amount
+
+# Precision with which the amounts are stored and compared
+AMOUNT_QUANTUM = Decimal("0.0001")
+
+# Key of the session info dictionary holding the state between the two events
+_PENDING_KEY = "ledger_pending"
+
+# Totals indexed by (balance model, key) ; the values are [debt, gains]
+Totals = dict[tuple[Type[Base], object], list[Decimal]]
+
+
+class Drift(NamedTuple):
+    """Difference found between a stored balance and the recomputed one."""
+
+    table: str
+    key: object
+    stored_debt: Decimal
+    expected_debt: Decimal
+    stored_gains: Decimal
+    expected_gains: Decimal
+
+
+def _key_column(model: Type[Base]):
+    """Returns the primary key column of a balance model."""
+
+    return (
+        StudentBalance.student_id if model is StudentBalance else MonthlyBalance.month
+    )
+
+
+def _snapshot(connection: Connection, criterion=None) -> Totals:
+    """Reads the amounts of the courses matching the criterion (every course if
+    None) and sums them per student and per month, split between debt and gains
+    (the part of the amount paid, see queries.course_settled_amount)."""
+
+    stmt = (
+        select(
+            Course.student_id,
+            Course.date,
+            func.sum(course_due_amount()),
+            func.sum(course_settled_amount()),
+        )
+        .join(HourlyRatePrice, course_price_condition())
+        .group_by(Course.student_id, Course.date)
+    )
+
+    if criterion is not None:
+        stmt = stmt.where(criterion)
+
+    totals = defaultdict(lambda: [Decimal(0), Decimal(0)])
+
+    for student_id, date, debt, gains in connection.execute(stmt):
+        for key in (
+            (StudentBalance, student_id),
+            (MonthlyBalance, date.replace(day=1)),
+        ):
+            totals[key][0] += Decimal(debt)
+            totals[key][1] += Decimal(gains)
+
+    return totals
+
+
+def _apply(connection: Connection, before: Totals, after: Totals) -> None:
+    """Adds the difference between the two snapshots to the stored balances,
+    with a constant number of statements per balance table."""
+
+    zero = [Decimal(0), Decimal(0)]
+
+    for model in (StudentBalance, MonthlyBalance):
+        table = model.__table__
+        column = table.c[_key_column(model).key]
+
+        deltas = {}
+
+        for key in before.keys() | after.keys():
+            if key[0] is model:
+                debt, gains = (
+                    (new - old).quantize(AMOUNT_QUANTUM)
+                    for old, new in zip(before.get(key, zero), after.get(key, zero))
+                )
+
+                if debt != 0 or gains != 0:
+                    deltas[key[1]] = (debt, gains)
+
+        if not deltas:
+            continue
+
+        existing = set(
+            connection.scalars(select(column).where(column.in_(deltas.keys())))
+        )
+
+        rows = [
+            {"key": value, "delta_debt": debt, "delta_gains": gains}
+            for value, (debt, gains) in deltas.items()
+            if value in existing
+        ]
+
+        if rows:
+            connection.execute(
+                update(table)
+                .where(column == bindparam("key"))
+                .values(
+                    debt=table.c.debt
+                    + bindparam("delta_debt", type_=table.c.debt.type),
+                    gains=table.c.gains
+                    + bindparam("delta_gains", type_=table.c.gains.type),
+                ),
+                rows,
+            )
+
+        rows = [
+            {column.key: value, "debt": debt, "gains": gains}
+            for value, (debt, gains) in deltas.items()
+            if value not in existing
+        ]
+
+        if rows:
+            connection.execute(insert(table), rows)
+
+        # Balances back to zero (e.g. once a student is deleted) are removed
+        connection.execute(
+            delete(table).where(
+                column.in_(deltas.keys()),
+                func.abs(table.c.debt) < AMOUNT_QUANTUM / 2,
+                func.abs(table.c.gains) < AMOUNT_QUANTUM / 2,
+            )
+        )
+
+
+def _allocation_course_id(allocation: PaymentAllocation):
+    """Returns the identifier of the course of an allocation, which is only
+    copied to the allocation by the flush (None for a new course)."""
+
+    if allocation.course_id is None and allocation.course is not None:
+        return allocation.course.id
+
+    return allocation.course_id
+
+
+def _affected_courses(course_ids: set, repriced: dict):
+    """Returns the criterion selecting the given courses and the courses of
+    the given hourly rates given from the associated dates on."""
+
+    clauses = []
+
+    if course_ids:
+        clauses.append(Course.id.in_(course_ids))
+
+    for rate_id, start in repriced.items():
+        clauses.append(and_(Course.hourly_rate_id == rate_id, Course.date >= start))
+
+    return or_(*clauses) if clauses else None
+
+
+def _before_flush(session: Session, _flush_context, _instances) -> None:
+    """Stores the amounts of the courses about to be changed by the flush."""
+
+    new_courses = [entity for entity in session.new if isinstance(entity, Course)]
+
+    course_ids = {
+        entity.id
+        for entity in session.dirty
+        if isinstance(entity, Course) and session.is_modified(entity)
+    } | {entity.id for entity in session.deleted if isinstance(entity, Course)}
+
+    # A new or removed allocation changes the part of its course which was paid
+    course_ids |= {
+        _allocation_course_id(entity)
+        for entity in chain(session.new, session.dirty, session.deleted)
+        if isinstance(entity, PaymentAllocation)
+    } - {None}
+
+    # A new price only changes the amount of the courses given since it applies
+    repriced = rates.repriced_since(session)
+
+    criterion = _affected_courses(course_ids, repriced)
+    before = _snapshot(session.connection(), criterion) if criterion is not None else {}
+
+    session.info[_PENDING_KEY] = (new_courses, course_ids, repriced, before)
+
+
+def _after_flush(session: Session, _flush_context) -> None:
+    """Reads the amounts of the changed courses again and updates the balances."""
+
+    if _PENDING_KEY not in session.info:
+        return
+
+    new_courses, course_ids, repriced, before = session.info.pop(_PENDING_KEY)
+
+    # The identifiers of the new courses are only known after the flush
+    criterion = _affected_courses(
+        course_ids | {course.id for course in new_courses}, repriced
+    )
+
+    if criterion is not None:
+        connection = session.connection()
+        _apply(connection, before, _snapshot(connection, criterion))
+
+
+def register(session_factory: sessionmaker | type[Session]) -> None:
+    """Keeps the balances up to date for every session created by the
+    factory (or of the given Session subclass)."""
+
+    for name, listener in (
+        ("before_flush", _before_flush),
+        ("after_flush", _after_flush),
+    ):
+        if not event.contains(session_factory, name, listener):
+            event.listen(session_factory, name, listener)
+
+
+@contextmanager
+def tracking(current_session: Session, criterion):
+    """Keeps the balances up to date around set-based statements (bulk
+    INSERT or UPDATE executed with Session.execute), which bypass the flush
+    events. The criterion must select the same courses before and after."""
+
+    connection = current_session.connection()
+    before = _snapshot(connection, criterion)
+
+    yield
+
+    _apply(connection, before, _snapshot(connection, criterion))
+
+
+def _stored(connection: Connection) -> Totals:
+    """Reads every stored balance."""
+
+    totals = {}
+
+    for model in (StudentBalance, MonthlyBalance):
+        for value, debt, gains in connection.execute(
+            select(_key_column(model), model.debt, model.gains)
+        ):
+            totals[(model, value)] = [Decimal(debt), Decimal(gains)]
+
+    return totals
+
+
+def rebuild(current_session: Session) -> None:
+    """Recomputes every balance from the courses."""
+
+    connection = current_session.connection()
+    expected = _snapshot(connection)
+
+    for model in (StudentBalance, MonthlyBalance):
+        connection.execute(delete(model))
+
+        rows = [
+            {
+                _key_column(model).key: value,
+                "debt": debt.quantize(AMOUNT_QUANTUM),
+                "gains": gains.quantize(AMOUNT_QUANTUM),
+            }
+            for (key_model, value), (debt, gains) in expected.items()
+            if key_model is model
+        ]
+
+        if rows:
+            connection.execute(insert(model), rows)
+
+
+def verify(current_session: Session) -> list[Drift]:
+    """Recomputes every balance from the courses and returns
+    the differences with the stored balances."""
+
+    connection = current_session.connection()
+
+    stored = _stored(connection)
+    expected = _snapshot(connection)
+
+    zero = [Decimal(0), Decimal(0)]
+    drifts = []
+
+    for key in stored.keys() | expected.keys():
+        (stored_debt, stored_gains), (expected_debt, expected_gains) = (
+            [amount.quantize(AMOUNT_QUANTUM) for amount in totals.get(key, zero)]
+            for totals in (stored, expected)
+        )
+
+        if stored_debt != expected_debt or stored_gains != expected_gains:
+            drifts.append(
+                Drift(
+                    key[0].__tablename__,
+                    key[1],
+                    stored_debt,
+                    expected_debt,
+                    stored_gains,
+                    expected_gains,
+                )
+            )
+
+    return drifts
@@ -1,17 +1,27 @@
 #'!/Users/armand_malinvaud/Library/Mobile Documents/iCloud~is~workflow~my~workflows/Documents/gestionnaire_cours_particuliers/env/bin/python'
 
 """Main script of the tool, orchestrating the different parts of the app,
-all implemented in different files."""
+all implemented in different files. When arguments are given, the
+corresponding subcommand is run without any prompt (see cli.py)."""
 
-from menus import (
-    choice_menu_wrapper,
-    courses_menu,
-    students_menu,
-    houlry_rates_menu,
-    stats_menu,
-)
+import sys
 
 if __name__ == "__main__":
+    if len(sys.argv) > 1:
+        # The commands do not need the menus, nor InquirerPy
+        import cli
+
+        sys.exit(cli.main(sys.argv[1:]))
+
+    from menus import (
+        choice_menu_wrapper,
+        courses_menu,
+        students_menu,
+        houlry_rates_menu,
+        stats_menu,
+        diagnostics_menu,
+    )
+
     print("Bienvenue dans le gestionnaire de cours particuliers.")
 
     user_continues = True
@@ -30,6 +40,7 @@ if __name__ == "__main__":
                 ("Gérer les élèves", students_menu),
                 ("Gérer les taux horaire", houlry_rates_menu),
                 ("Consulter les statistiques", stats_menu),
+                ("Diagnostics", diagnostics_menu),
                 ("Quitter le gestionnaire", quit_manager),
             ],
         )
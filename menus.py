@@ -1,15 +1,15 @@
 """File containing the definition of the menu functions, which display
-menus asking the user to make various choices and input necessay information."""
+menus asking the user to make various choices and input necessay information.
+
+The controllers (and through them SQLAlchemy, the validators and the database)
+are imported by the menus using them, the first time one is opened, so that
+the main menu appears without waiting for them."""
 
 from typing import Tuple, Callable
 
 from InquirerPy import inquirer, get_style
 from InquirerPy.base.control import Choice
 
-from student_controller import StudentController
-from hourly_rate_controller import HourlyRateController
-from course_controller import CourseController
-
 
 def choice_menu_wrapper(menu_message: str, choices: list[Tuple[str, Callable]]) -> None:
     """Wrapper for inquirer.select ; shortcut allowing to associate functions with choices."""
@@ -38,6 +38,8 @@ def choice_menu_wrapper(menu_message: str, choices: list[Tuple[str, Callable]])
 def students_menu() -> None:
     """Menu for student creation, edition, deletion and overview."""
 
+    from student_controller import StudentController
+
     # Object used to interact with the students table inside the database
     student_controller = StudentController()
 
@@ -47,6 +49,11 @@ def students_menu() -> None:
             ("Créer un nouvel élève", student_controller.create_entity),
             ("Éditer un élève existant", student_controller.edit_entity),
             ("Supprimer un élève", student_controller.delete_entity),
+            ("Enregistrer un paiement", student_controller.record_payment),
+            (
+                "Générer les relevés des cours impayés",
+                student_controller.generate_statements,
+            ),
             (
                 "Consulter la liste des élèves",
                 lambda: student_controller.display_entity_list(
@@ -60,6 +67,8 @@ def students_menu() -> None:
 def courses_menu() -> None:
     """Menu for courses creation, edition, deletion and overview."""
 
+    from course_controller import CourseController
+
     # Object used to interact with the hourly rates table inside the database
     courses_controller = CourseController()
 
@@ -68,11 +77,8 @@ def courses_menu() -> None:
         [
             ("Créer un nouveau cours", courses_controller.create_entity),
             ("Éditer un cours existant", courses_controller.edit_entity),
-            ("Marquer un cours existant comme payé", courses_controller.mark_as_paid),
-            (
-                "Marquer un cours existant comme impayé",
-                courses_controller.mark_as_unpaid,
-            ),
+            ("Marquer des cours comme payés", courses_controller.mark_as_paid),
+            ("Marquer des cours comme impayés", courses_controller.mark_as_unpaid),
             ("Supprimer un cours", courses_controller.delete_entity),
             (
                 "Consulter la liste des cours",
@@ -87,6 +93,8 @@ def courses_menu() -> None:
 def houlry_rates_menu() -> None:
     """Menu for hourly rates creation, edition, deletioin and overview."""
 
+    from hourly_rate_controller import HourlyRateController
+
     # Object used to interact with the hourly rates table inside the database
     hourly_rates_controller = HourlyRateController()
 
@@ -110,6 +118,9 @@ def stats_menu() -> None:
     """Menu allowing the user to access various pieces of information
     regarding the gains he made and the debt of the students."""
 
+    from student_controller import StudentController
+    from course_controller import CourseController
+
     # The stats functions are implemented across the different controllers
     students_controller = StudentController()
     courses_controller = CourseController()
@@ -125,5 +136,42 @@ def stats_menu() -> None:
                 "Gains depuis une date donnée",
                 courses_controller.display_gains_since_date,
             ),
+            (
+                "Rapport de revenus par période",
+                courses_controller.display_revenue_report,
+            ),
+            ("Geler les mois terminés", courses_controller.refresh_rollup),
+            ("Vérifier les soldes", courses_controller.verify_balances),
+            ("Recalculer les soldes", courses_controller.rebuild_balances),
+        ],
+    )
+
+
+def diagnostics_menu() -> None:
+    """Menu displaying the number of SQL statements and the time spent
+    in the database by each operation since the launch of the app,
+    along with the counters of the statistics cache."""
+
+    import instrumentation
+    import stats_cache
+
+    def export_report() -> None:
+        """Asks the user for a file and writes the diagnostics in it."""
+
+        path = inquirer.text(
+            message="Fichier dans lequel exporter les diagnostics :",
+            default="diagnostics.json",
+        ).execute()
+
+        instrumentation.dump(path)
+        print(f"Diagnostics exportés dans {path}.")
+
+    choice_menu_wrapper(
+        "Diagnostics disponibles :",
+        [
+            ("Consulter les requêtes SQL", instrumentation.display_report),
+            ("Consulter le cache des statistiques", stats_cache.display_report),
+            ("Exporter les diagnostics en JSON", export_report),
+            ("Réinitialiser les diagnostics", instrumentation.reset),
         ],
     )
@@ -1,10 +1,12 @@
 """This file contains the description of the three models used in this small app,
-using SQLAlchemy. We define the model Student, HourlyRate and Course."""
+using SQLAlchemy. We define the model Student, HourlyRate and Course, along with
+the price history of the hourly rates, the payments received and their
+allocations to the courses, and the journal of the changes."""
 
 import uuid
 import datetime
 from typing import List
-from sqlalchemy import String, DECIMAL, ForeignKey, Uuid, Date
+from sqlalchemy import String, DECIMAL, ForeignKey, Uuid, Date, DateTime, Index, JSON
 from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column, relationship
 
 from validators import DATE_FORMAT
@@ -19,6 +21,9 @@ class Student(Base):
 
     __tablename__ = "student"
 
+    # The students are browsed page by page following this order
+    __table_args__ = (Index("ix_student_name", "last_name", "first_name", "id"),)
+
     id: Mapped[str] = mapped_column(Uuid, primary_key=True, default=uuid.uuid4)
 
     first_name: Mapped[str] = mapped_column(String(50))
@@ -36,6 +41,10 @@ class Student(Base):
         back_populates="student", cascade="all, delete-orphan"
     )
 
+    payments: Mapped[List["Payment"]] = relationship(
+        back_populates="student", cascade="all, delete-orphan"
+    )
+
     def __init__(
         self, first_name="", last_name="", phone_number="", email_address="", address=""
     ):
@@ -73,13 +82,24 @@ class HourlyRate(Base):
 
     name: Mapped[str] = mapped_column(String(50))
 
-    # Prices up to 999.99, with two decimal places
+    # Current price, up to 999.99 with two decimal places ; the courses are
+    # billed at the price in force on their date, kept in the price history
     price: Mapped[float] = mapped_column(DECIMAL(precision=5, scale=2))
 
+    # Date from which a new price applies (today if None), read by the flush
+    # which records it in the price history (see rates.py)
+    price_valid_from = None
+
     courses: Mapped[List["Course"]] = relationship(
         back_populates="hourly_rate", cascade="all, delete-orphan"
     )
 
+    prices: Mapped[List["HourlyRatePrice"]] = relationship(
+        back_populates="hourly_rate",
+        cascade="all, delete-orphan",
+        order_by="HourlyRatePrice.valid_from",
+    )
+
     def __init__(self, name="", price=0.0):
         """Constructor override to give default values
         to attributes at Python-level."""
@@ -94,11 +114,73 @@ class HourlyRate(Base):
         return f"{self.name} - {self.price}€"
 
 
+class HourlyRatePrice(Base):
+    """Model describing the price of a hourly rate in force from valid_from
+    (included) to valid_to (excluded, None for the current price). A course is
+    billed at the price in force on its date, so that a new price leaves the
+    courses given before it untouched."""
+
+    __tablename__ = "hourly_rate_price"
+
+    # The price of a course is looked up along the primary key,
+    # by hourly rate and date
+    hourly_rate_id: Mapped[str] = mapped_column(
+        ForeignKey(f"{HourlyRate.__tablename__}.id"), primary_key=True
+    )
+
+    hourly_rate: Mapped["HourlyRate"] = relationship(back_populates="prices")
+
+    valid_from: Mapped[datetime.date] = mapped_column(Date(), primary_key=True)
+
+    valid_to: Mapped[datetime.date | None] = mapped_column(Date())
+
+    price: Mapped[float] = mapped_column(DECIMAL(precision=5, scale=2))
+
+
+class Payment(Base):
+    """Model describing a payment received, whose amount is allocated to
+    the courses it settles (see payments.py)."""
+
+    __tablename__ = "payment"
+
+    id: Mapped[str] = mapped_column(Uuid, primary_key=True, default=uuid.uuid4)
+
+    date: Mapped[datetime.date] = mapped_column(Date())
+
+    amount: Mapped[float] = mapped_column(DECIMAL(precision=12, scale=4))
+
+    # ID of the student who paid, None for the courses of several
+    # students marked as paid together
+    student_id: Mapped[str | None] = mapped_column(
+        ForeignKey(f"{Student.__tablename__}.id"), index=True
+    )
+
+    student: Mapped["Student | None"] = relationship(back_populates="payments")
+
+    allocations: Mapped[List["PaymentAllocation"]] = relationship(
+        back_populates="payment", cascade="all, delete-orphan"
+    )
+
+    def __repr__(self) -> str:
+        """Returns a description of a given payment as a string."""
+        return f"Paiement du {self.date.strftime(DATE_FORMAT)} - {self.amount:.2f}€"
+
+
 class Course(Base):
     """Model describing a course, given on a specific date for a specific duration."""
 
     __tablename__ = "course"
 
+    # The gains are summed over the paid courses and over the allocations of
+    # the unpaid ones within a date range, the courses are browsed page by
+    # page following the date, and the payments are allocated to the oldest
+    # unpaid courses of a student
+    __table_args__ = (
+        Index("ix_course_paid_date", "paid", "date"),
+        Index("ix_course_date_id", "date", "id"),
+        Index("ix_course_student_paid_date", "student_id", "paid", "date"),
+    )
+
     id: Mapped[str] = mapped_column(Uuid, primary_key=True, default=uuid.uuid4)
 
     date: Mapped[datetime.date] = mapped_column(Date())
@@ -109,17 +191,24 @@ class Course(Base):
     paid: Mapped[bool] = mapped_column()
 
     # ID of the student taking the course
-    student_id: Mapped[int] = mapped_column(ForeignKey(f"{Student.__tablename__}.id"))
+    student_id: Mapped[int] = mapped_column(
+        ForeignKey(f"{Student.__tablename__}.id"), index=True
+    )
 
     student: Mapped["Student"] = relationship(back_populates="courses")
 
     # ID of the hourly rate associated with the course
     hourly_rate_id: Mapped[int] = mapped_column(
-        ForeignKey(f"{HourlyRate.__tablename__}.id")
+        ForeignKey(f"{HourlyRate.__tablename__}.id"), index=True
     )
 
     hourly_rate: Mapped["HourlyRate"] = relationship(back_populates="courses")
 
+    # Parts of the payments applied to the course
+    allocations: Mapped[List["PaymentAllocation"]] = relationship(
+        back_populates="course", cascade="all, delete-orphan"
+    )
+
     def __init__(self, date=datetime.date.today(), duration=1, paid=False):
         """Constructor override to give default values to attributes
         at Python-level."""
@@ -142,3 +231,142 @@ class Course(Base):
         format described in the validators file."""
 
         return self.date.strftime(DATE_FORMAT)
+
+
+class PaymentAllocation(Base):
+    """Part of a payment applied to a course. A course is marked as paid
+    once its whole amount is allocated."""
+
+    __tablename__ = "payment_allocation"
+
+    payment_id: Mapped[str] = mapped_column(
+        ForeignKey(f"{Payment.__tablename__}.id"), primary_key=True
+    )
+
+    payment: Mapped["Payment"] = relationship(back_populates="allocations")
+
+    course_id: Mapped[str] = mapped_column(
+        ForeignKey(f"{Course.__tablename__}.id"), primary_key=True, index=True
+    )
+
+    course: Mapped["Course"] = relationship(back_populates="allocations")
+
+    amount: Mapped[float] = mapped_column(DECIMAL(precision=12, scale=4))
+
+
+class StudentBalance(Base):
+    """Running totals of the courses of a student, kept up to date by the
+    ledger at each flush so that statistics do not need to scan the courses."""
+
+    __tablename__ = "student_balance"
+
+    # No foreign key : the row is removed by the ledger once the courses
+    # of a deleted student have been subtracted from it
+    student_id: Mapped[str] = mapped_column(Uuid, primary_key=True)
+
+    # Amount of the unpaid courses
+    debt: Mapped[float] = mapped_column(DECIMAL(precision=12, scale=4))
+
+    # Amount of the paid courses
+    gains: Mapped[float] = mapped_column(DECIMAL(precision=12, scale=4))
+
+
+class MonthlyBalance(Base):
+    """Running totals of the courses given during a month,
+    kept up to date by the ledger at each flush."""
+
+    __tablename__ = "monthly_balance"
+
+    # First day of the month
+    month: Mapped[datetime.date] = mapped_column(Date(), primary_key=True)
+
+    # Amount of the unpaid courses
+    debt: Mapped[float] = mapped_column(DECIMAL(precision=12, scale=4))
+
+    # Amount of the paid courses
+    gains: Mapped[float] = mapped_column(DECIMAL(precision=12, scale=4))
+
+
+class DataGeneration(Base):
+    """Single row counting the changes of the data the statistics depend on,
+    increased by the transactions making them (see stats_cache.py), so that
+    every process sharing the database knows when its cached results are
+    outdated."""
+
+    __tablename__ = "data_generation"
+
+    id: Mapped[int] = mapped_column(primary_key=True)
+
+    generation: Mapped[int]
+
+
+class CourseMonthlySummary(Base):
+    """Totals of the courses of a student at an hourly rate during a completed
+    month, frozen by the rollup so that reports do not scan old courses."""
+
+    __tablename__ = "course_monthly_summary"
+
+    # First day of the month
+    month: Mapped[datetime.date] = mapped_column(Date(), primary_key=True)
+
+    # No foreign keys : the rows of a month are removed by the rollup
+    # as soon as one of its courses changes
+    student_id: Mapped[str] = mapped_column(Uuid, primary_key=True)
+
+    hourly_rate_id: Mapped[str] = mapped_column(Uuid, primary_key=True)
+
+    # Number of courses
+    courses: Mapped[int] = mapped_column()
+
+    # Sum of the durations
+    hours: Mapped[float] = mapped_column(DECIMAL(precision=10, scale=2))
+
+    # Amount of all the courses
+    billed: Mapped[float] = mapped_column(DECIMAL(precision=12, scale=4))
+
+    # Amount of the paid courses
+    paid: Mapped[float] = mapped_column(DECIMAL(precision=12, scale=4))
+
+
+class RollupPeriod(Base):
+    """Month whose courses are summarized in CourseMonthlySummary. The frozen
+    months always form a prefix of the history : they are appended by the
+    rollup, and removed from the first one whose courses change."""
+
+    __tablename__ = "rollup_period"
+
+    # First day of the month
+    month: Mapped[datetime.date] = mapped_column(Date(), primary_key=True)
+
+    frozen_at: Mapped[datetime.datetime] = mapped_column(DateTime())
+
+
+class JournalEntry(Base):
+    """Change made to a student, an hourly rate or a course, appended to the
+    journal by the flush (see journal.py). The entries are never changed ;
+    the oldest ones are moved to an archive file."""
+
+    __tablename__ = "journal_entry"
+
+    # The history of an entity is read in date order along this index
+    __table_args__ = (Index("ix_journal_entry_entity", "entity_id", "changed_at"),)
+
+    # Order in which the entries were appended
+    id: Mapped[int] = mapped_column(primary_key=True)
+
+    changed_at: Mapped[datetime.datetime] = mapped_column(DateTime(), index=True)
+
+    # Name of the table of the entity ; no foreign key, as the entries
+    # outlive the entities they describe
+    entity_type: Mapped[str] = mapped_column(String(20))
+
+    entity_id: Mapped[str] = mapped_column(Uuid)
+
+    # "insert", "update" or "delete"
+    operation: Mapped[str] = mapped_column(String(6))
+
+    # Values of the columns before and after the change (None when the
+    # entity did not exist yet, or no longer exists)
+    before_image: Mapped[dict | None] = mapped_column(JSON)
+
+    after_image: Mapped[dict | None] = mapped_column(JSON)
@@ -0,0 +1,322 @@
+"""This file implements the payments and their allocation to the courses.
+
+A payment received from a student is applied to his oldest unpaid courses, in
+date order : each course receives the part of the payment it still needs, and
+is marked as paid once its whole amount is allocated. The unpaid courses are
+read by date from the (student, paid, date) index, and only as many as the
+payment covers, so that the allocation stays fast whatever the number of
+courses of the student. A payment may not exceed what the student owes, so
+that its whole amount is allocated. The debts and the gains are derived from
+the allocations (see queries.course_settled_amount).
+
+The courses of a student, of a period or of an hourly rate (or several chosen
+courses) can also be marked as paid or unpaid in bulk : once their number and
+amount have been previewed, they are marked by a single UPDATE statement, and
+the courses marked as paid together are tied to a payment by allocations
+inserted by a single INSERT ... SELECT statement. The courses marked as unpaid
+lose their allocations, and the payments the amount of these allocations (a
+payment left with nothing allocated is removed). The balances of the ledger
+are updated around the statements (see ledger.tracking) ; the rollup and the
+statistics cache are kept consistent by their own listeners."""
+
+import datetime
+import uuid
+from decimal import Decimal
+from typing import NamedTuple
+
+from sqlalchemy import Uuid, and_, delete, false, func, insert, literal, select, update
+from sqlalchemy.orm import Session
+
+import ledger
+from models import Course, HourlyRatePrice, Payment, PaymentAllocation
+from queries import (
+    course_allocated,
+    course_amount,
+    course_price_condition,
+    course_settled_amount,
+)
+
+# Number of unpaid courses fetched from the database at a time by the allocation
+FETCH_SIZE = 100
+
+# Bounds of the amount of a payment (stored with 8 digits before the point)
+MIN_AMOUNT = Decimal("0.01")
+MAX_AMOUNT = Decimal("99999999.99")
+
+
+class PaymentPreview(NamedTuple):
+    """Number and amount of the courses which would be marked."""
+
+    courses: int
+    amount: Decimal
+
+
+class MarkResult(NamedTuple):
+    """Number and amount of the courses marked, and the payment tying them
+    (None when the courses were marked as unpaid, or if none matched)."""
+
+    courses: int
+    amount: Decimal
+    payment: Payment | None
+
+
+class AllocationResult(NamedTuple):
+    """Payment allocated and number of courses which received a part of it
+    (of which the number of courses paid in full)."""
+
+    payment: Payment
+    courses: int
+    paid_courses: int
+
+
+class ExcessPaymentError(ValueError):
+    """Raised when a payment exceeds what the student owes."""
+
+    def __init__(self, due: Decimal) -> None:
+        super().__init__(f"The payment exceeds the debt of the student ({due})")
+        self.due = due
+
+
+def selection_criterion(
+    student_id: uuid.UUID | None = None,
+    hourly_rate_id: uuid.UUID | None = None,
+    start_date: datetime.date | None = None,
+    end_date: datetime.date | None = None,
+    course_ids: list | None = None,
+):
+    """Returns the criterion selecting the courses matching all the given
+    conditions (dates included). It does not depend on the payment of the
+    courses, so that it selects the same courses before and after they are
+    marked, as ledger.tracking requires."""
+
+    clauses = []
+
+    if student_id is not None:
+        clauses.append(Course.student_id == student_id)
+
+    if hourly_rate_id is not None:
+        clauses.append(Course.hourly_rate_id == hourly_rate_id)
+
+    if start_date is not None:
+        clauses.append(Course.date >= start_date)
+
+    if end_date is not None:
+        clauses.append(Course.date <= end_date)
+
+    # An empty list selects no course
+    if course_ids is not None:
+        clauses.append(Course.id.in_(course_ids))
+
+    # Every course would be marked otherwise
+    if not clauses:
+        raise ValueError("No criterion selecting the courses")
+
+    return and_(*clauses)
+
+
+def _remaining_amount():
+    """SQL expression of the part of the amount of an unpaid course which is
+    not allocated yet. The queries using it must join the HourlyRatePrice table
+    on queries.course_price_condition()."""
+
+    return course_amount() - course_allocated()
+
+
+def student_due(current_session: Session, student_id: uuid.UUID) -> Decimal:
+    """Returns what remains due on the unpaid courses of the student."""
+
+    due = current_session.scalar(
+        select(func.coalesce(func.sum(_remaining_amount()), 0))
+        .select_from(Course)
+        .join(HourlyRatePrice, course_price_condition())
+        .where(Course.student_id == student_id, Course.paid == false())
+    )
+
+    return Decimal(due).quantize(ledger.AMOUNT_QUANTUM)
+
+
+def _selection_figures(current_session: Session, criterion, paid: bool):
+    """Returns the number of the courses matching the criterion which would be
+    marked as paid (or unpaid), the amount which would be paid (or cancelled),
+    and their student if they all belong to the same one."""
+
+    amount = _remaining_amount() if paid else course_settled_amount()
+
+    courses, total, first_student, last_student = current_session.execute(
+        select(
+            func.count(Course.id),
+            func.coalesce(func.sum(amount), 0),
+            func.min(Course.student_id),
+            func.max(Course.student_id),
+        )
+        .join(HourlyRatePrice, course_price_condition())
+        .where(criterion, Course.paid == (not paid))
+    ).one()
+
+    student_id = first_student if first_student == last_student else None
+
+    return courses, Decimal(total), student_id
+
+
+def preview(current_session: Session, criterion, paid: bool) -> PaymentPreview:
+    """Returns the number of the courses matching the criterion which would be
+    marked as paid (or unpaid) and the amount which would be paid (or cancelled),
+    with a single query."""
+
+    courses, amount, _ = _selection_figures(current_session, criterion, paid)
+
+    return PaymentPreview(courses, amount)
+
+
+def mark_courses(
+    current_session: Session,
+    criterion,
+    paid: bool,
+    payment_date: datetime.date | None = None,
+) -> MarkResult:
+    """Marks as paid (or unpaid) the courses matching the criterion with a single
+    UPDATE statement. What remains due on the courses marked as paid is allocated
+    to a new payment dated payment_date (today if None) ; the allocations of the
+    courses marked as unpaid are removed, and their amount taken off their
+    payments (those left with nothing allocated being removed). The changes
+    are committed with the transaction of the session."""
+
+    courses, amount, student_id = _selection_figures(current_session, criterion, paid)
+
+    if courses == 0:
+        return MarkResult(0, amount, None)
+
+    selected = and_(criterion, Course.paid == (not paid))
+    payment = None
+
+    if paid:
+        payment = Payment(
+            date=payment_date or datetime.date.today(),
+            amount=amount,
+            student_id=student_id,
+        )
+        current_session.add(payment)
+
+        # The identifier of the payment is needed by the statements
+        current_session.flush()
+
+    with ledger.tracking(current_session, criterion):
+        if paid:
+            remaining = _remaining_amount()
+
+            current_session.execute(
+                insert(PaymentAllocation).from_select(
+                    ["payment_id", "course_id", "amount"],
+                    select(literal(payment.id, Uuid), Course.id, remaining)
+                    .join(HourlyRatePrice, course_price_condition())
+                    .where(selected, remaining > 0),
+                )
+            )
+
+        else:
+            removed = PaymentAllocation.course_id.in_(select(Course.id).where(selected))
+
+            # The payments reduced are read before their allocations are
+            # removed : only those may be left with nothing allocated
+            reduced = current_session.scalars(
+                select(PaymentAllocation.payment_id).where(removed).distinct()
+            ).all()
+
+            # The amounts are rounded to the scale of the column, so that
+            # the payments whose allocations are all removed are left at 0
+            current_session.execute(
+                update(Payment)
+                .where(Payment.id.in_(reduced))
+                .values(
+                    amount=func.round(
+                        Payment.amount
+                        - select(func.sum(PaymentAllocation.amount))
+                        .where(PaymentAllocation.payment_id == Payment.id, removed)
+                        .scalar_subquery(),
+                        4,
+                    )
+                )
+                .execution_options(synchronize_session=False)
+            )
+            current_session.execute(
+                delete(PaymentAllocation)
+                .where(removed)
+                .execution_options(synchronize_session=False)
+            )
+            current_session.execute(
+                delete(Payment)
+                .where(Payment.id.in_(reduced), Payment.amount <= 0)
+                .execution_options(synchronize_session=False)
+            )
+
+        result = current_session.execute(
+            update(Course).where(selected).values(paid=paid)
+        )
+
+    return MarkResult(result.rowcount, amount, payment)
+
+
+def allocate_payment(
+    current_session: Session,
+    student_id: uuid.UUID,
+    amount: Decimal,
+    payment_date: datetime.date | None = None,
+) -> AllocationResult:
+    """Records a payment of the student dated payment_date (today if None) and
+    allocates it to his oldest unpaid courses, in date order, marking as paid
+    the courses whose whole amount is allocated. Raises ExcessPaymentError if
+    the amount exceeds what the student owes. The changes are committed with
+    the transaction of the session."""
+
+    due = student_due(current_session, student_id)
+
+    if amount > due:
+        raise ExcessPaymentError(due)
+
+    payment = Payment(
+        date=payment_date or datetime.date.today(),
+        amount=amount,
+        student_id=student_id,
+    )
+    current_session.add(payment)
+
+    remaining = Decimal(amount)
+    courses = paid_courses = 0
+
+    # The courses are fetched a few at a time, and only until the payment
+    # is used up, from the (student, paid, date) index
+    result = current_session.execute(
+        select(Course, _remaining_amount())
+        .join(HourlyRatePrice, course_price_condition())
+        .where(Course.student_id == student_id, Course.paid == false())
+        .order_by(Course.date, Course.id)
+        .execution_options(yield_per=FETCH_SIZE)
+    )
+
+    try:
+        for course, due in result:
+            if remaining <= 0:
+                break
+
+            due = Decimal(due).quantize(ledger.AMOUNT_QUANTUM)
+            part = min(due, remaining)
+
+            if part > 0:
+                payment.allocations.append(
+                    PaymentAllocation(course=course, amount=part)
+                )
+                courses += 1
+
+            if part == due:
+                course.paid = True
+                paid_courses += 1
+
+            remaining -= part
+
+    finally:
+        result.close()
+
+    # The allocations are written (and the balances updated) by the flush
+    current_session.flush()
+
+    return AllocationResult(payment, courses, paid_courses)
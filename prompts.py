@@ -6,14 +6,47 @@ import datetime
 from decimal import Decimal
 from typing import Type
 
-from sqlalchemy import select, desc
+from sqlalchemy import select
 from sqlalchemy.orm import Session
 from InquirerPy import inquirer
 from InquirerPy.base.control import Choice
+from prompt_toolkit.completion import Completer, Completion
 
 import validators
 import sanitizers
 from models import Student, HourlyRate, Course, Base
+from queries import entity_page_query, entity_keyset
+from search import search, search_available
+
+# Number of entities displayed on each page of the choice menus
+PAGE_SIZE = 20
+
+# Maximum number of results suggested by the search
+SEARCH_LIMIT = 10
+
+# Values of the choices used to navigate between the pages
+_NEXT_PAGE = object()
+_PREVIOUS_PAGE = object()
+_SEARCH = object()
+
+
+class SearchCompleter(Completer):
+    """Suggests, as the user types, the entities matching the text typed so far.
+    The suggested entities are kept to be returned once one of them is chosen."""
+
+    def __init__(self, current_session: Session, model: Type[Base]):
+        self.current_session = current_session
+        self.model = model
+        self.suggestions = {}
+
+    def get_completions(self, document, complete_event):
+        for entity in search(
+            self.current_session, self.model, document.text, SEARCH_LIMIT
+        ):
+            label = str(entity)
+            self.suggestions[label] = entity
+
+            yield Completion(label, start_position=-len(document.text))
 
 
 def prompt_date(
@@ -32,29 +65,218 @@ def prompt_date(
     ).execute()
 
 
+def prompt_report_options() -> tuple[str, str | None]:
+    """Asks the user for the period and the breakdown of a revenue report."""
+
+    period = inquirer.select(
+        message="Regrouper les cours par :",
+        choices=[
+            Choice("day", "Jour"),
+            Choice("week", "Semaine"),
+            Choice("month", "Mois"),
+            Choice("year", "Année"),
+        ],
+        default="month",
+    ).execute()
+
+    breakdown = inquirer.select(
+        message="Détailler les montants :",
+        choices=[
+            Choice(None, "Non"),
+            Choice("student", "Par élève"),
+            Choice("rate", "Par taux horaire"),
+        ],
+    ).execute()
+
+    return period, breakdown
+
+
+def prompt_statements_options() -> tuple[str, str]:
+    """Asks the user for the directory and the format of the statements."""
+
+    directory = inquirer.text(
+        message="Dossier dans lequel écrire les relevés :",
+        default="releves",
+        validate=lambda directory: directory.strip() != "",
+        invalid_message="Le nom du dossier ne peut pas être vide.",
+    ).execute()
+
+    file_format = inquirer.select(
+        message="Format des relevés :",
+        choices=[Choice("txt", "Texte"), Choice("html", "HTML")],
+    ).execute()
+
+    return directory.strip(), file_format
+
+
+def prompt_course_selection(current_session: Session, paid: bool) -> dict:
+    """Asks the user which courses to mark as paid (or unpaid) : those of a
+    student, of a period or of an hourly rate, or several courses of a student
+    chosen one by one. Returns the arguments of payments.selection_criterion."""
+
+    mode = inquirer.select(
+        message="Quels cours voulez-vous marquer ?",
+        choices=[
+            Choice("student", "Tous les cours d'un élève"),
+            Choice("period", "Tous les cours d'une période"),
+            Choice("rate", "Tous les cours d'un taux horaire"),
+            Choice("courses", "Plusieurs cours d'un élève, choisis un par un"),
+        ],
+    ).execute()
+
+    if mode == "period":
+        start_date = prompt_date(
+            datetime.date.today().replace(day=1),
+            prompt_message="Date du premier cours :",
+        )
+        end_date = prompt_date(prompt_message="Date du dernier cours :")
+
+        return {"start_date": start_date, "end_date": end_date}
+
+    if mode == "rate":
+        hourly_rate = prompt_entity_choice(
+            current_session, HourlyRate, prompt_message="Quel taux horaire ?"
+        )
+
+        return {"hourly_rate_id": hourly_rate.id}
+
+    student = prompt_entity_choice(
+        current_session, Student, prompt_message="Quel élève ?"
+    )
+
+    if mode == "student":
+        return {"student_id": student.id}
+
+    # Only the courses which can be marked are offered
+    courses = current_session.scalars(
+        select(Course)
+        .where(Course.student_id == student.id, Course.paid == (not paid))
+        .order_by(Course.date)
+    ).all()
+
+    course_ids = inquirer.checkbox(
+        message="Cours à marquer (espace pour sélectionner) :",
+        choices=[
+            Choice(course.id, f"{course.formatted_date} ({course.duration} heures)")
+            for course in courses
+        ],
+    ).execute()
+
+    return {"student_id": student.id, "course_ids": course_ids}
+
+
+def prompt_payment(
+    current_session: Session, min_amount: Decimal, max_amount: Decimal
+) -> tuple[Student, Decimal, datetime.date]:
+    """Asks the user for the student who paid, the amount and the date of a payment."""
+
+    student = prompt_entity_choice(
+        current_session, Student, prompt_message="Quel élève a payé ?"
+    )
+
+    amount = inquirer.text(
+        message="Montant payé (en euros) :",
+        validate=lambda res: validators.validate_decimal(res, min_amount, max_amount),
+        invalid_message=f"Le montant doit être compris entre {min_amount}€ "
+        f"et {max_amount}€.",
+        filter=sanitizers.sanitize_decimal,
+    ).execute()
+
+    payment_date = prompt_date(prompt_message="Date du paiement :")
+
+    return student, Decimal(amount), payment_date
+
+
+def prompt_confirmation(prompt_message: str) -> bool:
+    """Asks the user to confirm an operation."""
+
+    return inquirer.confirm(message=prompt_message, default=True).execute()
+
+
 def prompt_entity_choice(
     current_session: Session,
     model: Type[Base],
     prompt_message: str = "Quelle entité voulez-vous sélectionner ?",
 ) -> Base:
     """Prints a menu asking the user to choose an entity and
-    returns the corresponding instance of the model."""
+    returns the corresponding instance of the model. The entities
+    are fetched page by page (the courses are sorted by date)."""
 
-    # List of existing entities : we sort by date the courses
-    if model == Course:
-        stmt = select(model).order_by(desc(model.date))
-    else:
-        stmt = select(model)
+    # Keysets from which the previous pages were fetched
+    previous_keysets = []
+    keyset = None
 
-    entity_list = current_session.scalars(stmt)
+    searchable = search_available(current_session, model)
 
-    # Menu prompting the user to choose an entity
-    chosen_entity = inquirer.select(
-        message=prompt_message,
-        choices=entity_list,
+    while True:
+        # One more entity is fetched to know whether there is a next page
+        page = current_session.scalars(
+            entity_page_query(model, keyset, PAGE_SIZE + 1)
+        ).all()
+
+        choices = [Choice(entity, str(entity)) for entity in page[:PAGE_SIZE]]
+
+        if searchable:
+            choices.insert(0, Choice(_SEARCH, "🔍 Rechercher"))
+
+        if len(page) > PAGE_SIZE:
+            choices.append(Choice(_NEXT_PAGE, "→ Page suivante"))
+
+        if previous_keysets:
+            choices.append(Choice(_PREVIOUS_PAGE, "← Page précédente"))
+
+        # Menu prompting the user to choose an entity
+        chosen_entity = inquirer.select(
+            message=prompt_message,
+            choices=choices,
+        ).execute()
+
+        if chosen_entity is _NEXT_PAGE:
+            previous_keysets.append(keyset)
+            keyset = entity_keyset(page[PAGE_SIZE - 1])
+
+        elif chosen_entity is _PREVIOUS_PAGE:
+            keyset = previous_keysets.pop()
+
+        elif chosen_entity is _SEARCH:
+            found_entity = prompt_entity_search(current_session, model, prompt_message)
+
+            if found_entity is not None:
+                return found_entity
+
+        else:
+            return chosen_entity
+
+
+def prompt_entity_search(
+    current_session: Session,
+    model: Type[Base],
+    prompt_message: str = "Quelle entité voulez-vous sélectionner ?",
+) -> Base | None:
+    """Asks the user for some text, suggesting the matching entities as he
+    types, and returns the chosen entity (None if nothing matches)."""
+
+    completer = SearchCompleter(current_session, model)
+
+    user_input = inquirer.text(
+        message=f"{prompt_message} (recherche)",
+        completer=completer,
     ).execute()
 
-    return chosen_entity
+    # The user picked one of the suggestions
+    if user_input in completer.suggestions:
+        return completer.suggestions[user_input]
+
+    results = search(current_session, model, user_input, SEARCH_LIMIT)
+
+    if not results:
+        print("Aucun résultat pour cette recherche.")
+        return None
+
+    return inquirer.select(
+        message=prompt_message,
+        choices=[Choice(entity, str(entity)) for entity in results],
+    ).execute()
 
 
 def prompt_student(_: Session, student: Student) -> None:
@@ -166,6 +388,8 @@ def prompt_hourly_rate(_: Session, hourly_rate: HourlyRate):
         invalid_message="Le nom doit comporter entre 3 et 50 caractères.",
     ).execute()
 
+    former_price = hourly_rate.price
+
     hourly_rate.price = inquirer.text(
         message="Tarif (en euros) :",
         default=str(hourly_rate.price),
@@ -175,4 +399,12 @@ def prompt_hourly_rate(_: Session, hourly_rate: HourlyRate):
         filter=sanitizers.sanitize_decimal,
     ).execute()
 
+    # The courses given before the new price keep the former one
+    if hourly_rate.id is not None and Decimal(str(former_price)) != Decimal(
+        str(hourly_rate.price)
+    ):
+        hourly_rate.price_valid_from = prompt_date(
+            prompt_message="À partir de quelle date ce tarif s'applique-t-il ?"
+        )
+
     return hourly_rate
@@ -0,0 +1,423 @@
+"""This file contains the queries used to compute the statistics of the app
+and to browse the entities. The aggregations are performed by the database in
+a single statement instead of walking through the relationships of every entity
+in Python, and the results are returned as typed rows that the controllers only
+have to display."""
+
+import datetime
+from decimal import Decimal
+from typing import NamedTuple, Sequence, Type
+
+from sqlalchemy import (
+    Date,
+    Select,
+    and_,
+    case,
+    false,
+    func,
+    or_,
+    select,
+    true,
+    tuple_,
+)
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.orm import Session, joinedload
+from sqlalchemy.sql.base import ExecutableOption
+from sqlalchemy.sql.functions import FunctionElement
+from sqlalchemy.sql.visitors import InternalTraversal
+
+from models import (
+    Base,
+    Course,
+    HourlyRate,
+    HourlyRatePrice,
+    MonthlyBalance,
+    PaymentAllocation,
+    Student,
+    StudentBalance,
+)
+
+# Columns along which each model is browsed page by page, ending with the
+# primary key so that the order is total, and whether the order is descending
+KEYSET_ORDERS = {
+    Course: ((Course.date, Course.id), True),
+    Student: ((Student.last_name, Student.first_name, Student.id), False),
+    HourlyRate: ((HourlyRate.name, HourlyRate.id), False),
+}
+
+# Modifiers of the date function of SQLite giving the first day of each period
+# (weeks start on Monday : the next Sunday, or the same day, minus six days)
+_SQLITE_MODIFIERS = {
+    "day": (),
+    "week": ("weekday 0", "-6 days"),
+    "month": ("start of month",),
+    "year": ("start of year",),
+}
+
+
+class period_start(FunctionElement):
+    """SQL expression of the first day of the period (day, week, month
+    or year) containing the given date, compiled for each database."""
+
+    type = Date()
+    inherit_cache = True
+
+    # The period is part of the cache key, as it changes the compiled SQL
+    _traverse_internals = FunctionElement._traverse_internals + [
+        ("period", InternalTraversal.dp_string)
+    ]
+
+    def __init__(self, period: str, date_column):
+        self.period = period
+        super().__init__(date_column)
+
+
+@compiles(period_start)
+def _compile_period_start(element, compiler, **kwargs):
+    """date_trunc is understood by PostgreSQL and most other databases."""
+
+    return (
+        f"CAST(date_trunc('{element.period}', "
+        f"{compiler.process(element.clauses, **kwargs)}) AS DATE)"
+    )
+
+
+@compiles(period_start, "sqlite")
+def _compile_period_start_sqlite(element, compiler, **kwargs):
+    """SQLite stores the dates as text, handled by its date function."""
+
+    modifiers = "".join(
+        f", '{modifier}'" for modifier in _SQLITE_MODIFIERS[element.period]
+    )
+
+    return f"date({compiler.process(element.clauses, **kwargs)}{modifiers})"
+
+
+class StudentDebt(NamedTuple):
+    """Row returned by the debt per student aggregation."""
+
+    student: Student
+    debt: Decimal
+
+
+def course_price_condition():
+    """SQL condition joining a course with the price of its hourly rate in force
+    on its date. The prices are read through their primary key (hourly rate,
+    start date), so that a course matches a single price of its rate."""
+
+    return and_(
+        HourlyRatePrice.hourly_rate_id == Course.hourly_rate_id,
+        HourlyRatePrice.valid_from <= Course.date,
+        or_(HourlyRatePrice.valid_to.is_(None), HourlyRatePrice.valid_to > Course.date),
+    )
+
+
+def course_amount():
+    """SQL expression of the amount billed for a course (price × duration), at
+    the price in force on its date. The queries using it must join the
+    HourlyRatePrice table on course_price_condition()."""
+
+    return HourlyRatePrice.price * Course.duration
+
+
+def course_allocated():
+    """SQL expression of the sum of the parts of the payments allocated to a
+    course, read through the index of the allocations on the course."""
+
+    return (
+        select(func.coalesce(func.sum(PaymentAllocation.amount), 0))
+        .where(PaymentAllocation.course_id == Course.id)
+        .scalar_subquery()
+    )
+
+
+def course_settled_amount():
+    """SQL expression of the part of the amount of a course which was paid : all
+    of it once the course is marked as paid, the parts of the payments allocated
+    to it otherwise (only looked up for the unpaid courses). The queries using
+    it must join the HourlyRatePrice table on course_price_condition()."""
+
+    return case((Course.paid == true(), course_amount()), else_=course_allocated())
+
+
+def course_due_amount():
+    """SQL expression of the part of the amount of a course which is still due.
+    The queries using it must join the HourlyRatePrice table on
+    course_price_condition()."""
+
+    return case((Course.paid == true(), 0), else_=course_amount() - course_allocated())
+
+
+def debt_per_student_query() -> Select:
+    """Builds the query computing, for every student, the amount still due
+    on his unpaid courses. Students without any unpaid course are kept
+    thanks to the outer joins."""
+
+    debt = func.coalesce(func.sum(course_due_amount()), 0)
+
+    return (
+        select(Student, debt.label("debt"))
+        .outerjoin(
+            Course, and_(Course.student_id == Student.id, Course.paid == false())
+        )
+        .outerjoin(HourlyRatePrice, course_price_condition())
+        .group_by(Student.id)
+        .order_by(Student.last_name, Student.first_name)
+    )
+
+
+def debt_per_student(current_session: Session) -> list[StudentDebt]:
+    """Returns the debt of every student, computed with one GROUP BY query."""
+
+    return [
+        StudentDebt(student, Decimal(debt))
+        for student, debt in current_session.execute(debt_per_student_query())
+    ]
+
+
+def gains_query(
+    start_date: datetime.date, end_date: datetime.date | None = None
+) -> Select:
+    """Builds the query summing the amounts paid for the courses given between
+    start_date and end_date (both included, no upper bound if end_date is None):
+    the amounts of the paid courses, plus the parts of the payments allocated to
+    the unpaid ones. Both sums filter on paid and on the date, matching the
+    (paid, date) index, so only the courses of the window are read."""
+
+    window = [Course.date >= start_date]
+
+    if end_date is not None:
+        window.append(Course.date <= end_date)
+
+    paid_courses = (
+        select(func.coalesce(func.sum(course_amount()), 0))
+        .select_from(Course)
+        .join(HourlyRatePrice, course_price_condition())
+        .where(Course.paid == true(), *window)
+    )
+    allocated = (
+        select(func.coalesce(func.sum(PaymentAllocation.amount), 0))
+        .select_from(Course)
+        .join(PaymentAllocation, PaymentAllocation.course_id == Course.id)
+        .where(Course.paid == false(), *window)
+    )
+
+    return select(paid_courses.scalar_subquery() + allocated.scalar_subquery())
+
+
+def gains(
+    current_session: Session,
+    start_date: datetime.date,
+    end_date: datetime.date | None = None,
+) -> Decimal:
+    """Returns the gains made between the two given dates."""
+
+    return Decimal(current_session.scalar(gains_query(start_date, end_date)))
+
+
+def balance_debt_per_student_query() -> Select:
+    """Builds the query reading the debt of every student
+    from the balances maintained by the ledger."""
+
+    return (
+        select(Student, func.coalesce(StudentBalance.debt, 0).label("debt"))
+        .outerjoin(StudentBalance, StudentBalance.student_id == Student.id)
+        .order_by(Student.last_name, Student.first_name)
+    )
+
+
+def balance_debt_per_student(current_session: Session) -> list[StudentDebt]:
+    """Returns the debt of every student, read from the ledger balances."""
+
+    return [
+        StudentDebt(student, Decimal(debt))
+        for student, debt in current_session.execute(balance_debt_per_student_query())
+    ]
+
+
+def next_month(date: datetime.date) -> datetime.date:
+    """Returns the first day of the month following the given date."""
+
+    return (date.replace(day=1) + datetime.timedelta(days=31)).replace(day=1)
+
+
+def balance_gains_queries(
+    start_date: datetime.date, end_date: datetime.date | None = None
+) -> list[Select]:
+    """Builds the queries whose results add up to the gains made between the two
+    given dates (both included). The months entirely covered by the window are
+    read from the monthly balances, only the partial months at its bounds are
+    summed from the courses."""
+
+    if end_date is not None and end_date < start_date:
+        return []
+
+    stmts = []
+    months_start = start_date
+
+    # The first month is only partially covered
+    if start_date.day != 1:
+        months_start = next_month(start_date)
+        head_end = months_start - datetime.timedelta(days=1)
+
+        if end_date is not None and end_date <= head_end:
+            return [gains_query(start_date, end_date)]
+
+        stmts.append(gains_query(start_date, head_end))
+
+    stmt = select(func.coalesce(func.sum(MonthlyBalance.gains), 0)).where(
+        MonthlyBalance.month >= months_start
+    )
+
+    if end_date is not None:
+        months_end = next_month(end_date)
+
+        # The last month is only partially covered
+        if months_end - datetime.timedelta(days=1) != end_date:
+            months_end = end_date.replace(day=1)
+            stmts.append(gains_query(months_end, end_date))
+
+        stmt = stmt.where(MonthlyBalance.month < months_end)
+
+    return stmts + [stmt]
+
+
+def balance_gains(
+    current_session: Session,
+    start_date: datetime.date,
+    end_date: datetime.date | None = None,
+) -> Decimal:
+    """Returns the gains made between the two given dates (both included),
+    read from the monthly balances where possible."""
+
+    return sum(
+        (
+            Decimal(current_session.scalar(stmt))
+            for stmt in balance_gains_queries(start_date, end_date)
+        ),
+        Decimal(0),
+    )
+
+
+def entity_list_query(
+    model: Type[Base],
+    limit: int | None = None,
+    options: Sequence[ExecutableOption] = (),
+) -> Select:
+    """Builds the query returning the entities of the model (at most limit
+    of them), with the given loader options (joinedload, selectinload...)."""
+
+    stmt = select(model).options(*options)
+
+    return stmt.limit(limit) if limit is not None else stmt
+
+
+def entity_page_query(
+    model: Type[Base], after: tuple | None = None, size: int = 20
+) -> Select:
+    """Builds the query returning the page of entities following the given
+    keyset (the values of the sort columns of the last entity of the previous
+    page). The relationships displayed along with the entities are eager-loaded."""
+
+    columns, descending = KEYSET_ORDERS[model]
+    stmt = select(model)
+
+    # The description of a course contains the name of the student
+    if model is Course:
+        stmt = stmt.options(joinedload(Course.student))
+
+    if after is not None:
+        keyset = tuple_(*columns)
+        stmt = stmt.where(keyset < after if descending else keyset > after)
+
+    return stmt.order_by(
+        *(column.desc() if descending else column for column in columns)
+    ).limit(size)
+
+
+def entity_keyset(entity: Base) -> tuple:
+    """Returns the values of the sort columns of the given entity,
+    from which the following page can be requested."""
+
+    columns, _ = KEYSET_ORDERS[type(entity)]
+    return tuple(getattr(entity, column.key) for column in columns)
+
+
+def course_export_query(
+    start_date: datetime.date | None = None,
+    end_date: datetime.date | None = None,
+    paid: bool | None = None,
+) -> Select:
+    """Builds the query returning the courses joined with their student and
+    hourly rate, given between the two dates (both included, no bound if None),
+    and paid or unpaid (both if None). The rows are sorted by date."""
+
+    stmt = (
+        select(
+            Course.id,
+            Course.date,
+            Course.duration,
+            Course.paid,
+            Student.first_name,
+            Student.last_name,
+            Student.email_address,
+            HourlyRate.name.label("hourly_rate"),
+            HourlyRatePrice.price,
+            course_amount().label("amount"),
+        )
+        .join(Student, Student.id == Course.student_id)
+        .join(HourlyRate, HourlyRate.id == Course.hourly_rate_id)
+        .join(HourlyRatePrice, course_price_condition())
+        .order_by(Course.date, Course.id)
+    )
+
+    if start_date is not None:
+        stmt = stmt.where(Course.date >= start_date)
+
+    if end_date is not None:
+        stmt = stmt.where(Course.date <= end_date)
+
+    if paid is not None:
+        stmt = stmt.where(Course.paid == (true() if paid else false()))
+
+    return stmt
+
+
+def unpaid_courses_query(
+    end_date: datetime.date | None = None, student_ids: Sequence | None = None
+) -> Select:
+    """Builds the query returning the unpaid courses given until end_date (no
+    bound if None) with their student, hourly rate and the part of their amount
+    already paid, for the given students (all if None). The rows are grouped by
+    student, then sorted by date."""
+
+    stmt = (
+        select(
+            Student.id.label("student_id"),
+            Student.first_name,
+            Student.last_name,
+            Student.email_address,
+            Student.address,
+            Course.date,
+            Course.duration,
+            HourlyRate.name.label("hourly_rate"),
+            HourlyRatePrice.price,
+            course_amount().label("amount"),
+            course_allocated().label("settled"),
+        )
+        .join(Student, Student.id == Course.student_id)
+        .join(HourlyRate, HourlyRate.id == Course.hourly_rate_id)
+        .join(HourlyRatePrice, course_price_condition())
+        .where(Course.paid == false())
+        .order_by(
+            Student.last_name, Student.first_name, Student.id, Course.date, Course.id
+        )
+    )
+
+    if end_date is not None:
+        stmt = stmt.where(Course.date <= end_date)
+
+    if student_ids is not None:
+        stmt = stmt.where(Course.student_id.in_(student_ids))
+
+    return stmt
@@ -0,0 +1,221 @@
+"""This file keeps the price history of the hourly rates. Each hourly rate has
+a list of prices, each one in force over a range of dates, and a course is
+billed at the price in force on its date (see queries.course_price_condition),
+so that a new price does not change the amount of the courses given before.
+
+A new hourly rate receives its first price, in force since always. When the
+price of a hourly rate is changed, the flush records it in the history from the
+date given by HourlyRate.price_valid_from (today if None) : the price in force
+on this date ends there, and the prices which started later are replaced. Only
+the courses given from this date on are then billed differently, so that the
+ledger and the rollup only recompute them.
+
+HourlyRate.price holds the price in force today, shown in the menus and by the
+API : a price starting later is only recorded in the history, and is copied to
+the hourly rate by the first transaction of the day it comes into force (see
+apply_current_prices)."""
+
+import datetime
+import weakref
+from decimal import Decimal
+from itertools import chain
+from typing import Iterable
+
+from sqlalchemy import Connection, event, inspect, or_, select, update
+from sqlalchemy.orm import Session, SessionTransaction, sessionmaker
+
+from models import HourlyRate, HourlyRatePrice
+
+# Start of the first price of every hourly rate
+HISTORY_START = datetime.date.min
+
+# Key of the session info holding the engine and the day whose prices the
+# transaction applied
+_APPLIED_KEY = "rates_applied_on"
+
+# Day whose prices were last applied, per engine
+_applied_on: weakref.WeakKeyDictionary = weakref.WeakKeyDictionary()
+
+
+def initial_price_rows(rate_rows: Iterable[dict]) -> list[dict]:
+    """Returns the rows of the first prices of the hourly rates inserted
+    in bulk with the given rows (which bypass the flush)."""
+
+    return [
+        {
+            "hourly_rate_id": row["id"],
+            "valid_from": HISTORY_START,
+            "valid_to": None,
+            "price": row["price"],
+        }
+        for row in rate_rows
+    ]
+
+
+def record_price(
+    hourly_rate: HourlyRate, price, valid_from: datetime.date
+) -> HourlyRatePrice:
+    """Records in the history of a persistent hourly rate that the price
+    applies from valid_from on, and returns the new price."""
+
+    for previous in list(hourly_rate.prices):
+        if previous.valid_from >= valid_from:
+            hourly_rate.prices.remove(previous)
+
+        elif previous.valid_to is None or previous.valid_to > valid_from:
+            previous.valid_to = valid_from
+
+    new_price = HourlyRatePrice(valid_from=valid_from, valid_to=None, price=price)
+    hourly_rate.prices.append(new_price)
+
+    return new_price
+
+
+def repriced_since(session: Session) -> dict:
+    """Returns, for every persistent hourly rate whose prices are about to be
+    changed by the flush, the first date from which its courses are billed
+    differently."""
+
+    starts = {}
+
+    for entity in chain(session.new, session.dirty, session.deleted):
+        if not isinstance(entity, HourlyRatePrice):
+            continue
+
+        # The end of a price only moves when a new price starts there
+        if (
+            entity in session.dirty
+            and not inspect(entity).attrs.price.history.has_changes()
+        ):
+            continue
+
+        rate_id = entity.hourly_rate_id
+
+        # The identifier is only copied to the price by the flush ; the
+        # prices of a new hourly rate do not concern any existing course
+        if rate_id is None and entity.hourly_rate is not None:
+            rate_id = entity.hourly_rate.id
+
+        if rate_id is not None:
+            starts[rate_id] = min(
+                starts.get(rate_id, entity.valid_from), entity.valid_from
+            )
+
+    return starts
+
+
+def price_in_force(hourly_rate: HourlyRate, day: datetime.date):
+    """Returns the price of the history of the hourly rate in force on day."""
+
+    return next(
+        price.price
+        for price in hourly_rate.prices
+        if price.valid_from <= day and (price.valid_to is None or price.valid_to > day)
+    )
+
+
+def apply_current_prices(connection: Connection, today: datetime.date) -> int:
+    """Copies to the hourly rates whose price differs from the one in force
+    today the price of their history, and returns their number."""
+
+    in_force = (
+        select(HourlyRatePrice.price)
+        .where(
+            HourlyRatePrice.hourly_rate_id == HourlyRate.id,
+            HourlyRatePrice.valid_from <= today,
+            or_(HourlyRatePrice.valid_to.is_(None), HourlyRatePrice.valid_to > today),
+        )
+        .scalar_subquery()
+    )
+
+    # The rates are read first, so that nothing is written on most days
+    outdated = connection.scalars(
+        select(HourlyRate.id).where(HourlyRate.price != in_force)
+    ).all()
+
+    if outdated:
+        connection.execute(
+            update(HourlyRate).where(HourlyRate.id.in_(outdated)).values(price=in_force)
+        )
+
+    return len(outdated)
+
+
+def _before_flush(session: Session, _flush_context, _instances) -> None:
+    """Records the prices of the new hourly rates, and the new prices of the
+    changed ones, in the price history."""
+
+    for entity in session.new:
+        if isinstance(entity, HourlyRate) and not entity.prices:
+            entity.prices.append(
+                HourlyRatePrice(
+                    valid_from=HISTORY_START, valid_to=None, price=entity.price
+                )
+            )
+
+    for entity in session.dirty:
+        if not isinstance(entity, HourlyRate):
+            continue
+
+        history = inspect(entity).attrs.price.history
+
+        # The prompts give the price as a string, which may be the same
+        # number as the former price
+        if history.has_changes() and not (
+            history.deleted
+            and Decimal(str(history.deleted[0])) == Decimal(str(entity.price))
+        ):
+            valid_from = entity.price_valid_from or datetime.date.today()
+            record_price(entity, entity.price, valid_from)
+
+            # The hourly rate keeps the price in force today until then
+            if valid_from > datetime.date.today():
+                entity.price = price_in_force(entity, datetime.date.today())
+
+        entity.price_valid_from = None
+
+
+def _after_begin(
+    session: Session, _transaction: SessionTransaction, connection: Connection
+) -> None:
+    """Applies the prices coming into force today, once a day per database."""
+
+    today = datetime.date.today()
+
+    if _applied_on.get(connection.engine) != today:
+        apply_current_prices(connection, today)
+        session.info[_APPLIED_KEY] = (connection.engine, today)
+
+
+def _after_commit(session: Session) -> None:
+    """Remembers that the prices of the day are applied once committed."""
+
+    applied = session.info.pop(_APPLIED_KEY, None)
+
+    if applied is not None:
+        engine, today = applied
+        _applied_on[engine] = today
+
+
+def _after_rollback(session: Session) -> None:
+    """Lets the next transaction apply the prices of the day again."""
+
+    session.info.pop(_APPLIED_KEY, None)
+
+
+def register(session_factory: sessionmaker | type[Session]) -> None:
+    """Keeps the price history and the prices in force up to date for every
+    session created by the factory (or of the given Session subclass). The
+    flush listener runs before the other ones, which see the prices it
+    records."""
+
+    if not event.contains(session_factory, "before_flush", _before_flush):
+        event.listen(session_factory, "before_flush", _before_flush, insert=True)
+
+    for name, listener in (
+        ("after_begin", _after_begin),
+        ("after_commit", _after_commit),
+        ("after_rollback", _after_rollback),
+    ):
+        if not event.contains(session_factory, name, listener):
+            event.listen(session_factory, name, listener)
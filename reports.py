@@ -0,0 +1,280 @@
+"""This file implements the revenue reports : for each day, week, month or year,
+the amount received (paid courses and parts of the payments allocated to the
+others), the hours taught and the amount still due, optionally broken down
+by student or by hourly rate. Each report is computed by a single grouped
+query, the courses being put in their period by the database itself (date
+functions of SQLite, date_trunc on PostgreSQL), so that no course is loaded in
+Python. The monthly and yearly reports read the months frozen by the rollup
+from their summaries, and only scan the courses of the other months."""
+
+import datetime
+from decimal import Decimal
+from typing import Iterable, NamedTuple
+
+from sqlalchemy import Select, func, null, or_, select, union_all
+from sqlalchemy.orm import Session
+
+import rollup
+from models import (
+    Course,
+    CourseMonthlySummary,
+    HourlyRate,
+    HourlyRatePrice,
+    Student,
+)
+from queries import (
+    course_due_amount,
+    course_price_condition,
+    course_settled_amount,
+    next_month,
+    period_start,
+)
+from validators import DATE_FORMAT
+
+PERIODS = ("day", "week", "month", "year")
+
+BREAKDOWNS = ("student", "rate")
+
+# Precision of the amounts and of the hours in the reports
+CENTS = Decimal("0.01")
+
+COLUMNS = ["period", "group", "courses", "hours", "revenue", "unpaid"]
+
+# Periods made of whole months, which can be computed from the frozen summaries
+MONTHLY_PERIODS = ("month", "year")
+
+
+class ReportRow(NamedTuple):
+    """Figures of a period, for a student or an hourly rate if broken down."""
+
+    period: datetime.date
+    group: str | None
+    courses: int
+    hours: Decimal
+    revenue: Decimal
+    unpaid: Decimal
+
+
+def _live_figures(period: str, group_column, criterion) -> Select:
+    """Builds the query of the figures of the courses matching the criterion,
+    per period and group."""
+
+    bucket = period_start(period, Course.date)
+
+    return (
+        select(
+            bucket.label("period"),
+            (null() if group_column is None else group_column).label("group_id"),
+            func.count(Course.id).label("courses"),
+            func.sum(Course.duration).label("hours"),
+            func.sum(course_settled_amount()).label("revenue"),
+            func.sum(course_due_amount()).label("unpaid"),
+        )
+        .join(HourlyRatePrice, course_price_condition())
+        .where(*criterion)
+        .group_by(bucket, *([group_column] if group_column is not None else []))
+    )
+
+
+def _frozen_figures(period: str, group_column, criterion) -> Select:
+    """Builds the query of the figures of the frozen months matching the
+    criterion, per period and group."""
+
+    summary = CourseMonthlySummary
+    bucket = period_start(period, summary.month)
+
+    return (
+        select(
+            bucket.label("period"),
+            (null() if group_column is None else group_column).label("group_id"),
+            func.sum(summary.courses).label("courses"),
+            func.sum(summary.hours).label("hours"),
+            func.sum(summary.paid).label("revenue"),
+            func.sum(summary.billed - summary.paid).label("unpaid"),
+        )
+        .where(*criterion)
+        .group_by(bucket, *([group_column] if group_column is not None else []))
+    )
+
+
+def revenue_report_query(
+    period: str = "month",
+    breakdown: str | None = None,
+    start_date: datetime.date | None = None,
+    end_date: datetime.date | None = None,
+    frozen_until: datetime.date | None = None,
+) -> Select:
+    """Builds the query computing the figures of every period between the two
+    dates (both included, no bound if None), per student or per hourly rate
+    if breakdown is "student" or "rate". The months before frozen_until which
+    are entirely in the range are read from their summaries (see rollup.py)
+    when the periods are made of whole months, the other courses are scanned."""
+
+    if period not in PERIODS:
+        raise ValueError(f"Unknown period: {period}")
+
+    if breakdown not in (None, *BREAKDOWNS):
+        raise ValueError(f"Unknown breakdown: {breakdown}")
+
+    live_group, frozen_group = {
+        "student": (Course.student_id, CourseMonthlySummary.student_id),
+        "rate": (Course.hourly_rate_id, CourseMonthlySummary.hourly_rate_id),
+        None: (None, None),
+    }[breakdown]
+
+    live_criterion = []
+
+    if start_date is not None:
+        live_criterion.append(Course.date >= start_date)
+
+    if end_date is not None:
+        live_criterion.append(Course.date <= end_date)
+
+    parts = []
+
+    if frozen_until is not None and period in MONTHLY_PERIODS:
+        # Months entirely in the range, from first_month (included)
+        # to last_month (excluded)
+        first_month = start_date and (
+            start_date if start_date.day == 1 else next_month(start_date)
+        )
+        last_month = frozen_until
+
+        if end_date is not None:
+            last_month = min(
+                last_month, (end_date + datetime.timedelta(days=1)).replace(day=1)
+            )
+
+        if first_month is None or first_month < last_month:
+            frozen_criterion = [CourseMonthlySummary.month < last_month]
+            outside_months = Course.date >= last_month
+
+            if first_month is not None:
+                frozen_criterion.append(CourseMonthlySummary.month >= first_month)
+                outside_months = or_(Course.date < first_month, outside_months)
+
+            parts.append(_frozen_figures(period, frozen_group, frozen_criterion))
+            live_criterion.append(outside_months)
+
+    parts.append(_live_figures(period, live_group, live_criterion))
+
+    figures = (parts[0] if len(parts) == 1 else union_all(*parts)).subquery()
+
+    if breakdown == "student":
+        group_columns = (Student.last_name, Student.first_name, Student.id)
+        group_label = Student.first_name + " " + Student.last_name
+
+    elif breakdown == "rate":
+        group_columns = (HourlyRate.name, HourlyRate.id)
+        group_label = HourlyRate.name
+
+    else:
+        group_columns = ()
+        group_label = null()
+
+    stmt = (
+        select(
+            figures.c.period,
+            group_label.label("group"),
+            func.sum(figures.c.courses).label("courses"),
+            func.sum(figures.c.hours).label("hours"),
+            func.sum(figures.c.revenue).label("revenue"),
+            func.sum(figures.c.unpaid).label("unpaid"),
+        )
+        .group_by(figures.c.period, *group_columns)
+        .order_by(figures.c.period, *group_columns)
+    )
+
+    if breakdown == "student":
+        stmt = stmt.join(Student, Student.id == figures.c.group_id)
+
+    elif breakdown == "rate":
+        stmt = stmt.join(HourlyRate, HourlyRate.id == figures.c.group_id)
+
+    return stmt
+
+
+def revenue_report(
+    current_session: Session,
+    period: str = "month",
+    breakdown: str | None = None,
+    start_date: datetime.date | None = None,
+    end_date: datetime.date | None = None,
+) -> list[ReportRow]:
+    """Returns the figures of every period (see revenue_report_query),
+    reading the frozen months from their summaries."""
+
+    return [
+        ReportRow(
+            row.period,
+            row.group,
+            row.courses,
+            Decimal(row.hours).quantize(CENTS),
+            Decimal(row.revenue).quantize(CENTS),
+            Decimal(row.unpaid).quantize(CENTS),
+        )
+        for row in current_session.execute(
+            revenue_report_query(
+                period,
+                breakdown,
+                start_date,
+                end_date,
+                rollup.frozen_until(current_session),
+            )
+        )
+    ]
+
+
+def format_report(rows: Iterable[ReportRow], breakdown: str | None = None) -> str:
+    """Returns the report as a table, with a line of totals."""
+
+    header = ["Période", "Élève" if breakdown == "student" else "Taux horaire"]
+    header = header if breakdown is not None else header[:1]
+    header += ["Cours", "Heures", "Encaissé", "Dû"]
+
+    lines = []
+    totals = [0, Decimal(0), Decimal(0), Decimal(0)]
+
+    for row in rows:
+        cells = [row.period.strftime(DATE_FORMAT)]
+        cells += [row.group or ""] if breakdown is not None else []
+        cells += [
+            str(row.courses),
+            f"{row.hours:.2f}",
+            f"{row.revenue:.2f}€",
+            f"{row.unpaid:.2f}€",
+        ]
+        lines.append(cells)
+
+        for i, value in enumerate((row.courses, row.hours, row.revenue, row.unpaid)):
+            totals[i] += value
+
+    total_cells = ["Total"] + ([""] if breakdown is not None else [])
+    total_cells += [
+        str(totals[0]),
+        f"{totals[1]:.2f}",
+        f"{totals[2]:.2f}€",
+        f"{totals[3]:.2f}€",
+    ]
+
+    widths = [
+        max(len(cells[i]) for cells in [header, total_cells, *lines])
+        for i in range(len(header))
+    ]
+
+    # The text columns are aligned on the left, the figures on the right
+    texts = len(header) - 4
+
+    def format_line(cells: list[str]) -> str:
+        return "  ".join(
+            cell.ljust(width) if i < texts else cell.rjust(width)
+            for i, (cell, width) in enumerate(zip(cells, widths))
+        )
+
+    separator = "  ".join("-" * width for width in widths)
+
+    return "\n".join(
+        [format_line(header), separator]
+        + [format_line(cells) for cells in lines]
+        + [separator, format_line(total_cells)]
+    )
@@ -0,0 +1,249 @@
+"""This file implements the rollup of the courses : the completed months are
+frozen in the course_monthly_summary table (number of courses, hours, amount
+billed and amount paid per student and hourly rate), so that the reports only
+scan the courses of the months which are not frozen yet.
+
+The frozen months always form a prefix of the history, recorded in the
+rollup_period table. A refresh appends the months completed since the last
+one ; when a course of a frozen month is created, changed, deleted or paid
+in part (or billed at a new price of its hourly rate), the summaries are
+removed from this month on, in the same transaction, and the next refresh freezes
+them again."""
+
+import datetime
+from itertools import chain
+from typing import Iterable
+
+from sqlalchemy import Connection, delete, event, func, insert, select
+from sqlalchemy.orm import Session, attributes, sessionmaker
+
+from models import (
+    Course,
+    CourseMonthlySummary,
+    HourlyRatePrice,
+    PaymentAllocation,
+    RollupPeriod,
+)
+import rates
+from queries import (
+    course_amount,
+    course_price_condition,
+    course_settled_amount,
+    next_month,
+    period_start,
+)
+
+
+def frozen_until(connection: Connection | Session) -> datetime.date | None:
+    """Returns the first day of the first month which is not frozen,
+    or None if no month is frozen."""
+
+    last_month = connection.scalar(select(func.max(RollupPeriod.month)))
+
+    return next_month(last_month) if last_month is not None else None
+
+
+def refresh(current_session: Session, today: datetime.date | None = None) -> int:
+    """Freezes the months completed before the month of today which are not
+    frozen yet, and returns their number."""
+
+    connection = current_session.connection()
+    until = (today or datetime.date.today()).replace(day=1)
+
+    start = frozen_until(connection)
+
+    if start is None:
+        first_date = connection.scalar(select(func.min(Course.date)))
+
+        if first_date is None:
+            return 0
+
+        start = first_date.replace(day=1)
+
+    if start >= until:
+        return 0
+
+    month = period_start("month", Course.date)
+
+    connection.execute(
+        insert(CourseMonthlySummary).from_select(
+            ["month", "student_id", "hourly_rate_id", "courses", "hours"]
+            + ["billed", "paid"],
+            select(
+                month,
+                Course.student_id,
+                Course.hourly_rate_id,
+                func.count(Course.id),
+                func.sum(Course.duration),
+                func.sum(course_amount()),
+                func.sum(course_settled_amount()),
+            )
+            .join(HourlyRatePrice, course_price_condition())
+            .where(Course.date >= start, Course.date < until)
+            .group_by(month, Course.student_id, Course.hourly_rate_id),
+        )
+    )
+
+    # Every month is recorded, even without courses, so that the prefix
+    # of frozen months has no gap
+    months = []
+
+    while start < until:
+        months.append(start)
+        start = next_month(start)
+
+    frozen_at = datetime.datetime.now()
+    connection.execute(
+        insert(RollupPeriod),
+        [{"month": month, "frozen_at": frozen_at} for month in months],
+    )
+
+    return len(months)
+
+
+def thaw(connection: Connection, date: datetime.date | None = None) -> None:
+    """Removes the summaries of the month of the given date and of the following
+    ones (of every month if None), which are then scanned until the next refresh."""
+
+    summaries = delete(CourseMonthlySummary)
+    periods = delete(RollupPeriod)
+
+    if date is not None:
+        summaries = summaries.where(CourseMonthlySummary.month >= date.replace(day=1))
+        periods = periods.where(RollupPeriod.month >= date.replace(day=1))
+
+    connection.execute(summaries)
+    connection.execute(periods)
+
+
+def _thaw_from(connection: Connection, dates: Iterable[datetime.date | None]) -> None:
+    """Thaws the frozen months from the earliest of the given dates on."""
+
+    dates = [date for date in dates if date is not None]
+
+    if not dates:
+        return
+
+    boundary = frozen_until(connection)
+
+    if boundary is not None and min(dates) < boundary:
+        thaw(connection, min(dates))
+
+
+def _rate_courses_start(rate_ids, start: datetime.date):
+    """Returns the query of the date of the first course of the given rates
+    given from start on."""
+
+    return select(func.min(Course.date)).where(
+        Course.hourly_rate_id.in_(rate_ids), Course.date >= start
+    )
+
+
+def _before_flush(session: Session, _flush_context, _instances) -> None:
+    """Thaws the frozen months whose courses are about to be changed."""
+
+    dates = [entity.date for entity in session.new if isinstance(entity, Course)]
+
+    for entity in session.dirty | session.deleted:
+        if isinstance(entity, Course) and (
+            entity in session.deleted or session.is_modified(entity)
+        ):
+            # The course may be moved from a frozen month to another one
+            history = attributes.get_history(entity, "date")
+            dates += [*history.deleted, *history.unchanged, *history.added]
+
+    # A new or removed allocation changes the amount paid for its course
+    dates += [
+        entity.course.date
+        for entity in chain(session.new, session.deleted)
+        if isinstance(entity, PaymentAllocation) and entity.course is not None
+    ]
+
+    # A new price only changes the amount of the courses given since it applies
+    repriced = rates.repriced_since(session)
+
+    if not dates and not repriced:
+        return
+
+    connection = session.connection()
+
+    for rate_id, start in repriced.items():
+        dates.append(connection.scalar(_rate_courses_start([rate_id], start)))
+
+    _thaw_from(connection, dates)
+
+
+def _do_orm_execute(orm_execute_state) -> None:
+    """Thaws the frozen months touched by bulk statements on the courses
+    or the prices of the hourly rates, which bypass the flush."""
+
+    if not (
+        orm_execute_state.is_insert
+        or orm_execute_state.is_update
+        or orm_execute_state.is_delete
+    ):
+        return
+
+    mapper = orm_execute_state.bind_mapper
+
+    # The bulk statements on the allocations are not watched : payments.py
+    # always updates their courses in the same transaction
+    if mapper is None or not issubclass(mapper.class_, (Course, HourlyRatePrice)):
+        return
+
+    statement = orm_execute_state.statement
+    connection = orm_execute_state.session.connection()
+
+    if orm_execute_state.is_insert:
+        parameters = orm_execute_state.parameters
+        rows = parameters if isinstance(parameters, list) else [parameters or {}]
+
+    if mapper.class_ is Course and orm_execute_state.is_insert:
+        # Without the dates of the new courses, every month is thawed
+        if all("date" in row for row in rows):
+            _thaw_from(connection, [row["date"] for row in rows])
+        else:
+            thaw(connection)
+
+    # As with ledger.tracking, the criterion of a bulk UPDATE must select the
+    # courses it changes, and their dates are assumed to stay in the same month
+    elif mapper.class_ is Course:
+        dates = select(func.min(Course.date))
+
+        if statement.whereclause is not None:
+            dates = dates.where(statement.whereclause)
+
+        _thaw_from(connection, [connection.scalar(dates)])
+
+    # The new prices only change the courses of their rates from their start on
+    elif orm_execute_state.is_insert:
+        if all("hourly_rate_id" in row and "valid_from" in row for row in rows):
+            start = _rate_courses_start(
+                {row["hourly_rate_id"] for row in rows},
+                min(row["valid_from"] for row in rows),
+            )
+            _thaw_from(connection, [connection.scalar(start)])
+        else:
+            thaw(connection)
+
+    else:
+        dates = select(func.min(Course.date)).join(
+            HourlyRatePrice, course_price_condition()
+        )
+
+        if statement.whereclause is not None:
+            dates = dates.where(statement.whereclause)
+
+        _thaw_from(connection, [connection.scalar(dates)])
+
+
+def register(session_factory: sessionmaker | type[Session]) -> None:
+    """Keeps the frozen months consistent with the changes made by every
+    session created by the factory (or of the given Session subclass)."""
+
+    for name, listener in (
+        ("before_flush", _before_flush),
+        ("do_orm_execute", _do_orm_execute),
+    ):
+        if not event.contains(session_factory, name, listener):
+            event.listen(session_factory, name, listener)
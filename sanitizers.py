@@ -5,29 +5,37 @@ used to have consistent data formatting inside the database."""
 import datetime
 from decimal import Decimal, ROUND_HALF_UP
 
-import phonenumbers
-from email_validator import validate_email
-
-from validators import DATE_FORMAT
+from validators import DATE_FORMAT, check_phone_number, parse_email_address
 
 
 def sanitize_phone_number(raw_phone_number: str, region: str = "FR") -> str:
     """Puts a raw phone number into E.164 standard format."""
 
-    # We strip the number from non-digit characters
-    # Then we instanciate a phonenumbers object
-    phone_number = phonenumbers.parse(
-        "".join(filter(str.isdigit, raw_phone_number)), region
-    )
+    # The number is parsed once, then the result is shared with the validator
+    normalized = check_phone_number(raw_phone_number, region).normalized
 
-    return phonenumbers.format_number(phone_number, phonenumbers.PhoneNumberFormat.E164)
+    if normalized is None:
+        # Imported here only, as phonenumbers is slow to import (see validators.py)
+        import phonenumbers
+
+        raise phonenumbers.NumberParseException(
+            phonenumbers.NumberParseException.NOT_A_NUMBER,
+            f"Invalid phone number: {raw_phone_number}",
+        )
+
+    return normalized
 
 
 def sanitize_email_address(raw_email_address: str) -> str:
     """Transforms a raw email address into a standard format."""
 
-    # We do not check deliverability as it has been done before at this stage
-    email_info = validate_email(raw_email_address, check_deliverability=False)
+    # The address has already been parsed by the validator at this stage
+    email_info = parse_email_address(raw_email_address)
+
+    if email_info is None:
+        from email_validator import EmailNotValidError
+
+        raise EmailNotValidError(f"Invalid email address: {raw_email_address}")
 
     return email_info.normalized
 
@@ -0,0 +1,83 @@
+"""This file implements the full-text search of students and courses, backed
+by the SQLite FTS5 virtual tables search_student and search_course. These tables
+are kept in sync with the student and course tables by triggers (see the
+corresponding Alembic migrations). The rows of the search tables are looked up
+by rowid, which the search_student_row and search_course_row tables map to the
+identifiers of the students and courses (the rowids of the student and course
+tables, whose primary keys are UUIDs, may be changed by VACUUM)."""
+
+import re
+import uuid
+from typing import Type
+
+from sqlalchemy import inspect, select, text
+from sqlalchemy.orm import Session, joinedload
+
+from models import Base, Course, Student
+
+# Full-text tables associated with the searchable models
+SEARCH_TABLES = {Student: "search_student", Course: "search_course"}
+
+
+def search_available(current_session: Session, model: Type[Base]) -> bool:
+    """Tells whether the given model can be searched in the current database
+    (FTS5 is specific to SQLite, other databases only browse the entities)."""
+
+    connection = current_session.connection()
+
+    return (
+        model in SEARCH_TABLES
+        and connection.dialect.name == "sqlite"
+        and inspect(connection).has_table(SEARCH_TABLES[model])
+    )
+
+
+def match_expression(user_input: str) -> str | None:
+    """Turns the text typed by the user into an FTS5 query, where every word
+    is looked up as a prefix. Returns None if there is nothing to look for."""
+
+    words = re.findall(r"\w+", user_input)
+
+    return " ".join(f'"{word}"*' for word in words) if words else None
+
+
+def search(
+    current_session: Session, model: Type[Base], user_input: str, limit: int = 10
+) -> list[Base]:
+    """Returns the entities best matching the text typed by the user,
+    ranked by relevance and limited to the given number."""
+
+    expression = match_expression(user_input)
+
+    if expression is None:
+        return []
+
+    table = SEARCH_TABLES[model]
+
+    # The index is queried first, so that only the matching rows are loaded
+    identifiers = [
+        uuid.UUID(identifier)
+        for identifier in current_session.scalars(
+            text(
+                f"SELECT entity_id FROM {table} "
+                f"JOIN {table}_row ON search_id = {table}.rowid "
+                f"WHERE {table} MATCH :expression ORDER BY rank LIMIT :limit"
+            ),
+            {"expression": expression, "limit": limit},
+        )
+    ]
+
+    if not identifiers:
+        return []
+
+    stmt = select(model).where(model.id.in_(identifiers))
+
+    # The description of a course contains the name of the student
+    if model is Course:
+        stmt = stmt.options(joinedload(Course.student))
+
+    entities = {entity.id: entity for entity in current_session.scalars(stmt)}
+
+    return [
+        entities[identifier] for identifier in identifiers if identifier in entities
+    ]
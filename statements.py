@@ -0,0 +1,300 @@
+"""This file implements the statements of the unpaid courses sent to the students.
+The unpaid courses of every student are read by a single streamed query, with
+their hourly rate, and grouped by student as they arrive. The statements are
+then rendered and written by a pool of processes, a batch of students at a time,
+so that the statements of hundreds of students are generated in a few seconds.
+
+Each statement is a text or HTML file in the given directory, named after the
+student (with the beginning of its identifier, so that homonyms do not clash)."""
+
+import datetime
+import html
+import os
+import unicodedata
+from decimal import Decimal
+from itertools import groupby, islice
+from typing import Iterable, Iterator, NamedTuple
+
+from sqlalchemy.orm import Session
+
+from queries import unpaid_courses_query
+from validators import DATE_FORMAT
+
+FORMATS = ("txt", "html")
+
+# Number of rows fetched from the database at a time
+FETCH_SIZE = 1000
+
+# Number of statements rendered by a process at a time
+DEFAULT_BATCH_SIZE = 50
+
+# Precision of the amounts printed on the statements
+CENTS = Decimal("0.01")
+
+# Columns of the table of the courses
+HEADER = ["Date", "Taux horaire", "Durée (h)", "Prix horaire", "Montant", "Déjà réglé"]
+
+
+class StatementLine(NamedTuple):
+    """Unpaid course printed on a statement."""
+
+    date: datetime.date
+    duration: Decimal
+    hourly_rate: str
+    price: Decimal
+    amount: Decimal
+
+    # Part of the amount paid by the payments allocated to the course
+    settled: Decimal
+
+    @property
+    def due(self) -> Decimal:
+        """Part of the amount of the course still due."""
+
+        return self.amount - self.settled
+
+
+class Statement(NamedTuple):
+    """Unpaid courses of a student, sorted by date."""
+
+    student_id: object
+    first_name: str
+    last_name: str
+    email_address: str
+    address: str
+    lines: tuple[StatementLine, ...]
+
+    @property
+    def full_name(self) -> str:
+        """Concatenation of the first name and last name of the student."""
+
+        return f"{self.first_name} {self.last_name}"
+
+    @property
+    def total(self) -> Decimal:
+        """Amount due by the student."""
+
+        return sum((line.due for line in self.lines), Decimal(0))
+
+
+class GenerationSummary(NamedTuple):
+    """Number of statements written, of courses and amount due on them."""
+
+    statements: int
+    courses: int
+    total: Decimal
+
+
+def _grouped_statements(rows: Iterable) -> Iterator[Statement]:
+    """Groups the rows of the unpaid courses query by student."""
+
+    for _, student_rows in groupby(rows, key=lambda row: row.student_id):
+        student_rows = list(student_rows)
+        first = student_rows[0]
+
+        yield Statement(
+            first.student_id,
+            first.first_name,
+            first.last_name,
+            first.email_address,
+            first.address,
+            tuple(
+                StatementLine(
+                    row.date,
+                    Decimal(row.duration).quantize(CENTS),
+                    row.hourly_rate,
+                    Decimal(row.price).quantize(CENTS),
+                    Decimal(row.amount).quantize(CENTS),
+                    Decimal(row.settled).quantize(CENTS),
+                )
+                for row in student_rows
+            ),
+        )
+
+
+def file_name(statement: Statement, file_format: str) -> str:
+    """Returns the name of the file of the statement, made of ASCII characters."""
+
+    name = unicodedata.normalize(
+        "NFKD", f"{statement.last_name}_{statement.first_name}"
+    )
+    name = "".join(
+        character if character.isalnum() else "_"
+        for character in name.encode("ascii", "ignore").decode().lower()
+    )
+
+    return f"releve_{name}_{str(statement.student_id)[:8]}.{file_format}"
+
+
+def _cells(line: StatementLine) -> list[str]:
+    """Returns the cells of the table of a statement for a course."""
+
+    return [
+        line.date.strftime(DATE_FORMAT),
+        line.hourly_rate,
+        f"{line.duration}",
+        f"{line.price}€",
+        f"{line.amount}€",
+        f"{line.settled}€",
+    ]
+
+
+def render_text(statement: Statement, issue_date: datetime.date) -> str:
+    """Returns the statement as plain text."""
+
+    rows = [_cells(line) for line in statement.lines]
+    widths = [
+        max(len(cells[i]) for cells in [HEADER, *rows]) for i in range(len(HEADER))
+    ]
+
+    def format_line(cells: list[str]) -> str:
+        # The text columns are aligned on the left, the figures on the right
+        return "  ".join(
+            cell.ljust(width) if i < 2 else cell.rjust(width)
+            for i, (cell, width) in enumerate(zip(cells, widths))
+        )
+
+    return "\n".join(
+        [
+            f"Relevé des cours impayés au {issue_date.strftime(DATE_FORMAT)}",
+            "",
+            statement.full_name,
+            statement.address,
+            statement.email_address,
+            "",
+            format_line(HEADER),
+            "  ".join("-" * width for width in widths),
+            *(format_line(cells) for cells in rows),
+            "",
+            f"Total dû : {statement.total}€ ({len(statement.lines)} cours)",
+            "",
+        ]
+    )
+
+
+def render_html(statement: Statement, issue_date: datetime.date) -> str:
+    """Returns the statement as an HTML page."""
+
+    def table_row(cells: list[str], tag: str) -> str:
+        return (
+            "<tr>"
+            + "".join(f"<{tag}>{html.escape(cell)}</{tag}>" for cell in cells)
+            + "</tr>"
+        )
+
+    title = f"Relevé des cours impayés au {issue_date.strftime(DATE_FORMAT)}"
+
+    return "\n".join(
+        [
+            "<!DOCTYPE html>",
+            '<html lang="fr">',
+            '<head><meta charset="utf-8">',
+            f"<title>{html.escape(title)} - {html.escape(statement.full_name)}</title>",
+            "<style>td, th { padding: 0.2em 0.8em; }"
+            " td:nth-child(n+3) { text-align: right; }</style>",
+            "</head>",
+            "<body>",
+            f"<h1>{html.escape(title)}</h1>",
+            f"<p>{html.escape(statement.full_name)}<br>"
+            f"{html.escape(statement.address)}<br>"
+            f"{html.escape(statement.email_address)}</p>",
+            "<table>",
+            table_row(HEADER, "th"),
+            *(table_row(_cells(line), "td") for line in statement.lines),
+            "</table>",
+            f"<p><strong>Total dû : {statement.total}€</strong>"
+            f" ({len(statement.lines)} cours)</p>",
+            "</body>",
+            "</html>",
+            "",
+        ]
+    )
+
+
+RENDERERS = {"txt": render_text, "html": render_html}
+
+
+def write_statements(
+    directory: str,
+    file_format: str,
+    issue_date: datetime.date,
+    statements: list[Statement],
+) -> int:
+    """Renders the statements and writes them in the directory, and returns
+    their number. Run by the processes of the pool."""
+
+    render = RENDERERS[file_format]
+
+    for statement in statements:
+        path = os.path.join(directory, file_name(statement, file_format))
+
+        with open(path, "w", encoding="utf-8") as file:
+            file.write(render(statement, issue_date))
+
+    return len(statements)
+
+
+def generate_statements(
+    current_session: Session,
+    directory: str,
+    file_format: str = "txt",
+    end_date: datetime.date | None = None,
+    student_ids: list | None = None,
+    workers: int | None = None,
+    batch_size: int = DEFAULT_BATCH_SIZE,
+) -> GenerationSummary:
+    """Writes in the directory the statement of every student (or of the given
+    students) owing courses given until end_date (no bound if None), using
+    the given number of processes (one per CPU if None, none if 1)."""
+
+    if file_format not in RENDERERS:
+        raise ValueError(f"Unknown format: {file_format}")
+
+    os.makedirs(directory, exist_ok=True)
+    workers = workers or os.cpu_count() or 1
+    issue_date = datetime.date.today()
+
+    result = current_session.execute(
+        unpaid_courses_query(end_date, student_ids).execution_options(
+            yield_per=FETCH_SIZE
+        )
+    )
+    statements = _grouped_statements(result)
+
+    count = courses = 0
+    total = Decimal(0)
+
+    def batches() -> Iterator[list[Statement]]:
+        nonlocal courses, total
+
+        while batch := list(islice(statements, batch_size)):
+            courses += sum(len(statement.lines) for statement in batch)
+            total += sum((statement.total for statement in batch), Decimal(0))
+            yield batch
+
+    if workers == 1:
+        for batch in batches():
+            count += write_statements(directory, file_format, issue_date, batch)
+
+        return GenerationSummary(count, courses, total)
+
+    # Imported here, as multiprocessing is only needed by this function
+    from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+    with ProcessPoolExecutor(workers) as pool:
+        pending = set()
+
+        # The number of batches waiting for a process is bounded, so that
+        # the statements are not all held in memory at once
+        for batch in batches():
+            if len(pending) >= 2 * workers:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                count += sum(future.result() for future in done)
+
+            pending.add(
+                pool.submit(write_statements, directory, file_format, issue_date, batch)
+            )
+
+        count += sum(future.result() for future in pending)
+
+    return GenerationSummary(count, courses, total)
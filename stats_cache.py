@@ -0,0 +1,383 @@
+"""This file implements the cache of the statistics (debt per student, gains over
+a period), so that they are only recomputed when the data they depend on has
+changed. The results are kept by (statistic, parameters), in memory with a LRU
+eviction, and optionally in a SQLite file shared by the processes of the app
+(setting stats_cache of the [database] section, see database.py).
+
+The validity of the results is checked against the generation of the data, a
+single row of the database increased by every transaction changing the courses,
+students, hourly rates or balances : at each flush touching them and before each
+bulk statement on them. As the row is written in the same transaction as the
+changes, the processes sharing the database see the new generation when they
+see the changes, and no longer serve the results computed before them. A
+session whose transaction changed the data computes the statistics without the
+cache, as they are based on uncommitted data."""
+
+import datetime
+import pickle
+import threading
+from collections import OrderedDict
+from decimal import Decimal
+from itertools import chain
+from typing import Callable, TypeVar
+
+from sqlalchemy import (
+    Column,
+    Integer,
+    LargeBinary,
+    MetaData,
+    String,
+    Table,
+    create_engine,
+    delete,
+    event,
+    insert,
+    select,
+    update,
+)
+from sqlalchemy.orm import Session, sessionmaker
+
+from models import (
+    Course,
+    DataGeneration,
+    Student,
+    HourlyRate,
+    HourlyRatePrice,
+    PaymentAllocation,
+    StudentBalance,
+    MonthlyBalance,
+)
+from queries import StudentDebt, balance_debt_per_student, balance_gains
+
+# Maximum number of results kept in memory
+DEFAULT_MAX_SIZE = 128
+
+# Models on which the statistics depend
+WATCHED_MODELS = (
+    Course,
+    Student,
+    HourlyRate,
+    HourlyRatePrice,
+    PaymentAllocation,
+    StudentBalance,
+    MonthlyBalance,
+)
+
+# Key of Session.info noting that the transaction changed the watched models,
+# and increased the generation of the data
+_CHANGED_KEY = "stats_cache_changed"
+
+# Columns of a student kept in the cached debts
+_STUDENT_FIELDS = (
+    "first_name",
+    "last_name",
+    "phone_number",
+    "email_address",
+    "address",
+)
+
+T = TypeVar("T")
+
+metadata = MetaData()
+
+stats_entry = Table(
+    "stats_entry",
+    metadata,
+    Column("key", String, primary_key=True),
+    Column("generation", Integer, nullable=False),
+    Column("value", LargeBinary, nullable=False),
+)
+
+
+class StatsCache:
+    """Cache of the results of the statistics, kept in memory with a LRU
+    eviction and, if a path is given, in a SQLite file shared by the processes.
+    Each result is stored with the generation of the data it was computed from,
+    and is only served for this generation."""
+
+    def __init__(self, max_size: int = DEFAULT_MAX_SIZE, path: str | None = None):
+        self.max_size = max_size
+        self.path = path
+
+        # Key -> (generation, result), most recently used last
+        self._entries: OrderedDict[tuple, tuple[int, object]] = OrderedDict()
+        self._lock = threading.Lock()
+        self._engine = None
+
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def _get_engine(self):
+        """Creates the engine of the shared file on first use."""
+
+        if self._engine is None:
+            self._engine = create_engine(f"sqlite+pysqlite:///{self.path}")
+            metadata.create_all(self._engine)
+
+        return self._engine
+
+    def _remember(self, key: tuple, generation: int, result) -> None:
+        """Stores a result in memory, evicting the least recently used one."""
+
+        with self._lock:
+            self._entries[key] = (generation, result)
+            self._entries.move_to_end(key)
+
+            if len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def get_or_compute(
+        self, key: tuple, generation: int, compute: Callable[[], T]
+    ) -> T:
+        """Returns the result stored for the key if it was computed from the
+        given generation of the data, else computes it with compute and
+        stores it."""
+
+        with self._lock:
+            entry = self._entries.get(key)
+
+            if entry is not None and entry[0] == generation:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+
+        if self.path is not None:
+            with self._get_engine().connect() as connection:
+                value = connection.scalar(
+                    select(stats_entry.c.value).where(
+                        stats_entry.c.key == repr(key),
+                        stats_entry.c.generation == generation,
+                    )
+                )
+
+            if value is not None:
+                result = pickle.loads(value)
+                self._remember(key, generation, result)
+
+                with self._lock:
+                    self.hits += 1
+
+                return result
+
+        with self._lock:
+            self.misses += 1
+
+        result = compute()
+        self._remember(key, generation, result)
+
+        if self.path is not None:
+            with self._get_engine().begin() as connection:
+                connection.execute(
+                    delete(stats_entry).where(stats_entry.c.key == repr(key))
+                )
+                connection.execute(
+                    insert(stats_entry).values(
+                        key=repr(key), generation=generation, value=pickle.dumps(result)
+                    )
+                )
+
+        return result
+
+    def invalidate(self) -> None:
+        """Forgets every stored result."""
+
+        with self._lock:
+            self._entries.clear()
+            self.invalidations += 1
+
+        if self.path is not None:
+            with self._get_engine().begin() as connection:
+                connection.execute(delete(stats_entry))
+
+    def counters(self) -> dict:
+        """Returns the number of hits, misses and invalidations so far."""
+
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "invalidations": self.invalidations,
+                "size": len(self._entries),
+            }
+
+
+# Cache used by the statistics of the app (see database.py for its settings)
+default_cache = StatsCache()
+
+
+def configure(path: str | None, max_size: int = DEFAULT_MAX_SIZE) -> None:
+    """Sets the size of the cache and the file shared by the processes."""
+
+    default_cache.path = path
+    default_cache.max_size = max_size
+
+
+def data_generation(current_session: Session) -> int:
+    """Returns the generation of the data, as seen by the transaction of the
+    session."""
+
+    generation = current_session.scalar(
+        select(DataGeneration.generation).where(DataGeneration.id == 1)
+    )
+
+    return generation or 0
+
+
+def mark_changed(current_session: Session) -> None:
+    """Increases the generation of the data in the transaction of the session,
+    which changed (or is about to change) the data the statistics depend on."""
+
+    table = DataGeneration.__table__
+    connection = current_session.connection()
+
+    result = connection.execute(
+        update(table).where(table.c.id == 1).values(generation=table.c.generation + 1)
+    )
+
+    # The row is inserted by the migrations, and here in the databases
+    # created from the models
+    if result.rowcount == 0:
+        connection.execute(insert(table).values(id=1, generation=1))
+
+    current_session.info[_CHANGED_KEY] = True
+
+
+def _after_flush(current_session: Session, _flush_context) -> None:
+    """Increases the generation if the flush touched the watched models."""
+
+    if any(
+        isinstance(entity, WATCHED_MODELS)
+        for entity in chain(
+            current_session.new, current_session.dirty, current_session.deleted
+        )
+    ):
+        mark_changed(current_session)
+
+
+def _do_orm_execute(orm_execute_state) -> None:
+    """Increases the generation before bulk statements on the watched models."""
+
+    if not (
+        orm_execute_state.is_insert
+        or orm_execute_state.is_update
+        or orm_execute_state.is_delete
+    ):
+        return
+
+    mapper = orm_execute_state.bind_mapper
+
+    if mapper is not None and issubclass(mapper.class_, WATCHED_MODELS):
+        mark_changed(orm_execute_state.session)
+
+
+def _after_commit(current_session: Session) -> None:
+    """Forgets the results computed from the former generations once a
+    transaction changing the data is committed."""
+
+    if current_session.info.pop(_CHANGED_KEY, False):
+        default_cache.invalidate()
+
+
+def _after_rollback(current_session: Session) -> None:
+    """Lets the session use the cache again once a transaction changing the
+    data is rolled back, with the generation it increased."""
+
+    current_session.info.pop(_CHANGED_KEY, None)
+
+
+def register(session_factory: sessionmaker | type[Session]) -> None:
+    """Keeps the cache consistent with the changes made by every session
+    created by the factory (or of the given Session subclass)."""
+
+    for name, listener in (
+        ("after_flush", _after_flush),
+        ("do_orm_execute", _do_orm_execute),
+        ("after_commit", _after_commit),
+        ("after_rollback", _after_rollback),
+    ):
+        if not event.contains(session_factory, name, listener):
+            event.listen(session_factory, name, listener)
+
+
+def _cached(current_session: Session, key: tuple, compute: Callable[[], T]) -> T:
+    """Returns the result of compute for the key, from the cache unless the
+    transaction of the session changed the data."""
+
+    # Read first, as it flushes the pending changes
+    generation = data_generation(current_session)
+
+    if current_session.info.get(_CHANGED_KEY):
+        return compute()
+
+    return default_cache.get_or_compute(key, generation, compute)
+
+
+def _detached_student(identifier, fields: tuple) -> Student:
+    """Rebuilds a student from the values stored in the cache."""
+
+    student = Student(*fields)
+    student.id = identifier
+
+    return student
+
+
+def debt_per_student(current_session: Session) -> list[StudentDebt]:
+    """Returns the debt of every student (see queries.balance_debt_per_student).
+    The students are new objects, which are not attached to any session."""
+
+    rows = _cached(
+        current_session,
+        ("debt_per_student",),
+        lambda: [
+            (
+                student.id,
+                tuple(getattr(student, field) for field in _STUDENT_FIELDS),
+                debt,
+            )
+            for student, debt in balance_debt_per_student(current_session)
+        ],
+    )
+
+    return [
+        StudentDebt(_detached_student(identifier, fields), debt)
+        for identifier, fields, debt in rows
+    ]
+
+
+def gains(
+    current_session: Session,
+    start_date: datetime.date,
+    end_date: datetime.date | None = None,
+) -> Decimal:
+    """Returns the gains made between the two given dates
+    (see queries.balance_gains)."""
+
+    return _cached(
+        current_session,
+        ("gains", start_date, end_date),
+        lambda: balance_gains(current_session, start_date, end_date),
+    )
+
+
+def display_report() -> None:
+    """Prints the counters of the cache."""
+
+    # InquirerPy is only loaded by the diagnostics menu, not by the CLI
+    from InquirerPy.utils import color_print
+
+    counters = default_cache.counters()
+    lookups = counters["hits"] + counters["misses"]
+
+    color_print(
+        [
+            ("white", "Cache des statistiques : "),
+            (
+                "green",
+                f"{counters['hits']} succès, {counters['misses']} échecs"
+                f" ({counters['hits'] / max(lookups, 1):.0%} de succès),"
+                f" {counters['invalidations']} invalidation(s),"
+                f" {counters['size']} résultat(s) en mémoire",
+            ),
+        ]
+    )
@@ -4,35 +4,41 @@ create, edit and delete student instances in the database"""
 from decimal import Decimal
 
 from InquirerPy.utils import color_print
+from sqlalchemy.orm import joinedload, selectinload
 
 from base_controller import BaseController
-from prompts import prompt_student
-from models import Student
+from instrumentation import instrumented
+from prompts import prompt_payment, prompt_statements_options, prompt_student
+from models import Course, Payment, Student
+from payments import MAX_AMOUNT, MIN_AMOUNT, ExcessPaymentError, allocate_payment
+from statements import generate_statements
+import stats_cache
 
 
 class StudentController(BaseController):
     """This class controls all student-related operations :
     creation, edition, deletion."""
 
+    # The deletion of a student cascades to his courses and payments,
+    # and to their allocations
+    LOADER_OPTIONS = {
+        "delete_entity": (
+            selectinload(Student.courses).joinedload(Course.allocations),
+            selectinload(Student.payments).joinedload(Payment.allocations),
+        ),
+    }
+
     def __init__(self):
         super().__init__(Student, prompt_student)
 
+    @instrumented
     def display_debt_per_student(self) -> None:
         """Print a list of every student with associated debts."""
 
         with self.session_maker.begin() as db_session:
-            # We first retrieve the list of the students
-            students_list = BaseController._get_entity_list(
-                db_session, self.model, None
-            )
-
-            for student in students_list:
-                debt = Decimal(0)
-
-                for course in student.courses:
-                    if not course.paid:
-                        debt += course.hourly_rate.price * course.duration
-
+            # The debts are read from the balances maintained by the ledger,
+            # or from the cache if nothing changed since the last time
+            for student, debt in stats_cache.debt_per_student(db_session):
                 color_print(
                     [
                         ("white", f"→ {student} - "),
@@ -42,3 +48,56 @@ class StudentController(BaseController):
                         ),
                     ]
                 )
+
+    @instrumented
+    def record_payment(self) -> None:
+        """Records a payment of a student, allocated to his oldest unpaid courses."""
+
+        with self.session_maker.begin() as db_session:
+            student, amount, payment_date = prompt_payment(
+                db_session, MIN_AMOUNT, MAX_AMOUNT
+            )
+
+            try:
+                result = allocate_payment(db_session, student.id, amount, payment_date)
+            except ExcessPaymentError as error:
+                color_print(
+                    [
+                        (
+                            "red",
+                            "Le montant dépasse la dette de l'élève "
+                            f"({error.due:.2f}€).",
+                        )
+                    ]
+                )
+                return
+
+        color_print(
+            [
+                (
+                    "green",
+                    f"Paiement de {amount:.2f}€ réparti sur {result.courses} cours, "
+                    f"dont {result.paid_courses} payé(s) en totalité.",
+                )
+            ]
+        )
+
+    @instrumented
+    def generate_statements(self) -> None:
+        """Writes the statement of the unpaid courses of every student
+        in a directory chosen by the user."""
+
+        directory, file_format = prompt_statements_options()
+
+        with self.session_maker.begin() as db_session:
+            summary = generate_statements(db_session, directory, file_format)
+
+        color_print(
+            [
+                (
+                    "green",
+                    f"{summary.statements} relevé(s) écrit(s) dans {directory} "
+                    f"({summary.courses} cours impayés, {summary.total:.2f}€).",
+                )
+            ]
+        )
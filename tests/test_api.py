@@ -0,0 +1,219 @@
+"""Checks the HTTP API, served on a free port by a thread of the test.
+
+Run from the root folder of the project :
+    python3 -m pytest tests"""
+
+import datetime
+import http.client
+import json
+import threading
+import uuid
+from decimal import Decimal
+
+import pytest
+from sqlalchemy import func, select
+
+import api
+import database
+import payments
+import stats_cache
+from models import Base, Course, HourlyRate, Payment, Student
+
+
+@pytest.fixture
+def server(tmp_path, monkeypatch):
+    """Serves the API on a new database file, holding a student with an unpaid
+    course of two hours at 20€, and returns the server."""
+
+    monkeypatch.setenv(
+        database.URL_VARIABLE, f"sqlite+pysqlite:///{tmp_path / 'data.db'}"
+    )
+
+    # The factory of the app is created again for the database
+    monkeypatch.setattr(database, "_session_maker", None)
+    monkeypatch.setattr(database, "_engine", None)
+    monkeypatch.setattr(stats_cache, "default_cache", stats_cache.StatsCache())
+
+    Base.metadata.create_all(database.get_engine())
+
+    with database.get_session_maker().begin() as db_session:
+        course = Course(datetime.date(2024, 3, 1), duration=2)
+        course.student = Student("Prénom", "Nom", "0601020304", "eleve@example.com")
+        course.hourly_rate = HourlyRate("Tarif", 20)
+        db_session.add(course)
+
+    server = api.PooledHTTPServer(("127.0.0.1", 0), workers=2)
+    # The server checks often whether it is shut down, to end the tests quickly
+    threading.Thread(
+        target=server.serve_forever, kwargs={"poll_interval": 0.01}, daemon=True
+    ).start()
+
+    yield server
+
+    server.shutdown()
+    server.server_close()
+    database.get_engine().dispose()
+
+
+def _call(server, method: str, path: str, body=None, headers=None):
+    """Sends a request and returns the status, the headers and the JSON body
+    of the response."""
+
+    connection = http.client.HTTPConnection(*server.server_address)
+
+    try:
+        connection.request(
+            method,
+            path,
+            json.dumps(body) if body is not None else None,
+            headers or {},
+        )
+        response = connection.getresponse()
+        data = response.read()
+
+        return response.status, response.headers, json.loads(data) if data else None
+
+    finally:
+        connection.close()
+
+
+def _course_id() -> str:
+    with database.get_session_maker().begin() as db_session:
+        return str(db_session.scalars(select(Course.id)).one())
+
+
+def _payments() -> Decimal:
+    """Returns the total amount of the payments."""
+
+    with database.get_session_maker().begin() as db_session:
+        return db_session.scalar(select(func.coalesce(func.sum(Payment.amount), 0)))
+
+
+def _debt(server) -> Decimal:
+    """Returns the debt of the student given by the API."""
+
+    _, _, debts = _call(server, "GET", "/stats/debts")
+    return Decimal(debts[0]["debt"])
+
+
+def test_patching_paid_updates_the_payments(server):
+    with database.get_session_maker().begin() as db_session:
+        student_id = db_session.scalars(select(Student.id)).one()
+        payments.allocate_payment(db_session, student_id, Decimal(15))
+
+    path = f"/courses/{_course_id()}"
+
+    status, _, course = _call(server, "PATCH", path, {"paid": True})
+
+    assert (status, course["paid"]) == (200, True)
+
+    # The rest of the course is paid by a new payment
+    assert _payments() == 40
+    assert _debt(server) == 0
+
+    status, _, course = _call(server, "PATCH", path, {"paid": False})
+
+    assert (status, course["paid"]) == (200, False)
+
+    # Both payments lose their allocation to the course, and are removed
+    assert _payments() == 0
+    assert _debt(server) == 40
+
+
+def _add_courses(server, days) -> None:
+    """Adds an hour of course to the student on each of the days of March 2024."""
+
+    with database.get_session_maker().begin() as db_session:
+        student_id, hourly_rate_id = db_session.execute(
+            select(Course.student_id, Course.hourly_rate_id)
+        ).one()
+
+    for day in days:
+        status, _, _ = _call(
+            server,
+            "POST",
+            "/courses",
+            {
+                "date": f"2024-03-{day:02d}",
+                "duration": "1",
+                "student_id": str(student_id),
+                "hourly_rate_id": str(hourly_rate_id),
+            },
+        )
+
+        assert status == 201
+
+
+def test_pages_follow_the_cursor(server):
+    _add_courses(server, range(2, 6))
+
+    pages = []
+    path = "/courses?limit=2"
+
+    while path is not None:
+        status, _, page = _call(server, "GET", path)
+
+        assert status == 200
+
+        pages.append([course["date"][-2:] for course in page["items"]])
+        path = f"/courses?limit=2&after={page['next']}" if page["next"] else None
+
+    # The most recent courses come first
+    assert pages == [["05", "04"], ["03", "02"], ["01"]]
+
+
+@pytest.mark.parametrize("query", ["limit=0", "limit=101", "limit=a", "after=a"])
+def test_invalid_page_is_rejected(server, query):
+    status, _, payload = _call(server, "GET", f"/courses?{query}")
+
+    assert status == 400
+    assert "error" in payload
+
+
+def test_unchanged_response_is_not_sent_again(server):
+    status, headers, _ = _call(server, "GET", "/stats/debts")
+    etag = headers["ETag"]
+
+    assert status == 200
+
+    status, headers, payload = _call(
+        server, "GET", "/stats/debts", headers={"If-None-Match": etag}
+    )
+
+    assert (status, headers["ETag"], payload) == (304, etag, None)
+
+    _add_courses(server, [2])
+
+    status, headers, debts = _call(
+        server, "GET", "/stats/debts", headers={"If-None-Match": etag}
+    )
+
+    assert status == 200
+    assert headers["ETag"] != etag
+    assert Decimal(debts[0]["debt"]) == 60
+
+
+def test_patch_edits_the_given_fields(server):
+    path = f"/courses/{_course_id()}"
+
+    status, _, course = _call(server, "PATCH", path, {"duration": "1.5"})
+
+    assert (status, course["duration"], course["date"]) == (200, "1.50", "2024-03-01")
+    assert _debt(server) == 30
+
+
+@pytest.mark.parametrize(
+    "body, status",
+    [({"unknown": 1}, 400), ({"paid": "oui"}, 400), ({"duration": "10"}, 400)],
+)
+def test_invalid_patch_is_rejected(server, body, status):
+    assert _call(server, "PATCH", f"/courses/{_course_id()}", body)[0] == status
+
+    # Nothing was changed
+    assert _debt(server) == 40
+
+
+def test_unknown_entity_or_method(server):
+    assert _call(server, "PATCH", f"/courses/{uuid.uuid4()}", {})[0] == 404
+    assert _call(server, "PATCH", "/courses", {})[0] == 405
+    assert _call(server, "GET", "/unknown")[0] == 404
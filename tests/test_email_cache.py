@@ -0,0 +1,81 @@
+"""Checks that the deliverability of the email domains is looked up once per
+domain until its result expires, and kept across restarts.
+
+Run from the root folder of the project :
+    python3 -m pytest tests"""
+
+import datetime
+
+import pytest
+
+from email_cache import DeliverabilityCache
+
+
+class CountingResolver:
+    """Resolver giving the same answer for every domain, counting the lookups."""
+
+    def __init__(self, answer: bool | None = True):
+        self.answer = answer
+        self.lookups = 0
+
+    def is_deliverable(self, domain: str) -> bool | None:
+        self.lookups += 1
+        return self.answer
+
+
+@pytest.fixture
+def url(tmp_path) -> str:
+    return f"sqlite+pysqlite:///{tmp_path / 'email_domains.db'}"
+
+
+def test_result_is_cached(url):
+    resolver = CountingResolver(False)
+    cache = DeliverabilityCache(resolver, url=url)
+
+    assert not cache.is_deliverable("example.com")
+    assert not cache.is_deliverable("EXAMPLE.com")
+    assert resolver.lookups == 1
+
+
+def test_result_is_kept_across_restarts(url):
+    DeliverabilityCache(CountingResolver(False), url=url).is_deliverable("example.com")
+
+    resolver = CountingResolver(True)
+
+    assert not DeliverabilityCache(resolver, url=url).is_deliverable("example.com")
+    assert resolver.lookups == 0
+
+
+def test_expired_result_is_looked_up_again(url):
+    resolver = CountingResolver(False)
+    cache = DeliverabilityCache(resolver, ttl=datetime.timedelta(0), url=url)
+
+    cache.is_deliverable("example.com")
+    resolver.answer = True
+
+    assert cache.is_deliverable("example.com")
+    assert resolver.lookups == 2
+
+
+def test_expired_result_is_used_when_the_lookup_fails(url):
+    resolver = CountingResolver(False)
+    cache = DeliverabilityCache(resolver, ttl=datetime.timedelta(0), url=url)
+
+    cache.is_deliverable("example.com")
+    resolver.answer = None
+
+    assert not cache.is_deliverable("example.com")
+
+    # A domain never checked is accepted
+    assert cache.is_deliverable("example.org")
+
+
+def test_least_recently_used_domain_is_evicted():
+    resolver = CountingResolver()
+    cache = DeliverabilityCache(resolver, max_size=2, url=None)
+
+    for domain in ("a.fr", "b.fr", "a.fr", "c.fr", "a.fr", "b.fr"):
+        cache.is_deliverable(domain)
+
+    # b.fr was evicted by c.fr, a.fr being used more recently
+    assert resolver.lookups == 4
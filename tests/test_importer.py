@@ -0,0 +1,122 @@
+"""Checks the import of students, hourly rates and courses from CSV and JSONL
+files, the invalid records being reported line by line.
+
+Run from the root folder of the project :
+    python3 -m pytest tests"""
+
+import io
+from decimal import Decimal
+
+import pytest
+from sqlalchemy import func, select
+
+import database
+import email_cache
+import importer
+import ledger
+from models import Base, Course, HourlyRate, HourlyRatePrice, Student
+
+STUDENTS = """first_name,last_name,phone_number,email_address,address
+Jean,Dupont,06 12 34 56 78,jean@Example.COM,1 rue X
+Jo,Martin,06 12 34 56 79,jo@example.com,
+Marie,Durand,12,marie@example.com,
+Paul,Bernard,06 12 34 56 80,pas-une-adresse,
+"""
+
+COURSES = """{"date": "01/03/2024", "duration": "1.5", "paid": "oui", "student": "jean@example.com", "rate": "Lycée"}
+{"date": "02/03/2024", "duration": "2"
+
+{"date": "03/03/2024", "duration": "1", "student": "inconnu@example.com", "rate": "Lycée"}
+{"date": "32/03/2024", "duration": "1", "student": "jean@example.com", "rate": "Lycée"}
+{"date": "04/03/2024", "duration": "1", "paid": "peut-être", "student": "jean@example.com", "rate": "Lycée"}
+{"date": "05/03/2024", "duration": "12", "student": "jean@example.com", "rate": "Lycée"}
+{"date": "06/03/2024", "duration": "1", "student": "jean@example.com", "rate": "Lycée"}
+"""
+
+
+@pytest.fixture
+def session_maker(monkeypatch):
+    """Returns the session factory of the app on a new in-memory database ;
+    the domains of the email addresses are accepted without any lookup."""
+
+    engine = database.create_app_engine("sqlite+pysqlite:///:memory:")
+    Base.metadata.create_all(engine)
+
+    # The shared session factory keeps its listeners
+    factory = database.get_session_maker()
+    monkeypatch.setitem(factory.kw, "bind", engine)
+
+    monkeypatch.setattr(
+        email_cache,
+        "default_cache",
+        email_cache.DeliverabilityCache(email_cache.StaticResolver(), url=None),
+    )
+
+    yield factory
+
+    engine.dispose()
+
+
+def _import(factory, model, content: str, file_format: str, **options):
+    """Imports the content and returns the summary and the reported errors."""
+
+    errors = io.StringIO()
+    summary = importer.import_file(
+        factory, model, io.StringIO(content), file_format, errors, **options
+    )
+
+    return summary, errors.getvalue().splitlines()
+
+
+def test_invalid_students_are_reported(session_maker):
+    summary, errors = _import(session_maker, Student, STUDENTS, "csv")
+
+    assert summary == (1, 3)
+    assert errors == [
+        "Ligne 3 : first_name doit comporter entre 3 et 50 caractères",
+        "Ligne 4 : numéro de téléphone invalide : 12",
+        "Ligne 5 : adresse email invalide : pas-une-adresse",
+    ]
+
+    with session_maker.begin() as db_session:
+        student = db_session.scalars(select(Student)).one()
+
+        assert (student.phone_number, student.email_address) == (
+            "+33612345678",
+            "jean@example.com",
+        )
+
+
+def test_rates_receive_their_first_price(session_maker):
+    summary, errors = _import(
+        session_maker, HourlyRate, "name,price\nLycée,30\nCollège,1000\n", "csv"
+    )
+
+    assert summary == (1, 1)
+    assert errors == ["Ligne 3 : price doit être compris entre 0 et 999.99"]
+
+    with session_maker.begin() as db_session:
+        assert db_session.scalars(select(HourlyRatePrice.price)).all() == [30]
+
+
+def test_invalid_courses_are_reported(session_maker):
+    _import(session_maker, Student, STUDENTS, "csv")
+    _import(session_maker, HourlyRate, "name,price\nLycée,30\n", "csv")
+
+    # The rows are inserted two at a time
+    summary, errors = _import(session_maker, Course, COURSES, "jsonl", batch_size=2)
+
+    assert summary == (2, 5)
+    assert errors == [
+        "Ligne 2 : enregistrement illisible",
+        "Ligne 4 : élève introuvable : inconnu@example.com",
+        "Ligne 5 : date invalide : 32/03/2024 (format jj/mm/AAAA)",
+        "Ligne 6 : valeur de paid invalide : peut-être (oui ou non)",
+        "Ligne 7 : duration doit être compris entre 0 et 9.9",
+    ]
+
+    with session_maker.begin() as db_session:
+        assert db_session.scalar(select(func.sum(Course.duration))) == Decimal("2.5")
+
+        # The balances are kept up to date by the import
+        assert ledger.verify(db_session) == []
@@ -0,0 +1,106 @@
+"""Checks that the changes made by bulk statements are journaled with the
+values of the rows before and after them.
+
+Run from the root folder of the project :
+    python3 -m pytest tests"""
+
+import datetime
+import uuid
+
+import pytest
+from sqlalchemy import insert, update
+from sqlalchemy.exc import IntegrityError
+
+import database
+import journal
+import payments
+from models import Base, Course, HourlyRate, Student
+
+
+@pytest.fixture
+def session_maker(monkeypatch):
+    """Returns the session factory of the app on a new in-memory database,
+    holding a student with an unpaid course."""
+
+    engine = database.create_app_engine("sqlite+pysqlite:///:memory:")
+    Base.metadata.create_all(engine)
+
+    # The shared session factory keeps its listeners
+    factory = database.get_session_maker()
+    monkeypatch.setitem(factory.kw, "bind", engine)
+
+    with factory.begin() as db_session:
+        course = Course(datetime.date(2024, 3, 1), duration=1)
+        course.student = Student("Prénom", "Nom", "0601020304", "eleve@example.com")
+        course.hourly_rate = HourlyRate("Tarif", 20)
+        db_session.add(course)
+
+    yield factory
+
+    engine.dispose()
+
+
+def _course(db_session) -> Course:
+    return db_session.query(Course).one()
+
+
+def _entries(factory, entity_id) -> list:
+    """Returns the operation and the changed columns of the journal entries
+    of the entity."""
+
+    with factory.begin() as db_session:
+        return [
+            (entry.operation, journal.changed_columns(entry))
+            for entry in db_session.scalars(journal.journal_query(entity_id))
+        ]
+
+
+def test_bulk_update_is_journaled(session_maker):
+    with session_maker.begin() as db_session:
+        course_id = _course(db_session).id
+        payments.mark_courses(
+            db_session, payments.selection_criterion(course_ids=[course_id]), True
+        )
+
+    operation, changes = _entries(session_maker, course_id)[-1]
+
+    assert operation == "update"
+    assert changes["paid"] == (False, True)
+
+
+def test_bulk_insert_is_journaled(session_maker):
+    course_id = uuid.uuid4()
+
+    with session_maker.begin() as db_session:
+        course = _course(db_session)
+        db_session.execute(
+            insert(Course),
+            [
+                {
+                    "id": course_id,
+                    "date": datetime.date(2024, 3, 8),
+                    "duration": 2,
+                    "paid": False,
+                    "student_id": course.student_id,
+                    "hourly_rate_id": course.hourly_rate_id,
+                }
+            ],
+        )
+
+    [(operation, changes)] = _entries(session_maker, course_id)
+
+    assert operation == "insert"
+    assert changes["date"] == (None, "2024-03-08")
+
+
+def test_failed_bulk_statement_is_not_journaled(session_maker):
+    with session_maker.begin() as db_session:
+        course_id = _course(db_session).id
+
+        # The student does not exist
+        with pytest.raises(IntegrityError):
+            db_session.execute(update(Course).values(student_id=uuid.uuid4()))
+
+    assert [operation for operation, _ in _entries(session_maker, course_id)] == [
+        "insert"
+    ]
@@ -0,0 +1,157 @@
+"""Checks that the operations of the controllers emit the same number of SQL
+statements whatever the number of rows, i.e. that the relationships they walk
+are loaded by the loader options they declare rather than row by row.
+
+Run from the root folder of the project :
+    python3 -m pytest tests"""
+
+import datetime
+
+import pytest
+from sqlalchemy import Engine, event, func, select
+
+import base_controller
+import course_controller
+import database
+from course_controller import CourseController
+from hourly_rate_controller import HourlyRateController
+from models import Base, Course, HourlyRate, Student
+from student_controller import StudentController
+
+# Numbers of courses compared, the second one being ten times the first
+ROW_COUNTS = (100, 1000)
+
+HOURLY_RATES = 3
+
+# Number of months over which the courses are spread
+MONTHS = 6
+
+# Date from which the gains are computed
+GAINS_START = datetime.date(2023, 1, 1)
+
+
+def _use_database(monkeypatch, courses: int) -> Engine:
+    """Points the controllers to a new in-memory database holding the given
+    number of courses, and returns its engine."""
+
+    engine = database.create_app_engine("sqlite+pysqlite:///:memory:")
+    Base.metadata.create_all(engine)
+
+    # The shared session factory keeps its listeners
+    monkeypatch.setitem(database.get_session_maker().kw, "bind", engine)
+
+    # Half of the courses are given to one student at one hourly rate, so that
+    # their deletion walks more courses as the database grows ; the others
+    # are shared by students whose number grows too, so that loading them row
+    # by row would show
+    students = [
+        Student(f"Prénom{i}", f"Nom{i}", "0601020304", f"eleve{i}@example.com")
+        for i in range(1 + courses // 20)
+    ]
+    hourly_rates = [HourlyRate(f"Tarif {i}", 20 + 5 * i) for i in range(HOURLY_RATES)]
+
+    # The courses are written by the controllers' sessions, so that the
+    # balances are maintained as in the app
+    with StudentController().session_maker.begin() as db_session:
+        db_session.add_all(students + hourly_rates)
+
+        for i in range(courses):
+            # Each student has courses in every month, so that the deletions
+            # update the same balances whatever the number of courses
+            course = Course(
+                datetime.date(2023, 1 + (i // 2) % MONTHS, 1 + i % 28),
+                duration=1 + i % 2,
+                paid=i % 3 == 0,
+            )
+
+            if i % 2 == 0:
+                course.student, course.hourly_rate = students[0], hourly_rates[0]
+            else:
+                course.student = students[1 + (i // 2) % (len(students) - 1)]
+                course.hourly_rate = hourly_rates[1 + (i // 2) % (HOURLY_RATES - 1)]
+
+            db_session.add(course)
+
+    return engine
+
+
+def _busiest(model):
+    """Returns a function choosing the entity of the model with most courses."""
+
+    def choose(current_session, *_):
+        return current_session.scalars(
+            select(model)
+            .join(Course)
+            .group_by(model.id)
+            .order_by(func.count(Course.id).desc())
+        ).first()
+
+    return choose
+
+
+def _list_courses() -> None:
+    CourseController().display_entity_list(limit=None)
+
+
+def _debts() -> None:
+    StudentController().display_debt_per_student()
+
+
+def _gains() -> None:
+    CourseController().display_gains_since_date()
+
+
+def _delete_student() -> None:
+    StudentController().delete_entity()
+
+
+def _delete_hourly_rate() -> None:
+    HourlyRateController().delete_entity()
+
+
+OPERATIONS = {
+    "course list": _list_courses,
+    "debts": _debts,
+    "gains": _gains,
+    "student deletion": _delete_student,
+    "hourly rate deletion": _delete_hourly_rate,
+}
+
+
+def _statement_count(monkeypatch, operation: str, courses: int) -> int:
+    """Runs the operation on a database of the given size and returns the
+    number of statements it emitted."""
+
+    engine = _use_database(monkeypatch, courses)
+
+    monkeypatch.setattr(
+        base_controller,
+        "prompt_entity_choice",
+        _busiest(Student if operation == "student deletion" else HourlyRate),
+    )
+    monkeypatch.setattr(course_controller, "prompt_date", lambda *_, **__: GAINS_START)
+
+    statements = 0
+
+    def count_statement(*_):
+        nonlocal statements
+        statements += 1
+
+    event.listen(engine, "before_cursor_execute", count_statement)
+
+    try:
+        OPERATIONS[operation]()
+    finally:
+        event.remove(engine, "before_cursor_execute", count_statement)
+        engine.dispose()
+
+    return statements
+
+
+@pytest.mark.parametrize("operation", OPERATIONS)
+def test_statement_count_is_constant(monkeypatch, operation):
+    counts = [
+        _statement_count(monkeypatch, operation, courses) for courses in ROW_COUNTS
+    ]
+
+    assert counts[0] == counts[1], counts
@@ -0,0 +1,191 @@
+"""Checks the allocation of the payments to the courses and the marking of the
+courses as paid or unpaid.
+
+Run from the root folder of the project :
+    python3 -m pytest tests"""
+
+import datetime
+from decimal import Decimal
+
+import pytest
+from sqlalchemy import select
+
+import database
+import payments
+from models import Base, Course, HourlyRate, Payment, Student
+
+
+@pytest.fixture
+def session_maker(monkeypatch):
+    """Returns the session factory of the app on a new in-memory database."""
+
+    engine = database.create_app_engine("sqlite+pysqlite:///:memory:")
+    Base.metadata.create_all(engine)
+
+    # The shared session factory keeps its listeners
+    factory = database.get_session_maker()
+    monkeypatch.setitem(factory.kw, "bind", engine)
+
+    yield factory
+
+    engine.dispose()
+
+
+def _student(db_session, name: str, *durations: int) -> Student:
+    """Adds a student with unpaid courses of the given durations at 20€ an
+    hour, on consecutive days from the 1st of March 2024."""
+
+    student = Student("Prénom", name, "0601020304", f"{name.lower()}@example.com")
+    hourly_rate = HourlyRate(f"Tarif {name}", 20)
+
+    for day, duration in enumerate(durations, 1):
+        course = Course(datetime.date(2024, 3, day), duration=duration)
+        course.student, course.hourly_rate = student, hourly_rate
+        db_session.add(course)
+
+    db_session.flush()
+
+    return student
+
+
+def test_marking_unpaid_keeps_the_payments_of_other_students(session_maker):
+    with session_maker.begin() as db_session:
+        student = _student(db_session, "Un", 1)
+        other = _student(db_session, "Deux", 1)
+
+        # A payment of the other student with nothing allocated
+        db_session.add(Payment(date=datetime.date(2024, 3, 1), amount=0, student=other))
+
+        criterion = payments.selection_criterion(student_id=student.id)
+        payments.mark_courses(db_session, criterion, True)
+        payments.mark_courses(db_session, criterion, False)
+
+        assert db_session.scalars(select(Payment.student_id)).all() == [other.id]
+
+
+def _payments(db_session) -> list[Decimal]:
+    """Returns the amounts of the payments."""
+
+    return [Decimal(amount) for amount in db_session.scalars(select(Payment.amount))]
+
+
+def test_marking_paid_allocates_what_remains_due(session_maker):
+    with session_maker.begin() as db_session:
+        student = _student(db_session, "Un", 1, 2)
+        criterion = payments.selection_criterion(student_id=student.id)
+
+        assert payments.preview(db_session, criterion, True) == (2, 60)
+
+        result = payments.mark_courses(db_session, criterion, True)
+
+        assert (result.courses, result.amount) == (2, 60)
+        assert len(result.payment.allocations) == 2
+        assert _payments(db_session) == [60]
+        assert payments.student_due(db_session, student.id) == 0
+
+        # Nothing is left to mark
+        assert payments.preview(db_session, criterion, True) == (0, 0)
+
+
+def test_marking_unpaid_cancels_the_payment(session_maker):
+    with session_maker.begin() as db_session:
+        student = _student(db_session, "Un", 1, 2)
+        criterion = payments.selection_criterion(student_id=student.id)
+        payments.mark_courses(db_session, criterion, True)
+
+        assert payments.preview(db_session, criterion, False) == (2, 60)
+
+        result = payments.mark_courses(db_session, criterion, False)
+
+        assert (result.courses, result.amount, result.payment) == (2, 60, None)
+        assert _payments(db_session) == []
+        assert payments.student_due(db_session, student.id) == 60
+
+
+def test_marking_unpaid_shrinks_the_payment(session_maker):
+    with session_maker.begin() as db_session:
+        student = _student(db_session, "Un", 1, 2)
+        payments.mark_courses(
+            db_session, payments.selection_criterion(student_id=student.id), True
+        )
+
+        # Only the course of the 1st of March is marked as unpaid
+        payments.mark_courses(
+            db_session,
+            payments.selection_criterion(
+                student_id=student.id, end_date=datetime.date(2024, 3, 1)
+            ),
+            False,
+        )
+
+        assert _payments(db_session) == [40]
+        assert payments.student_due(db_session, student.id) == 20
+
+
+def test_selection_without_criterion_is_rejected():
+    with pytest.raises(ValueError):
+        payments.selection_criterion()
+
+
+def _allocated(db_session, student: Student) -> list[tuple[bool, Decimal]]:
+    """Returns whether each course of the student is paid, and the amount
+    allocated to it, in date order."""
+
+    # The bulk statements do not update the loaded entities
+    db_session.expire_all()
+
+    return [
+        (course.paid, sum((Decimal(a.amount) for a in course.allocations), Decimal(0)))
+        for course in db_session.scalars(
+            select(Course).where(Course.student == student).order_by(Course.date)
+        )
+    ]
+
+
+def test_payment_is_allocated_to_the_oldest_courses(session_maker):
+    with session_maker.begin() as db_session:
+        student = _student(db_session, "Un", 1, 2, 1)
+
+        result = payments.allocate_payment(db_session, student.id, Decimal(50))
+
+        assert (result.courses, result.paid_courses) == (2, 1)
+
+        # The second course is partially paid
+        assert _allocated(db_session, student) == [(True, 20), (False, 30), (False, 0)]
+        assert payments.student_due(db_session, student.id) == 30
+
+        result = payments.allocate_payment(db_session, student.id, Decimal(30))
+
+        assert (result.courses, result.paid_courses) == (2, 2)
+        assert _allocated(db_session, student) == [(True, 20), (True, 40), (True, 20)]
+        assert _payments(db_session) == [50, 30]
+
+
+def test_payment_exceeding_the_debt_is_rejected(session_maker):
+    with session_maker.begin() as db_session:
+        student = _student(db_session, "Un", 1, 2)
+
+        with pytest.raises(payments.ExcessPaymentError) as error:
+            payments.allocate_payment(db_session, student.id, Decimal("60.01"))
+
+        assert error.value.due == 60
+        assert _payments(db_session) == []
+
+
+def test_course_paid_by_an_allocation_can_be_marked_unpaid(session_maker):
+    with session_maker.begin() as db_session:
+        student = _student(db_session, "Un", 1, 2)
+        payments.allocate_payment(db_session, student.id, Decimal(50))
+
+        payments.mark_courses(
+            db_session,
+            payments.selection_criterion(
+                student_id=student.id, end_date=datetime.date(2024, 3, 1)
+            ),
+            False,
+        )
+
+        # The payment keeps the part allocated to the second course
+        assert _allocated(db_session, student) == [(False, 0), (False, 30)]
+        assert _payments(db_session) == [30]
+        assert payments.student_due(db_session, student.id) == 30
@@ -0,0 +1,89 @@
+"""Checks that the price of a hourly rate shown by the app is the price in
+force today, a price starting later being applied on the day it comes into
+force.
+
+Run from the root folder of the project :
+    python3 -m pytest tests"""
+
+import datetime
+import weakref
+
+import pytest
+from sqlalchemy import select, update
+
+import database
+import rates
+from models import Base, HourlyRate, HourlyRatePrice
+
+TODAY = datetime.date.today()
+
+
+@pytest.fixture
+def session_maker(monkeypatch):
+    """Returns the session factory of the app on a new in-memory database,
+    holding a hourly rate at 20€."""
+
+    engine = database.create_app_engine("sqlite+pysqlite:///:memory:")
+    Base.metadata.create_all(engine)
+
+    # The shared session factory keeps its listeners
+    factory = database.get_session_maker()
+    monkeypatch.setitem(factory.kw, "bind", engine)
+
+    with factory.begin() as db_session:
+        db_session.add(HourlyRate("Tarif", 20))
+
+    yield factory
+
+    engine.dispose()
+
+
+def _set_price(factory, price: int, valid_from: datetime.date) -> None:
+    with factory.begin() as db_session:
+        hourly_rate = db_session.scalars(select(HourlyRate)).one()
+        hourly_rate.price = price
+        hourly_rate.price_valid_from = valid_from
+
+
+def _price(factory) -> int:
+    with factory.begin() as db_session:
+        return db_session.scalars(select(HourlyRate.price)).one()
+
+
+def test_price_starting_today_is_shown(session_maker):
+    _set_price(session_maker, 25, TODAY)
+
+    assert _price(session_maker) == 25
+
+
+def test_future_price_is_only_recorded_in_the_history(session_maker):
+    _set_price(session_maker, 30, TODAY + datetime.timedelta(days=7))
+
+    assert _price(session_maker) == 20
+
+    with session_maker.begin() as db_session:
+        hourly_rate = db_session.scalars(select(HourlyRate)).one()
+
+        assert [price.price for price in hourly_rate.prices] == [20, 30]
+        assert repr(hourly_rate) == "Tarif - 20.00€"
+
+
+def test_future_price_is_applied_once_in_force(session_maker, monkeypatch):
+    _set_price(session_maker, 30, TODAY + datetime.timedelta(days=7))
+
+    # The price comes into force today, and the day has not been applied yet
+    with session_maker.begin() as db_session:
+        db_session.execute(
+            update(HourlyRatePrice)
+            .where(HourlyRatePrice.price == 30)
+            .values(valid_from=TODAY)
+        )
+        db_session.execute(
+            update(HourlyRatePrice)
+            .where(HourlyRatePrice.price == 20)
+            .values(valid_to=TODAY)
+        )
+
+    monkeypatch.setattr(rates, "_applied_on", weakref.WeakKeyDictionary())
+
+    assert _price(session_maker) == 30
@@ -0,0 +1,125 @@
+"""Checks that the triggers keeping the full-text search tables in sync look
+their rows up directly, i.e. that their work does not grow with the number of
+indexed rows.
+
+Run from the root folder of the project :
+    python3 -m pytest tests"""
+
+import datetime
+import os
+
+import pytest
+from alembic import command
+from alembic.config import Config
+from sqlalchemy import create_engine, text
+from sqlalchemy.orm import Session
+
+import database
+from benchmarks.generator import generate
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Numbers of courses compared, the second one being ten times the first
+ROW_COUNTS = (1000, 10000)
+
+# Number of SQLite virtual machine instructions between two calls of the
+# progress handler, which measures the work of the statements
+INSTRUCTIONS = 10
+
+# Statements firing the triggers, on a student and on one of his courses
+STATEMENTS = {
+    "course update": "UPDATE course SET date = date WHERE id = :course",
+    "student update": "UPDATE student SET last_name = last_name WHERE id = :student",
+    "course deletion": "DELETE FROM course WHERE id = :course",
+    "student deletion": "DELETE FROM student WHERE id = :student",
+}
+
+
+def _create_database(path: str, courses: int, monkeypatch) -> str:
+    """Creates a database with the migrations, fills it with the given number
+    of courses (ten per student) and returns its URL."""
+
+    url = f"sqlite+pysqlite:///{path}"
+    monkeypatch.setenv(database.URL_VARIABLE, url)
+
+    config = Config(os.path.join(ROOT, "alembic.ini"))
+    config.set_main_option("script_location", os.path.join(ROOT, "alembic"))
+    command.upgrade(config, "head")
+
+    engine = create_engine(url)
+
+    with Session(engine) as db_session:
+        generate(
+            db_session,
+            courses,
+            students=courses // 10,
+            rates=3,
+            end_date=datetime.date(2024, 6, 30),
+        )
+
+        # The segments written by the inserts are merged now rather than by
+        # the measured statements, whose work would depend on when it happens
+        for table in ("search_student", "search_course"):
+            db_session.execute(text(f"INSERT INTO {table}({table}) VALUES('optimize')"))
+
+        db_session.commit()
+
+    engine.dispose()
+
+    return url
+
+
+def _work(url: str, statement: str) -> int:
+    """Runs the statement on the student having the fewest courses and one of
+    them (rolled back afterwards), and returns the work done by SQLite."""
+
+    engine = create_engine(url)
+    connection = engine.raw_connection()
+    cursor = connection.cursor()
+
+    # The courses of a student are indexed again with his name
+    student, course = cursor.execute(
+        "SELECT student_id, min(id) FROM course GROUP BY student_id "
+        "ORDER BY count(*), student_id LIMIT 1"
+    ).fetchone()
+
+    calls = 0
+
+    def count_call():
+        nonlocal calls
+        calls += 1
+        return 0
+
+    # The deleted rows are not referenced by the measured statements
+    cursor.execute("PRAGMA foreign_keys=OFF")
+
+    connection.driver_connection.set_progress_handler(count_call, INSTRUCTIONS)
+
+    try:
+        cursor.execute(statement, {"student": student, "course": course})
+    finally:
+        connection.driver_connection.set_progress_handler(None, 0)
+        connection.rollback()
+        connection.close()
+        engine.dispose()
+
+    return calls
+
+
+@pytest.fixture(scope="module")
+def database_urls(tmp_path_factory):
+    with pytest.MonkeyPatch.context() as monkeypatch:
+        return [
+            _create_database(
+                str(tmp_path_factory.mktemp("search") / "data.db"), courses, monkeypatch
+            )
+            for courses in ROW_COUNTS
+        ]
+
+
+@pytest.mark.parametrize("statement", STATEMENTS)
+def test_trigger_work_does_not_grow(database_urls, statement):
+    small, large = [_work(url, STATEMENTS[statement]) for url in database_urls]
+
+    # A scan of the search tables would do ten times more work
+    assert large < 2 * small, (small, large)
@@ -0,0 +1,100 @@
+"""Checks that the statistics cached by a process are no longer served once
+another process has changed the data they depend on.
+
+Run from the root folder of the project :
+    python3 -m pytest tests"""
+
+import datetime
+import os
+import subprocess
+import sys
+from decimal import Decimal
+
+import pytest
+
+import database
+import stats_cache
+from models import Base, Course, HourlyRate, Student
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Adds a course of an hour to the only student, through the session factory
+# of the app, in a process of its own
+WRITER = """
+import datetime
+
+import database
+from models import Course, HourlyRate, Student
+
+with database.get_session_maker().begin() as db_session:
+    course = Course(datetime.date(2024, 3, 1), duration=1)
+    course.student = db_session.query(Student).one()
+    course.hourly_rate = db_session.query(HourlyRate).one()
+    db_session.add(course)
+"""
+
+
+@pytest.fixture
+def session_maker(tmp_path, monkeypatch):
+    """Returns the session factory of the app on a new database file, holding
+    a student with an unpaid course of an hour at 20€."""
+
+    url = f"sqlite+pysqlite:///{tmp_path / 'data.db'}"
+    monkeypatch.setenv(database.URL_VARIABLE, url)
+
+    # The factory of the app is created again for the database
+    monkeypatch.setattr(database, "_session_maker", None)
+    monkeypatch.setattr(database, "_engine", None)
+    monkeypatch.setattr(stats_cache, "default_cache", stats_cache.StatsCache())
+
+    factory = database.get_session_maker()
+    Base.metadata.create_all(database.get_engine())
+
+    with factory.begin() as db_session:
+        course = Course(datetime.date(2024, 2, 1), duration=1)
+        course.student = Student("Prénom", "Nom", "0601020304", "eleve@example.com")
+        course.hourly_rate = HourlyRate("Tarif", 20)
+        db_session.add(course)
+
+    yield factory
+
+    database.get_engine().dispose()
+
+
+def _debts(factory) -> list[Decimal]:
+    with factory.begin() as db_session:
+        return [debt for _, debt in stats_cache.debt_per_student(db_session)]
+
+
+def test_cached_result_is_served_until_the_data_changes(session_maker):
+    assert _debts(session_maker) == [Decimal(20)]
+
+    hits = stats_cache.default_cache.counters()["hits"]
+
+    assert _debts(session_maker) == [Decimal(20)]
+    assert stats_cache.default_cache.counters()["hits"] == hits + 1
+
+
+def test_change_made_by_another_process_is_seen(session_maker):
+    assert _debts(session_maker) == [Decimal(20)]
+
+    subprocess.run([sys.executable, "-c", WRITER], cwd=ROOT, check=True)
+
+    assert _debts(session_maker) == [Decimal(40)]
+
+
+def test_transaction_changing_the_data_bypasses_the_cache(session_maker):
+    assert _debts(session_maker) == [Decimal(20)]
+
+    with session_maker() as db_session:
+        course = db_session.query(Course).one()
+        course.duration = 2
+        db_session.flush()
+
+        assert [debt for _, debt in stats_cache.debt_per_student(db_session)] == [
+            Decimal(40)
+        ]
+
+        db_session.rollback()
+
+    assert _debts(session_maker) == [Decimal(20)]
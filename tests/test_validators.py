@@ -0,0 +1,62 @@
+"""Checks that a phone number is parsed once, its check being shared by the
+validator and the sanitizer.
+
+Run from the root folder of the project :
+    python3 -m pytest tests"""
+
+import phonenumbers
+import pytest
+
+import sanitizers
+import validators
+
+
+@pytest.fixture
+def parses(monkeypatch) -> list[str]:
+    """Returns the list of the numbers parsed by phonenumbers, the memoized
+    checks being cleared before and after the test."""
+
+    parsed = []
+    parse = phonenumbers.parse
+
+    def counting_parse(number, *args, **kwargs):
+        parsed.append(number)
+        return parse(number, *args, **kwargs)
+
+    monkeypatch.setattr(phonenumbers, "parse", counting_parse)
+    validators.check_phone_number.cache_clear()
+
+    yield parsed
+
+    validators.check_phone_number.cache_clear()
+
+
+def test_number_is_parsed_once(parses):
+    assert validators.validate_phone_number("06 12 34 56 78")
+    assert sanitizers.sanitize_phone_number("06 12 34 56 78") == "+33612345678"
+    assert parses == ["0612345678"]
+
+
+def test_each_distinct_number_is_parsed_once(parses):
+    checks = validators.check_phone_numbers(
+        ["06 12 34 56 78", "07.98.76.54.32", "06 12 34 56 78"]
+    )
+
+    assert [check.normalized for check in checks] == [
+        "+33612345678",
+        "+33798765432",
+        "+33612345678",
+    ]
+    assert len(parses) == 2
+
+
+def test_invalid_numbers(parses):
+    assert not validators.validate_phone_number("06 12")
+
+    # Nothing can be parsed without digits
+    assert not validators.validate_phone_number("abc")
+
+    with pytest.raises(phonenumbers.NumberParseException):
+        sanitizers.sanitize_phone_number("abc")
+
+    assert parses == ["0612", ""]
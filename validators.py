@@ -3,17 +3,36 @@ phone numbers and email addresses. These validators take the form of
 functions accepting the user input and returning a boolean."""
 
 import datetime
+import functools
+from typing import TYPE_CHECKING, Iterable, NamedTuple
 
 from decimal import Decimal, InvalidOperation
-import phonenumbers
-from email_validator import validate_email, EmailNotValidError
+
+# phonenumbers (with its large metadata tables), email_validator and the cache of
+# the domains are imported on first use, so that importing this file for
+# DATE_FORMAT (as the models do) does not slow down the startup
+if TYPE_CHECKING:
+    from email_validator import ValidatedEmail
 
 # Date format used across the app for validation and formatting
 DATE_FORMAT = "%d/%m/%Y"
 
 
-def validate_phone_number(raw_phone_number: str, region: str = "FR") -> bool:
-    """Validates a phone number from any country in the world."""
+class PhoneNumberCheck(NamedTuple):
+    """Result of the check of a phone number : whether it is valid, and
+    its E.164 form (None if the input could not even be parsed)."""
+
+    valid: bool
+    normalized: str | None
+
+
+@functools.lru_cache(maxsize=4096)
+def check_phone_number(raw_phone_number: str, region: str = "FR") -> PhoneNumberCheck:
+    """Validates a phone number from any country in the world and puts it into
+    E.164 format, parsing it only once. The result is memoized, as the prompts
+    validate and transform the same input several times."""
+
+    import phonenumbers
 
     try:
         # We remove non-digit characters before parsing the phone number
@@ -21,29 +40,64 @@ def validate_phone_number(raw_phone_number: str, region: str = "FR") -> bool:
             "".join(filter(str.isdigit, raw_phone_number)), region
         )
 
-        # We check if the number is possible and valid
-        return phonenumbers.is_possible_number(
-            phone_number
-        ) and phonenumbers.is_valid_number(phone_number)
-
     except phonenumbers.NumberParseException:
         # The input could not even be parsed as a phone number
-        return False
+        return PhoneNumberCheck(False, None)
+
+    return PhoneNumberCheck(
+        # We check if the number is possible and valid
+        phonenumbers.is_possible_number(phone_number)
+        and phonenumbers.is_valid_number(phone_number),
+        phonenumbers.format_number(phone_number, phonenumbers.PhoneNumberFormat.E164),
+    )
+
+
+def check_phone_numbers(
+    raw_phone_numbers: Iterable[str], region: str = "FR"
+) -> list[PhoneNumberCheck]:
+    """Checks a list of phone numbers, each distinct number being parsed once."""
+
+    return [
+        check_phone_number(raw_phone_number, region)
+        for raw_phone_number in raw_phone_numbers
+    ]
+
+
+def validate_phone_number(raw_phone_number: str, region: str = "FR") -> bool:
+    """Validates a phone number from any country in the world."""
+
+    return check_phone_number(raw_phone_number, region).valid
+
+
+@functools.lru_cache(maxsize=1024)
+def parse_email_address(email_address: str) -> "ValidatedEmail | None":
+    """Checks the syntax of an email address, without any DNS lookup, and returns
+    its normalized form (None if invalid). The result is memoized, as the address
+    is parsed both by the validator and by the sanitizer."""
+
+    from email_validator import validate_email, EmailNotValidError
+
+    try:
+        return validate_email(email_address, check_deliverability=False)
+
+    except EmailNotValidError:
+        return None
 
 
 def validate_email_address(email_address: str) -> bool:
     """Validates an email address."""
 
-    try:
-        # The check_deliverability argument allow us to check the domain name
-        email_info = validate_email(email_address, check_deliverability=True)
+    import email_cache
 
-        # At this stage, only the length of the address can be problematic
-        return len(email_info.normalized) <= 75
+    email_info = parse_email_address(email_address)
 
-    except EmailNotValidError:
+    # Only the length of a syntactically valid address can be problematic
+    if email_info is None or len(email_info.normalized) > 75:
         return False
 
+    # The domain name is checked through the cache, to avoid a DNS lookup per address
+    return email_cache.default_cache.is_deliverable(email_info.ascii_domain)
+
 
 def validate_decimal(
     input_str: str, min_value=Decimal("0.0"), max_value=Decimal("999.99")